@@ -3,10 +3,15 @@ import streamlit as st
 import pandas as pd
 import requests
 import shutil
-import tempfile
 from pathlib import Path
 
-from src.common.common import page_setup
+from src.common.common import page_setup, show_fig
+from src.common.archive import download_archive
+from src.common.static_files import show_download, show_image
+from src.common.svg import optimize_svgs
+from src.analysis.deg import combo_name, export_combos
+from src.analysis.cnet import cnet_graph, cnet_figure
+from src.analysis.results import load_results
 
 # ----------------- 기본 설정 -----------------
 params = page_setup()
@@ -57,6 +62,10 @@ with cnet_tab:
             org_db = st.selectbox("OrgDb", ["org.Hs.eg.db", "org.Mm.eg.db"], index=0)
             plot_width = st.number_input("Plot width", value=8.0, step=0.5)
             plot_height = st.number_input("Plot height", value=6.0, step=0.5)
+
+            # Interactive 모드는 enrichment 결과로 네트워크를 만들고 캐시된 layout으로 바로 그림
+            cnet_mode = st.radio("Rendering", ["Interactive", "R (cnetplot)"], horizontal=True)
+            interactive = cnet_mode == "Interactive"
                
             deg_dir = workspace / "csv-files" / "output" / selected_method/ "deg"
             combo_csv = deg_dir / "combo_names.csv"
@@ -93,9 +102,13 @@ with cnet_tab:
 
     # ----------------- Run -----------------
     with run_tab:
-        if "cnet_params" in st.session_state and combo_csv.exists():
+        if interactive:
+            st.info("Interactive 모드는 Result 탭에서 바로 그려집니다. Run이 필요 없습니다.")
+        elif "cnet_params" in st.session_state and combo_csv.exists():
             if st.button("🚀 Run GO Cnet Plot"):
                 payload = st.session_state["cnet_params"]
+                # 로컬 DEG 결과는 R이 읽을 수 있도록 CSV로 먼저 저장
+                export_combos(workspace, selected_method)
 
                 with st.spinner("Running Cnet Plot via FastAPI..."):
                     try:
@@ -115,6 +128,7 @@ with cnet_tab:
 
                             # ZIP 압축 해제
                             shutil.unpack_archive(str(download_path), extract_dir=str(output_dir))
+                            optimize_svgs(output_dir)
 
                             # ZIP 파일 삭제
                             if download_path.exists():
@@ -131,36 +145,47 @@ with cnet_tab:
 
     # ----------------- Result -----------------
     with result_tab:
-        
-        combo_name = f"FC{int(fc_threshold)}_p{pval_threshold}"
-        for ont in ["BP", "CC", "MF"]:
-            st.markdown(f"### {combo_name} - {ont}")
-            plot_file = output_dir/f"cnet_{ont}.svg"
-            if plot_file.exists():
-                st.image(str(plot_file), width=750)
-            else:
-                st.warning(f"No Cnet plot found for {combo_name}")
+        if interactive and fc_threshold is not None:
+            combo = combo_name(fc_threshold, pval_threshold)
+            results = load_results(workspace, selected_method)
+            fold_change = None
+            if results is not None:
+                fold_change = results.drop_duplicates("gene").set_index("gene")["log2FoldChange"]
+            for ont in ["BP", "CC", "MF"]:
+                st.markdown(f"### {combo} - {ont}")
+                result_csv = enrich_dir / combo / f"GO_{ont}_result.csv"
+                if not result_csv.exists():
+                    st.warning(f"No enrichment result found for {combo} - {ont}")
+                    continue
+                graph = cnet_graph(pd.read_csv(result_csv), showCategory)
+                if not graph["n_terms"]:
+                    st.info(f"No enriched terms for {combo} - {ont}")
+                    continue
+                scope = f"cnet/{workspace}/{selected_method}/{combo}/{ont}"
+                show_fig(cnet_figure(graph, fold_change, scope), f"cnet_{combo}_{ont}")
+        elif not interactive:
+            combo_label = f"FC{int(fc_threshold)}_p{pval_threshold}"
+            for ont in ["BP", "CC", "MF"]:
+                st.markdown(f"### {combo_label} - {ont}")
+                plot_file = output_dir/f"cnet_{ont}.svg"
+                if plot_file.exists():
+                    show_image(str(plot_file), width=750)
+                else:
+                    st.warning(f"No Cnet plot found for {combo_label}")
 
     # ----------------- Download -----------------
     with download_tab:
-        if combo_csv.exists():
+        if interactive:
+            st.info("Plot 우측 상단의 카메라 아이콘으로 이미지를 저장할 수 있습니다.")
+        elif combo_csv.exists():
             combos = pd.read_csv(combo_csv)["combo"].tolist()
-            if combos:
-                with tempfile.TemporaryDirectory() as tmpdir:
-                    for combo in combos:
-                        src = output_dir / combo
-                        dst = Path(tmpdir, combo)
-                        if src.exists():
-                            shutil.copytree(src, dst)
-                    zip_path = shutil.make_archive(
-                        os.path.join(tmpdir, "CnetPlot_combos"), "zip", tmpdir
-                    )
-                    with open(zip_path, "rb") as f:
-                        st.download_button(
-                            label="⬇️ Download Cnet Plot Results (ZIP)",
-                            data=f,
-                            file_name="CnetPlot_combos.zip",
-                            mime="application/zip",
-                        )
+            zip_path = download_archive(output_dir, "CnetPlot_combos", combos) if combos else None
+            if zip_path:
+                show_download(
+                    zip_path,
+                    label="⬇️ Download Cnet Plot Results (ZIP)",
+                    file_name="CnetPlot_combos.zip",
+                    mime="application/zip"
+                )
         else:
             st.info("No Cnet plot results available for download.")
\ No newline at end of file
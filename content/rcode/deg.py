@@ -3,10 +3,16 @@ import requests
 import streamlit as st
 from pathlib import Path
 import pandas as pd
-import tempfile
 import shutil
 
-from src.common.common import page_setup
+from src.common.common import page_setup, show_fig
+from src.common.archive import download_archive
+from src.analysis.results import load_results
+from src.analysis.deg import (
+    MASKS_FILE, deg_path, parse_thresholds, run_deg, load_deg, combo_table, export_combos,
+    count_index, count_degs, count_surface_figure,
+)
+from src.common.static_files import show_download
 
 # 기본 설정
 params = page_setup()
@@ -58,12 +64,42 @@ with deg_tab:
             st.warning("분석 방법을 찾을 수 없습니다. DESeq2 분석을 먼저 실행해주세요.")
         fc_input = st.text_input("Fold Change thresholds (comma-separated)", "1.5,2")
         pval_input = st.text_input("P-value thresholds (comma-separated)", "0.05,0.01")
+
+        # threshold 선택 전에 DEG 개수를 바로 확인 (Run 불필요)
+        index = count_index(Path(st.session_state.workspace), selected_method) if selected_method else None
+        if index is not None:
+            with st.expander("🔎 Threshold explorer", expanded=False):
+                explore_fc = st.slider("Fold Change", min_value=1.0, max_value=8.0, value=1.5, step=0.05)
+                explore_log_p = st.slider("log10(padj)", min_value=-10.0, max_value=0.0, value=-1.3, step=0.05)
+                explore_p = 10 ** explore_log_p
+                up, down = count_degs(index, explore_fc, explore_p)
+                col1, col2, col3 = st.columns(3)
+                col1.metric("DEGs", int(up + down))
+                col2.metric("Up", int(up))
+                col3.metric("Down", int(down))
+                st.caption(f"|log2FC| ≥ log2({explore_fc:g}), padj < {explore_p:.3g}")
+                show_fig(count_surface_figure(index, explore_fc, explore_p), "deg_count_surface")
+
+        # Local 모드는 모든 threshold 조합을 한 번에 계산하고, CSV는 다운로드 시에만 생성
+        deg_mode = st.radio("Engine", ["Local (NumPy)", "R (backend)"], horizontal=True)
+        local = deg_mode == "Local (NumPy)"
     # ----------------- Run -----------------
 
     with run_tab:
         workspace = Path(st.session_state.workspace)
-        deg_dir = workspace / "csv-files" / "output" / selected_method/ "deg"
-        if st.button("🚀 Run DEG Filtering"):
+        deg_dir = deg_path(workspace, selected_method)
+        if local and st.button("🚀 Run DEG Filtering"):
+            results = load_results(workspace, selected_method)
+            if results is None:
+                st.error(f"❌ merged_results_{selected_method}.csv 파일이 없습니다.")
+            else:
+                try:
+                    combos = run_deg(results, parse_thresholds(fc_input), parse_thresholds(pval_input), deg_dir)
+                    st.session_state.pop("deg_zip_path", None)
+                    st.success(f"✅ Deg generated successfully! ({len(combos)} combinations)")
+                except ValueError as e:
+                    st.error(f"❌ Invalid thresholds: {e}")
+        elif not local and st.button("🚀 Run DEG Filtering"):
             with st.spinner("Running DEG filtering via FastAPI..."):
                 try:
                     payload = {
@@ -102,13 +138,22 @@ with deg_tab:
             combo_csv = deg_dir / "combo_names.csv"
             if combo_csv.exists():
                 combos = pd.read_csv(combo_csv)["combo"].tolist()
-                if combos:
+                results = load_results(workspace, selected_method)
+                masks = load_deg(deg_dir, results)
+                stale = masks is None and (deg_dir / MASKS_FILE).exists()
+                if stale:
+                    st.warning("⚠️ DEG 결과가 현재 merged_results 파일과 맞지 않습니다. DEG Filtering을 다시 실행해주세요.")
+                elif combos:
                     st.markdown("### 🧩 Filtered Results by Combination")
                     combo_tabs = st.tabs(combos)
                     for combo, tab in zip(combos, combo_tabs):
                         with tab:
                             file_path = deg_dir / combo / "filtered_gene_list.csv"
-                            if file_path.exists():
+                            if masks is not None and combo in masks:
+                                df = combo_table(results, masks[combo])
+                                st.markdown(f"**Genes: {len(df)}**")
+                                st.dataframe(df, use_container_width=True)
+                            elif file_path.exists():
                                 df = pd.read_csv(file_path)
                                 st.markdown(f"**Genes: {len(df)}**")
                                 st.dataframe(df, use_container_width=True)
@@ -123,20 +168,18 @@ with deg_tab:
     with download_tab:
         if deg_dir and (deg_dir / "combo_names.csv").exists():
             combos = pd.read_csv(deg_dir / "combo_names.csv")["combo"].tolist()
-            if combos:
-                with tempfile.TemporaryDirectory() as tmpdir:
-                    for combo in combos:
-                        src = deg_dir / combo
-                        dst = Path(tmpdir, combo)
-                        if src.exists():
-                            shutil.copytree(src, dst)
-                    zip_path = shutil.make_archive(os.path.join(tmpdir, "Deg_combos"), "zip", tmpdir)
-                    with open(zip_path, "rb") as f:
-                        st.download_button(
-                            label="⬇️ Download DEG Results (ZIP)",
-                            data=f,
-                            file_name="Deg_combos.zip",
-                            mime="application/zip"
-                        )
+            # 조합별 CSV는 다운로드를 요청할 때만 디스크에 씀
+            if combos and st.button("📦 Prepare download"):
+                export_combos(workspace, selected_method)
+                zip_path = download_archive(deg_dir, "Deg_combos", combos)
+                st.session_state["deg_zip_path"] = str(zip_path) if zip_path else None
+            zip_path = st.session_state.get("deg_zip_path")
+            if zip_path and Path(zip_path).exists() and Path(zip_path).is_relative_to(deg_dir):
+                show_download(
+                    zip_path,
+                    label="⬇️ Download DEG Results (ZIP)",
+                    file_name="Deg_combos.zip",
+                    mime="application/zip"
+                )
         else:
             st.info("No files available for download.")
\ No newline at end of file
@@ -3,10 +3,14 @@ import streamlit as st
 import pandas as pd
 import requests
 import shutil
-import tempfile
 from pathlib import Path
 
-from src.common.common import page_setup
+from src.common.common import page_setup, show_fig
+from src.common.archive import download_archive
+from src.common.static_files import show_download, show_image
+from src.common.svg import optimize_svgs
+from src.analysis.deg import combo_name, export_combos
+from src.analysis.emap import MEASURES, MIN_EDGE, emap_figure, term_similarity
 
 # ----------------- 기본 설정 -----------------
 params = page_setup()
@@ -78,6 +82,13 @@ with emap_tab:
         plot_width = st.number_input("Plot width", value=8.0, step=0.5)
         plot_height = st.number_input("Plot height", value=6.0, step=0.5)
 
+        # Interactive 모드는 enrichment 결과의 term 유사도를 캐시해 바로 그림 (showCategory 변경에 R 작업 불필요)
+        emap_mode = st.radio("Rendering", ["Interactive", "R (emapplot)"], horizontal=True)
+        interactive = emap_mode == "Interactive"
+        if interactive:
+            measure = MEASURES[st.selectbox("Similarity", list(MEASURES))]
+            min_edge = st.slider("Minimum similarity for edges", 0.0, 1.0, MIN_EDGE, step=0.05)
+
 
         st.session_state["emap_params"] = {
             "result_root": str(enrich_dir),
@@ -93,9 +104,13 @@ with emap_tab:
 
     # ----------------- Run -----------------
     with run_tab:
-        if "emap_params" in st.session_state and combo_csv.exists():
+        if interactive:
+            st.info("Interactive 모드는 Result 탭에서 바로 그려집니다. Run이 필요 없습니다.")
+        elif "emap_params" in st.session_state and combo_csv.exists():
             if st.button("🚀 Run GO Emap Plot"):
                 payload = st.session_state["emap_params"]
+                # 로컬 DEG 결과는 R이 읽을 수 있도록 CSV로 먼저 저장
+                export_combos(workspace, selected_method)
 
                 with st.spinner("Running Emap Plot via FastAPI..."):
                     try:
@@ -115,6 +130,7 @@ with emap_tab:
 
                             # ZIP 압축 해제
                             shutil.unpack_archive(str(download_path), extract_dir=str(output_dir))
+                            optimize_svgs(output_dir)
 
                             # ZIP 파일 삭제
                             if download_path.exists():
@@ -132,35 +148,42 @@ with emap_tab:
     # ----------------- Result -----------------
     with result_tab:
         # FC/p-value 기준으로 폴더 이름 지정
-        combo_name = f"FC{int(fc_threshold)}_p{pval_threshold}"
-        for ont in ["BP", "CC", "MF"]:
-            st.markdown(f"### {combo_name} - {ont}")
-            plot_file = output_dir / f"emap_{ont}.svg"  # plot 파일명도 e.g., emap_BP.svg
-            if plot_file.exists():
-                st.image(str(plot_file), width=750)
-            else:
-                st.warning(f"No Emap plot found for {combo_name} - {ont}")
+        if interactive and fc_threshold is not None:
+            combo = combo_name(fc_threshold, pval_threshold)
+            for ont in ["BP", "CC", "MF"]:
+                st.markdown(f"### {combo} - {ont}")
+                similarity = term_similarity(enrich_dir / combo / f"GO_{ont}_result.csv", measure)
+                if similarity is None:
+                    st.warning(f"No enrichment result found for {combo} - {ont}")
+                elif similarity["terms"].empty:
+                    st.info(f"No enriched terms for {combo} - {ont}")
+                else:
+                    scope = f"emap/{workspace}/{selected_method}/{combo}/{ont}"
+                    fig = emap_figure(similarity, showCategory, min_edge, scope)
+                    show_fig(fig, f"emap_{combo}_{ont}")
+        elif not interactive:
+            combo_label = f"FC{int(fc_threshold)}_p{pval_threshold}"
+            for ont in ["BP", "CC", "MF"]:
+                st.markdown(f"### {combo_label} - {ont}")
+                plot_file = output_dir / f"emap_{ont}.svg"  # plot 파일명도 e.g., emap_BP.svg
+                if plot_file.exists():
+                    show_image(str(plot_file), width=750)
+                else:
+                    st.warning(f"No Emap plot found for {combo_label} - {ont}")
 
     # ----------------- Download -----------------
     with download_tab:
-        if combo_csv.exists():
+        if interactive:
+            st.info("Plot 우측 상단의 카메라 아이콘으로 이미지를 저장할 수 있습니다.")
+        elif combo_csv.exists():
             combos = pd.read_csv(combo_csv)["combo"].tolist()
-            if combos:
-                with tempfile.TemporaryDirectory() as tmpdir:
-                    for combo in combos:
-                        src = output_dir / combo
-                        dst = Path(tmpdir, combo)
-                        if src.exists():
-                            shutil.copytree(src, dst)
-                    zip_path = shutil.make_archive(
-                        os.path.join(tmpdir, "EmapPlot_combos"), "zip", tmpdir
-                    )
-                    with open(zip_path, "rb") as f:
-                        st.download_button(
-                            label="⬇️ Download Emap Plot Results (ZIP)",
-                            data=f,
-                            file_name="EmapPlot_combos.zip",
-                            mime="application/zip",
-                        )
+            zip_path = download_archive(output_dir, "EmapPlot_combos", combos) if combos else None
+            if zip_path:
+                show_download(
+                    zip_path,
+                    label="⬇️ Download Emap Plot Results (ZIP)",
+                    file_name="EmapPlot_combos.zip",
+                    mime="application/zip"
+                )
         else:
             st.info("No Emap plot results available for download.")
\ No newline at end of file
@@ -1,10 +1,9 @@
 import os
-import subprocess
-import tempfile
 import streamlit as st
 import pandas as pd
 
-from frontend.src.common.common import page_setup
+from src.common.common import page_setup, show_job
+from src.common.rworker import start_job
 
 params = page_setup()
 
@@ -13,80 +12,68 @@ st.title("Enrichkegg")
 # 고정 경로
 INPUT_ROOT = "/data/Deg"
 OUTPUT_ROOT = "/data/Enrichkegg"
-COMBO_NAMES_PATH = "/data/Deg/combo_names.rds"
+COMBO_NAMES_PATH = "/data/Deg/combo_names.csv"
 FILE_NAME = "filtered_gene_list.csv"  # 고정값
 
-# ------------------ Main Tab ------------------
-main_tabs = st.tabs(["🧬 Enrichkegg"])
-with main_tabs[0]:
-    # ------------------ Sub Tabs ------------------
-    sub_tabs = st.tabs(["⚙️ Configure", "▶️ Run", "📊 Results", "⬇️ Download"])
-    tab_config, tab_run, tab_results, tab_download = sub_tabs
-
-    # ------------------ Configure 탭 ------------------
-    with tab_config:
-        p_cut = st.number_input("p-value cutoff", min_value=0.0, max_value=1.0, value=0.9, step=0.05)
-        orgDb = st.text_input("OrgDb for conversion (e.g., org.Hs.eg.db)", "org.Hs.eg.db")
-
-        if st.button("Save Configuration"):
-            st.session_state["kegg_config"] = {
-                "orgDb": orgDb,
-                "p_cut": p_cut
-            }
-            st.success("Configuration saved!")
-
-    # ------------------ Run 탭 ------------------
-    with tab_run:
-        if "kegg_config" not in st.session_state:
-            st.warning("⚠️ Please configure parameters first in the 'Configure' tab.")
-        else:
-            if st.button("Run KEGG Analysis"):
-                cfg = st.session_state["kegg_config"]
-
-                # R 스크립트 작성
-                with tempfile.NamedTemporaryFile(mode="w", suffix=".R", delete=False, encoding="utf-8") as tmp_r:
-                    r_script_path = tmp_r.name
-                    tmp_r.write(f"""
+ENRICH_KEGG_R = r"""
 library(clusterProfiler)
-library({cfg['orgDb']})
+library(org_db, character.only = TRUE)
 library(readr)
 library(dplyr)
 
+# Prebuilt mapping of `python -m src.analysis.idmap`; bitr on the OrgDb when it has not been built.
+idmap_tsv <- file.path(Sys.getenv("GENE_SET_DIR", "gene-sets"), org_db, "idmap", "idmap.tsv")
+# Only symbol keys, like bitr(fromType = "SYMBOL"); aliases can name several genes.
+idmap <- if (file.exists(idmap_tsv)) filter(read_tsv(idmap_tsv, col_types = "ccc"), kind == "symbol") else NULL
+
+symbol_to_entrez <- function(symbols) {
+  symbols <- unique(symbols)
+  if (is.null(idmap)) {
+    return(bitr(symbols, fromType = "SYMBOL", toType = "ENTREZID", OrgDb = org_db))
+  }
+  entrez <- idmap$entrez[match(toupper(symbols), idmap$key)]
+  if (anyNA(entrez)) message(sum(is.na(entrez)), " of ", length(symbols), " gene IDs could not be mapped")
+  data.frame(SYMBOL = symbols, ENTREZID = entrez)[!is.na(entrez), ]
+}
+
+# Progress markers parsed by the job log viewer.
+skip <- function(nm, why) message(sprintf("[SKIP] %s: %s", nm, why))
+
 run_enrich_kegg_min <- function(input_root,
                                 output_root,
                                 combo_names,
-                                file_name     = "{FILE_NAME}",
-                                p_cut         = {cfg['p_cut']},
+                                file_name,
+                                p_cut,
                                 save_ekegg    = TRUE,
-                                save_conv_tbl = FALSE) {{
+                                save_conv_tbl = FALSE) {
   
   if (!dir.exists(output_root)) dir.create(output_root, recursive = TRUE)
   
-  for (nm in combo_names) {{
+  for (nm in combo_names) {
     in_combo_dir <- file.path(input_root, nm)
     in_csv       <- file.path(in_combo_dir, file_name)
-    if (!file.exists(in_csv)) next
+    if (!file.exists(in_csv)) { skip(nm, "input CSV not found"); next }
     
     df <- tryCatch(read.csv(in_csv, check.names = FALSE, stringsAsFactors = FALSE),
                    error = function(e) NULL)
-    if (is.null(df)) next
+    if (is.null(df)) { skip(nm, "failed to read input CSV"); next }
     
     sym_col <- grep("^(Geneid|Gene_Symbol|SYMBOL)$", names(df),
                     ignore.case = TRUE, value = TRUE)[1]
-    if (is.na(sym_col)) next
+    if (is.na(sym_col)) { skip(nm, "no gene symbol column"); next }
     
     gene_symbols <- toupper(trimws(df[[sym_col]]))
     gene_symbols <- gene_symbols[!is.na(gene_symbols) & gene_symbols != ""]
-    if (!length(gene_symbols)) next
+    if (!length(gene_symbols)) { skip(nm, "no genes"); next }
     
     conv <- tryCatch(
-      bitr(gene_symbols, fromType = "SYMBOL", toType = "ENTREZID", OrgDb = {cfg['orgDb']}),
+      symbol_to_entrez(gene_symbols),
       error = function(e) NULL
     )
-    if (is.null(conv) || !"ENTREZID" %in% names(conv)) next
+    if (is.null(conv) || !"ENTREZID" %in% names(conv)) { skip(nm, "ID conversion failed"); next }
     
     ids <- unique(na.omit(conv$ENTREZID))
-    if (!length(ids)) next
+    if (!length(ids)) { skip(nm, "no Entrez IDs"); next }
     
     out_combo_dir <- file.path(output_root, nm)
     if (!dir.exists(out_combo_dir)) dir.create(out_combo_dir, recursive = TRUE)
@@ -101,9 +88,9 @@ run_enrich_kegg_min <- function(input_root,
       error = function(e) NULL
     )
     
-    if (!is.null(ekegg) && nrow(as.data.frame(ekegg)) > 0) {{
+    if (!is.null(ekegg) && nrow(as.data.frame(ekegg)) > 0) {
       ekegg_readable <- tryCatch(
-        setReadable(ekegg, OrgDb = {cfg['orgDb']}, keyType = "ENTREZID"),
+        setReadable(ekegg, OrgDb = org_db, keyType = "ENTREZID"),
         error = function(e) ekegg
       )
       
@@ -111,45 +98,83 @@ run_enrich_kegg_min <- function(input_root,
                 file.path(out_combo_dir, "KEGG_result.csv"))
       
       saveRDS(ekegg_readable, file.path(out_combo_dir, "KEGG_ekegg.rds"))  # save_ekegg = TRUE
-    }}
-  }}
-}}
-
-combo_names <- readRDS("{COMBO_NAMES_PATH}")
+      message(sprintf("[OK] %s: %d KEGG pathways", nm, nrow(as.data.frame(ekegg_readable))))
+    } else {
+      skip(nm, "no enriched KEGG pathway")
+    }
+  }
+}
 
 run_enrich_kegg_min(
-  input_root   = "{INPUT_ROOT}",
-  output_root  = "{OUTPUT_ROOT}",
+  input_root   = input_root,
+  output_root  = output_root,
   combo_names  = combo_names,
-  file_name    = "{FILE_NAME}",
-  p_cut        = {cfg['p_cut']},
+  file_name    = file_name,
+  p_cut        = p_cut,
   save_ekegg   = TRUE,
   save_conv_tbl= FALSE
 )
-""")
+"""
 
-                # Rscript 실행
-                result = subprocess.run(
-                    ["Rscript", r_script_path],
-                    capture_output=True,
-                    text=True,
-                    encoding="utf-8"
-                )
+# ------------------ Main Tab ------------------
+main_tabs = st.tabs(["🧬 Enrichkegg"])
+with main_tabs[0]:
+    # ------------------ Sub Tabs ------------------
+    sub_tabs = st.tabs(["⚙️ Configure", "▶️ Run", "📊 Results", "⬇️ Download"])
+    tab_config, tab_run, tab_results, tab_download = sub_tabs
 
-                st.session_state["kegg_log"] = result.stdout + "\n" + result.stderr
+    # ------------------ Configure 탭 ------------------
+    with tab_config:
+        p_cut = st.number_input("p-value cutoff", min_value=0.0, max_value=1.0, value=0.9, step=0.05)
+        orgDb = st.text_input("OrgDb for conversion (e.g., org.Hs.eg.db)", "org.Hs.eg.db")
 
-                if result.returncode == 0:
-                    st.success("✅ KEGG enrichment completed successfully!")
-                else:
-                    st.error("❌ Error occurred during KEGG enrichment. Please check the output files.")
+        if st.button("Save Configuration"):
+            st.session_state["kegg_config"] = {
+                "orgDb": orgDb,
+                "p_cut": p_cut
+            }
+            st.success("Configuration saved!")
+
+    # ------------------ Run 탭 ------------------
+    with tab_run:
+        if "kegg_config" not in st.session_state:
+            st.warning("⚠️ Please configure parameters first in the 'Configure' tab.")
+        else:
+            job = st.session_state.get("kegg_job")
+            running = job is not None and not job["done"].is_set()
+            if st.button("Run KEGG Analysis", disabled=running):
+                cfg = st.session_state["kegg_config"]
+                combo_names = pd.read_csv(COMBO_NAMES_PATH)["combo"].dropna().tolist()
+
+                # combo마다 독립된 job으로 R worker pool에 분산 — 결과는 끝나는 대로 combo 폴더에 저장되고 실패는 해당 combo에만 영향
+                jobs = [{
+                    "org_db": cfg["orgDb"],
+                    "p_cut": cfg["p_cut"],
+                    "input_root": INPUT_ROOT,
+                    "output_root": OUTPUT_ROOT,
+                    "combo_names": [combo],
+                    "file_name": FILE_NAME,
+                } for combo in combo_names]
+                # 백그라운드에서 실행하고 진행 상황과 로그는 아래에서 실행 중에 갱신
+                job = start_job(ENRICH_KEGG_R, jobs, combo_names)
+                st.session_state["kegg_job"] = job
+
+            if job is not None:
+                show_job("kegg_job")
+                if job["done"].is_set():
+                    failed = [combo for combo, result in job["results"].items() if not result["ok"]]
+                    if job["cancel"].is_set():
+                        st.warning("KEGG enrichment was cancelled.")
+                    elif not failed:
+                        st.success("✅ KEGG enrichment completed successfully!")
+                    else:
+                        st.error(f"❌ Error occurred during KEGG enrichment for {', '.join(failed)}. Please check the output files.")
 
     # ------------------ Results 탭 ------------------
     with tab_results:
-        combo_names_path = "/data/Deg/combo_names.csv"
-
         # combo_names 읽기
         try:
-            combo_df = pd.read_csv(combo_names_path)
+            combo_df = pd.read_csv(COMBO_NAMES_PATH)
             if "combo" in combo_df.columns:
                 combo_names = combo_df["combo"].dropna().tolist()
             else:
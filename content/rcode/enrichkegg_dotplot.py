@@ -1,50 +1,16 @@
 import os
-import subprocess
 import tempfile
 import shutil
 import streamlit as st
 import pandas as pd
 
-from frontend.src.common.common import page_setup
+from src.common.common import page_setup, show_job
+from src.common.rworker import start_job
 params = page_setup()
 
 st.title("Enrichkegg Dotplot")
 
-# ----------------- Main Tabs -----------------
-main_tabs = st.tabs(["🧬 Enrichkegg Dotplot"])
-with main_tabs[0]:
-    
-    # ----------------- Sub Tabs -----------------
-    sub_tabs = st.tabs(["⚙️ Configure", "🚀 Run", "📊 Result", "⬇️ Download"])
-    configure_tab, run_tab, result_tab, download_tab = sub_tabs
-
-    # 기본 경로 설정
-    deg_root    = "/data/Deg"
-    enrich_root = "/data/Enrichkegg"
-    combo_csv   = os.path.join(deg_root, "combo_names.csv")
-
-    # ----------------- Configure -----------------
-    with configure_tab:
-        showCategory = st.number_input("Number of categories to show (showCategory)", value=10, step=1)
-        plot_width   = st.number_input("Plot width", value=8.0, step=0.5)
-        plot_height  = st.number_input("Plot height", value=6.0, step=0.5)
-
-    # ----------------- Run -----------------
-    with run_tab:
-        if st.button("Run Enrichkegg Dotplot Generation"):
-            if not os.path.exists(combo_csv):
-                st.error("combo_names.csv not found in DEG root.")
-            else:
-                combo_df = pd.read_csv(combo_csv)
-                combo_names = combo_df["combo"].tolist() if "combo" in combo_df.columns else []
-
-                if not combo_names:
-                    st.warning("No combos found in combo_names.csv.")
-                else:
-                    with tempfile.NamedTemporaryFile(mode="w", suffix=".R", delete=False, encoding="utf-8") as tmp_r:
-                        r_script_path = tmp_r.name
-                        combos_r = 'c(' + ','.join([f'"{c}"' for c in combo_names]) + ')'
-                        tmp_r.write(f"""
+DOTPLOT_R = r"""
 library(clusterProfiler)
 library(enrichplot)
 library(ggplot2)
@@ -53,29 +19,29 @@ plot_enrichkegg_dotplots <- function(enrich_root,
                                      combo_names,
                                      showCategory = 10,
                                      width = 8, height = 6,
-                                     device = "svg") {{
-  for (nm in combo_names) {{
+                                     device = "svg") {
+  for (nm in combo_names) {
     combo_dir <- file.path(enrich_root, nm)
     rds_path  <- file.path(combo_dir, "KEGG_ekegg.rds")
     fig_dir   <- file.path(combo_dir, "figure")
     if (!dir.exists(fig_dir)) dir.create(fig_dir, recursive = TRUE)
 
-    if (!file.exists(rds_path)) {{
+    if (!file.exists(rds_path)) {
       message(sprintf("[SKIP] %s: RDS not found -> %s", nm, rds_path))
       next
-    }}
+    }
 
     ek <- tryCatch(readRDS(rds_path), error = function(e) NULL)
-    if (is.null(ek)) {{
+    if (is.null(ek)) {
       message(sprintf("[SKIP] %s: failed to load RDS", nm))
       next
-    }}
+    }
 
     df <- tryCatch(as.data.frame(ek), error = function(e) NULL)
-    if (is.null(df) || nrow(df) == 0) {{
+    if (is.null(df) || nrow(df) == 0) {
       message(sprintf("[SKIP] %s: KEGG result empty", nm))
       next
-    }}
+    }
 
     p <- dotplot(ek, showCategory = showCategory,
                  x = "GeneRatio", color = "p.adjust") +
@@ -84,36 +50,73 @@ plot_enrichkegg_dotplots <- function(enrich_root,
     out_file <- file.path(fig_dir, paste0("Enrichkegg_dotplot.", device))
     ggsave(out_file, p, width = width, height = height, device = device)
     message(sprintf("[OK] %s: saved %s", nm, out_file))
-  }}
-}}
-
-enrich_root <- "{enrich_root}"
-combo_names <- {combos_r}
+  }
+}
 
 plot_enrichkegg_dotplots(
   enrich_root  = enrich_root,
   combo_names  = combo_names,
-  showCategory = {showCategory},
-  width        = {plot_width},
-  height       = {plot_height},
+  showCategory = show_category,
+  width        = plot_width,
+  height       = plot_height,
   device       = "svg"
 )
-""")
-                    # R 실행
-                    result = subprocess.run(
-                        ["Rscript", r_script_path],
-                        capture_output=True,
-                        text=True,
-                        encoding="utf-8"
-                    )
-                    if result.returncode == 0:
-                        st.success("Enrichkegg Dotplot generation completed!")
-                        if result.stdout:
-                            st.text(result.stdout)
-                    else:
-                        st.error("R script execution failed.")
-                        if result.stderr:
-                            st.text(result.stderr)
+"""
+
+# ----------------- Main Tabs -----------------
+main_tabs = st.tabs(["🧬 Enrichkegg Dotplot"])
+with main_tabs[0]:
+    
+    # ----------------- Sub Tabs -----------------
+    sub_tabs = st.tabs(["⚙️ Configure", "🚀 Run", "📊 Result", "⬇️ Download"])
+    configure_tab, run_tab, result_tab, download_tab = sub_tabs
+
+    # 기본 경로 설정
+    deg_root    = "/data/Deg"
+    enrich_root = "/data/Enrichkegg"
+    combo_csv   = os.path.join(deg_root, "combo_names.csv")
+
+    # ----------------- Configure -----------------
+    with configure_tab:
+        showCategory = st.number_input("Number of categories to show (showCategory)", value=10, step=1)
+        plot_width   = st.number_input("Plot width", value=8.0, step=0.5)
+        plot_height  = st.number_input("Plot height", value=6.0, step=0.5)
+
+    # ----------------- Run -----------------
+    with run_tab:
+        job = st.session_state.get("kegg_dotplot_job")
+        running = job is not None and not job["done"].is_set()
+        if st.button("Run Enrichkegg Dotplot Generation", disabled=running):
+            if not os.path.exists(combo_csv):
+                st.error("combo_names.csv not found in DEG root.")
+            else:
+                combo_df = pd.read_csv(combo_csv)
+                combo_names = combo_df["combo"].tolist() if "combo" in combo_df.columns else []
+
+                if not combo_names:
+                    st.warning("No combos found in combo_names.csv.")
+                else:
+                    # combo마다 독립된 job으로 R worker pool에 분산 — 실패는 해당 combo에만 영향
+                    jobs = [{
+                        "enrich_root": enrich_root,
+                        "combo_names": [combo],
+                        "show_category": showCategory,
+                        "plot_width": plot_width,
+                        "plot_height": plot_height,
+                    } for combo in combo_names]
+                    job = start_job(DOTPLOT_R, jobs, combo_names)
+                    st.session_state["kegg_dotplot_job"] = job
+
+        if job is not None:
+            show_job("kegg_dotplot_job")
+            if job["done"].is_set():
+                failed = [combo for combo, result in job["results"].items() if not result["ok"]]
+                if job["cancel"].is_set():
+                    st.warning("Enrichkegg Dotplot generation was cancelled.")
+                elif not failed:
+                    st.success("Enrichkegg Dotplot generation completed!")
+                else:
+                    st.error(f"R script execution failed for {', '.join(failed)}.")
 
     # ----------------- Result -----------------
     with result_tab:
@@ -3,10 +3,17 @@ import streamlit as st
 import pandas as pd
 import requests
 import shutil
-import tempfile
 from pathlib import Path
 
-from src.common.common import page_setup
+from src.common.common import page_setup, show_fig
+from src.common.archive import download_archive
+from src.common.static_files import show_download, show_image
+from src.common.svg import optimize_svgs
+from src.analysis.deg import export_combos
+from src.analysis.genesets import GMT_SOURCE, list_collections
+from src.analysis.ora import run_enrichment, dotplot_figure
+from src.analysis.godag import load_dag
+from src.analysis.semsim import MEASURES, SIMPLIFY_CUTOFF, simplify
 
 # 기본 설정
 params = page_setup()
@@ -55,6 +62,29 @@ with enrich_tab:
         org_db = st.selectbox("OrgDb", ["org.Hs.eg.db", "org.Mm.eg.db"], index=0)
         plot_width = st.number_input("Plot width", value=8.0, step=0.5)
         plot_height = st.number_input("Plot height", value=6.0, step=0.5)
+
+        # Local 모드는 모든 combo x BP/CC/MF(+GMT)를 한 번에 계산
+        enrich_mode = st.radio("Engine", ["Local (Python)", "R (backend)"], horizontal=True)
+        local = enrich_mode == "Local (Python)"
+        gmt_collections = []
+        if local:
+            gmt_collections = st.multiselect(
+                "Additional gene sets (GMT, e.g. KEGG)", list_collections().get(GMT_SOURCE, [])
+            )
+        collections = [f"GO_{ont}" for ont in ["BP", "CC", "MF"]] + gmt_collections
+
+        # 의미 유사도가 cutoff를 넘는 GO term 묶음은 p.adjust가 가장 작은 term만 남김 (clusterProfiler::simplify)
+        simplify_go = st.checkbox("Simplify redundant GO terms", value=False)
+        if simplify_go:
+            simplify_measure = st.selectbox("Semantic similarity", MEASURES)
+            simplify_cutoff = st.slider("Similarity cutoff", 0.0, 1.0, SIMPLIFY_CUTOFF, 0.05)
+            dag = load_dag()
+            if dag is None:
+                st.warning("GO DAG 인덱스가 없습니다. `python -m src.analysis.godag go-basic.obo`로 먼저 생성해주세요.")
+                simplify_go = False
+            elif simplify_measure != "Wang" and org_db not in dag["ic"]:
+                st.warning(f"{org_db}의 information content가 없습니다. GO collection 생성 후 GO DAG 인덱스를 다시 생성해주세요.")
+                simplify_go = False
         workspace = Path(st.session_state.workspace)
         deg_dir = workspace / "csv-files" / "output" / selected_method/ "deg"
         output_dir = deg_dir / "enrich"
@@ -72,9 +102,19 @@ with enrich_tab:
 
     # ----------------- Run -----------------
     with run_tab:
-        if "enrich_params" in st.session_state:
+        if local and combo_csv.exists():
+            if st.button("🚀 Run GO Enrichment"):
+                with st.spinner("Running GO Enrichment..."):
+                    try:
+                        counts = run_enrichment(workspace, selected_method, org_db, gmt_collections, pvalueCutoff)
+                        st.success("✅ GO Enrichment completed: " + ", ".join(f"{k} {v}" for k, v in counts.items()))
+                    except FileNotFoundError as e:
+                        st.error(f"❌ {e}. Build it with `python -m src.analysis.genesets org {org_db}`.")
+        elif not local and "enrich_params" in st.session_state:
             if st.button("🚀 Run GO Enrichment"):
                 payload = st.session_state["enrich_params"]
+                # 로컬 DEG 결과는 R이 읽을 수 있도록 CSV로 먼저 저장
+                export_combos(workspace, selected_method)
 
                 with st.spinner("Running GO Enrichment via FastAPI..."):
                     try:
@@ -94,6 +134,7 @@ with enrich_tab:
 
                             # ZIP 압축 해제
                             shutil.unpack_archive(str(download_path), extract_dir=str(output_dir))
+                            optimize_svgs(output_dir)
 
                             # ZIP 파일 삭제
                             if download_path.exists():
@@ -111,17 +152,27 @@ with enrich_tab:
     # ----------------- Result -----------------
     with result_tab:
         combos = pd.read_csv(combo_csv)["combo"].tolist()
-        ontology_tabs = st.tabs(["BP", "CC", "MF"])
-        for ont_tab, ont in zip(ontology_tabs, ["BP", "CC", "MF"]):
+        ontology_tabs = st.tabs([c.removeprefix("GO_") for c in collections])
+        for ont_tab, collection in zip(ontology_tabs, collections):
             with ont_tab:
-                st.subheader(f"Ontology: {ont}")
+                st.subheader(f"Ontology: {collection.removeprefix('GO_')}")
 
-                # 각 combo마다 (plot_file, result_file) 쌍 생성
+                # 각 combo마다 (plot_file, result table) 쌍 생성
                 pairs = []
+                simplified = simplify_go and collection.startswith("GO_")
                 for combo in combos:
-                    result_file = output_dir / combo / f"GO_{ont}_result.csv"
-                    plot_file = output_dir / combo / "figure" / f"GO_{ont}.svg"
-                    pairs.append((combo, plot_file if plot_file.exists() else None, result_file if result_file.exists() else None))
+                    result_file = output_dir / combo / f"{collection}_result.csv"
+                    plot_file = output_dir / combo / "figure" / f"{collection}.svg"
+                    table, error = None, None
+                    if result_file.exists():
+                        try:
+                            table = pd.read_csv(result_file)
+                        except Exception as e:
+                            error = f"Failed to read table for {combo}: {e}"
+                    if table is not None and simplified:
+                        table = simplify(table, simplify_cutoff, simplify_measure, org_db)
+                    # R plot은 simplify 전 결과이므로 simplify 시에는 dotplot을 다시 그림
+                    pairs.append((combo, plot_file if plot_file.exists() and not simplified else None, table, error))
 
                 if not pairs:
                     st.info("No results available.")
@@ -135,38 +186,38 @@ with enrich_tab:
                     cols = st.columns(2, gap="large")
                     # LEFT column
                     with cols[0]:
-                        combo, plot_file, result_file = left
+                        combo, plot_file, table, error = left
                         st.markdown(f"### {combo}")
                         if plot_file:
-                            st.image(str(plot_file), use_container_width=True)
+                            show_image(str(plot_file), use_container_width=True)
+                        elif table is not None:
+                            show_fig(dotplot_figure(table, showCategory), f"{combo}_{collection}")
                         else:
                             st.info("No plot available.")
-                        if result_file:
-                            try:
-                                df = pd.read_csv(result_file)
-                                st.markdown(f"**Rows: {len(df)}**")
-                                st.dataframe(df, use_container_width=True, height=300)
-                            except Exception as e:
-                                st.error(f"Failed to read table for {combo}: {e}")
+                        if table is not None:
+                            st.markdown(f"**Rows: {len(table)}**")
+                            st.dataframe(table, use_container_width=True, height=300)
+                        elif error:
+                            st.error(error)
                         else:
                             st.info("No result table available.")
 
                     # RIGHT column (if exists)
                     with cols[1]:
                         if right:
-                            combo, plot_file, result_file = right
+                            combo, plot_file, table, error = right
                             st.markdown(f"### {combo}")
                             if plot_file:
-                                st.image(str(plot_file), use_container_width=True)
+                                show_image(str(plot_file), use_container_width=True)
+                            elif table is not None:
+                                show_fig(dotplot_figure(table, showCategory), f"{combo}_{collection}")
                             else:
                                 st.info("No plot available.")
-                            if result_file:
-                                try:
-                                    df = pd.read_csv(result_file)
-                                    st.markdown(f"**Rows: {len(df)}**")
-                                    st.dataframe(df, use_container_width=True, height=300)
-                                except Exception as e:
-                                    st.error(f"Failed to read table for {combo}: {e}")
+                            if table is not None:
+                                st.markdown(f"**Rows: {len(table)}**")
+                                st.dataframe(table, use_container_width=True, height=300)
+                            elif error:
+                                st.error(error)
                             else:
                                 st.info("No result table available.")
                         else:
@@ -178,20 +229,13 @@ with enrich_tab:
     with download_tab:
         if combo_csv.exists():
             combos = pd.read_csv(combo_csv)["combo"].tolist()
-            if combos:
-                with tempfile.TemporaryDirectory() as tmpdir:
-                    for combo in combos:
-                        src = output_dir / combo
-                        dst = Path(tmpdir, combo)
-                        if src.exists():
-                            shutil.copytree(src, dst)
-                    zip_path = shutil.make_archive(os.path.join(tmpdir, "Enrichment_combos"), "zip", tmpdir)
-                    with open(zip_path, "rb") as f:
-                        st.download_button(
-                            label="⬇️ Download Enrichment Results (ZIP)",
-                            data=f,
-                            file_name="Enrichment_combos.zip",
-                            mime="application/zip"
-                        )
+            zip_path = download_archive(output_dir, "Enrichment_combos", combos) if combos else None
+            if zip_path:
+                show_download(
+                    zip_path,
+                    label="⬇️ Download Enrichment Results (ZIP)",
+                    file_name="Enrichment_combos.zip",
+                    mime="application/zip"
+                )
         else:
             st.info("No enrichment results available for download.")
\ No newline at end of file
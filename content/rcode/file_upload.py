@@ -5,6 +5,7 @@ import pandas as pd
 import shutil
 from src.common.upload import csv_upload
 from src.common.common import page_setup
+from src.analysis.ranked import build_ranked_lists
 
 params = page_setup()
 
@@ -83,6 +84,8 @@ if "uploaded_csv" in st.session_state:
                         download_path.write_bytes(response.content)
                         shutil.unpack_archive(str(download_path), extract_dir=str(csv_dir))
                         download_path.unlink()
+                        # GSEA/plot 페이지가 공유하는 ranked gene list를 한 번만 생성
+                        build_ranked_lists(Path(st.session_state.workspace))
                         st.success("✅ DESeq2 analysis completed successfully!")
                         result_files = list(csv_dir.glob("**/*"))
                         st.markdown("### Analysis Results")
@@ -2,10 +2,14 @@ import os
 import streamlit as st
 import pandas as pd
 import requests
-import tempfile
 import shutil
 from pathlib import Path
-from src.common.common import page_setup
+from src.common.common import page_setup, show_fig
+from src.common.archive import download_archive
+from src.common.static_files import show_download, show_image
+from src.common.svg import optimize_svgs
+from src.analysis.ranked import ranked_list
+from src.analysis.gsea import term_hits, term_positions, gseaplot_figure
 
 # ----------------- PAGE SETUP -----------------
 params = page_setup()
@@ -64,6 +68,10 @@ with total_tab:
         else:
             st.warning("분석 방법을 찾을 수 없습니다. DESeq2 분석을 먼저 실행해주세요.")    
         workspace = Path(st.session_state.workspace)
+        ranked_missing = (
+            f"Ranked gene list not found. merged_results_{selected_method}.csv를 업로드하거나 "
+            "DESeq2 분석을 먼저 실행해주세요."
+        )
         gseaplot_dir = workspace / "csv-files" / "output" / selected_method/"gsego"
         result_dir = gseaplot_dir / "gseaplot_total"
         result_dir.mkdir(parents=True, exist_ok=True)
@@ -72,6 +80,11 @@ with total_tab:
         width = st.number_input("Plot width", value=12.0, step=0.5)
         height = st.number_input("Plot height", value=8.0, step=0.5)
 
+        # Interactive 모드는 캐시된 ranked list와 gene set index로 바로 그림
+        gsea_mode = st.radio("Rendering", ["Interactive", "R (gseaplot2)"], horizontal=True, key="gseaplot_total_mode")
+        interactive = gsea_mode == "Interactive"
+        org_db = st.selectbox("OrgDb", ["org.Hs.eg.db", "org.Mm.eg.db"], index=0, key="gseaplot_total_org_db")
+
         st.session_state["total_params"] = {
             "input_dir": str(gseaplot_dir),
             "output_dir": str(result_dir),
@@ -82,7 +95,9 @@ with total_tab:
 
     # ----------------- RUN -----------------
     with run_tab:
-        if st.button("🚀 Run GSEA Total Plot"):
+        if interactive:
+            st.info("Interactive 모드는 Result 탭에서 바로 그려집니다. Run이 필요 없습니다.")
+        elif st.button("🚀 Run GSEA Total Plot"):
             params = st.session_state.get("total_params", {})
             with st.spinner("Running GSEA total plot via FastAPI..."):
                 try:
@@ -98,6 +113,7 @@ with total_tab:
                         # ZIP 저장
                         download_path.write_bytes(response.content)
                         shutil.unpack_archive(str(download_path), extract_dir=str(result_dir))
+                        optimize_svgs(result_dir)
 
                         # ZIP 삭제
                         if download_path.exists():
@@ -111,7 +127,29 @@ with total_tab:
 
     # ----------------- RESULT -----------------
     with result_tab:
-        if result_dir.exists():
+        ranked = ranked_list(workspace, selected_method) if interactive and selected_method else None
+        if interactive:
+            ontologies = ["BP", "CC", "MF"]
+            ontology_tabs = st.tabs(ontologies)
+
+            for ont_tab, ont in zip(ontology_tabs, ontologies):
+                with ont_tab:
+                    st.markdown(f"### {ont} Ontology Results")
+                    csv_file = gseaplot_dir / f"gse_{ont}.csv"
+                    hits = term_hits(workspace, selected_method, org_db, f"GO_{ont}") if ranked else None
+                    if not csv_file.exists():
+                        st.info(f"No CSV found for {ont}")
+                    elif ranked is None:
+                        st.warning(ranked_missing)
+                    elif hits is None:
+                        st.warning(f"Gene set index for {org_db} GO_{ont} not found.")
+                    else:
+                        for _, row in pd.read_csv(csv_file).head(int(topN)).iterrows():
+                            positions = term_positions(hits, row["ID"])
+                            if positions is not None:
+                                fig = gseaplot_figure(ranked["scores"], positions, f"{row['ID']} {row['Description']}")
+                                show_fig(fig, f"gseaplot_{ont}_{row['ID'].replace(':', '_')}")
+        elif result_dir.exists():
             ontologies = ["BP", "CC", "MF"]
             ontology_tabs = st.tabs(ontologies)
 
@@ -125,7 +163,7 @@ with total_tab:
                     if svgs:
                         for svg in svgs:
                             st.markdown(f"**{svg}**")
-                            st.image(os.path.join(result_dir, svg), width=850)
+                            show_image(os.path.join(result_dir, svg), width=850)
                     else:
                         st.info(f"No SVG plots found for {ont}")
         else:
@@ -133,16 +171,16 @@ with total_tab:
 
     # ----------------- DOWNLOAD -----------------
     with download_tab:
-        if result_dir.exists() and any(result_dir.iterdir()):
-            with tempfile.TemporaryDirectory() as tmpdir:
-                zip_path = shutil.make_archive(os.path.join(tmpdir, "gseaplot_total_results"), "zip", result_dir)
-                with open(zip_path, "rb") as f:
-                    st.download_button(
-                        label="⬇️ Download GSEA Total Results (ZIP)",
-                        data=f,
-                        file_name="gseaplot_total_results.zip",
-                        mime="application/zip",
-                    )
+        zip_path = None if interactive else download_archive(result_dir, "gseaplot_total_results")
+        if interactive:
+            st.info("Plot 우측 상단의 카메라 아이콘으로 이미지를 저장할 수 있습니다.")
+        elif zip_path:
+            show_download(
+                zip_path,
+                label="⬇️ Download GSEA Total Results (ZIP)",
+                file_name="gseaplot_total_results.zip",
+                mime="application/zip"
+            )
         else:
             st.info("No files to download.")
 
@@ -159,12 +197,19 @@ with term_tab:
         result_dir.mkdir(parents=True, exist_ok=True)
 
         ont = st.selectbox("Select ontology", ["BP", "CC", "MF"], index=0)
+
+        # Term 탭의 렌더링 방식은 Total 탭과 별도로 선택
+        gsea_mode = st.radio("Rendering", ["Interactive", "R (gseaplot2)"], horizontal=True, key="gseaplot_term_mode")
+        interactive = gsea_mode == "Interactive"
+        org_db = st.selectbox("OrgDb", ["org.Hs.eg.db", "org.Mm.eg.db"], index=0, key="gseaplot_term_org_db")
         csv_files = {"BP": "gse_BP.csv", "CC": "gse_CC.csv", "MF": "gse_MF.csv"}
         csv_path = gseaplot_dir / csv_files[ont]
 
         if csv_path.exists():
             df = pd.read_csv(csv_path)
-            if not df.empty:
+            if interactive:
+                st.info("Interactive 모드는 Result 탭의 표에서 행을 클릭하면 바로 그려집니다.")
+            elif not df.empty:
                 st.dataframe(df)
                 idx = st.number_input(
                     "Row index (1-based) for GSEA Term Plot",
@@ -188,7 +233,9 @@ with term_tab:
 
     # ----------------- RUN -----------------
     with run_tab:
-        if st.button("🚀 Run GSEA Term Plot"):
+        if interactive:
+            st.info("Interactive 모드는 Result 탭에서 바로 그려집니다. Run이 필요 없습니다.")
+        elif st.button("🚀 Run GSEA Term Plot"):
             params = st.session_state.get("term_params", {})
             with st.spinner("Running GSEA term plot via FastAPI..."):
                 try:
@@ -204,6 +251,7 @@ with term_tab:
                         # ZIP 저장
                         download_path.write_bytes(response.content)
                         shutil.unpack_archive(str(download_path), extract_dir=str(result_dir))
+                        optimize_svgs(result_dir)
 
                         # ZIP 삭제
                         if download_path.exists():
@@ -217,7 +265,33 @@ with term_tab:
 
     # ----------------- RESULT -----------------
     with result_tab:
-        if result_dir.exists():
+        if interactive:
+            st.markdown(f"### {ont} Ontology Results")
+            ranked = ranked_list(workspace, selected_method) if selected_method else None
+            hits = term_hits(workspace, selected_method, org_db, f"GO_{ont}") if ranked else None
+            if not csv_path.exists():
+                st.warning(f"No CSV found for {ont}")
+            elif ranked is None:
+                st.warning(ranked_missing)
+            elif hits is None:
+                st.warning(f"Gene set index for {org_db} GO_{ont} not found.")
+            else:
+                df = pd.read_csv(csv_path)
+                event = st.dataframe(
+                    df, on_select="rerun", selection_mode="single-row", key=f"gseaplot_term_{ont}"
+                )
+                rows = event.selection.rows
+                if rows:
+                    row = df.iloc[rows[0]]
+                    positions = term_positions(hits, row["ID"])
+                    if positions is None:
+                        st.warning(f"{row['ID']} is not in the gene set index.")
+                    else:
+                        fig = gseaplot_figure(ranked["scores"], positions, f"{row['ID']} {row['Description']}")
+                        show_fig(fig, f"gseaplot_{ont}_{row['ID'].replace(':', '_')}")
+                else:
+                    st.info("표에서 term을 선택하세요.")
+        elif result_dir.exists():
             st.markdown(f"### {ont} Ontology Results")
 
             # CSV 파일
@@ -241,7 +315,7 @@ with term_tab:
             if svgs:
                 for svg in svgs:
                     st.markdown(f"**{svg}**")
-                    st.image(os.path.join(result_dir, svg), width=850)
+                    show_image(os.path.join(result_dir, svg), width=850)
             else:
                 st.info(f"No SVG plots found for {ont}")
         else:
@@ -249,15 +323,15 @@ with term_tab:
 
     # ----------------- DOWNLOAD -----------------
     with download_tab:
-        if result_dir.exists() and any(result_dir.iterdir()):
-            with tempfile.TemporaryDirectory() as tmpdir:
-                zip_path = shutil.make_archive(os.path.join(tmpdir, "gseaplot_term_results"), "zip", result_dir)
-                with open(zip_path, "rb") as f:
-                    st.download_button(
-                        label="⬇️ Download GSEA Term Results (ZIP)",
-                        data=f,
-                        file_name="gseaplot_term_results.zip",
-                        mime="application/zip",
-                    )
+        zip_path = None if interactive else download_archive(result_dir, "gseaplot_term_results")
+        if interactive:
+            st.info("Plot 우측 상단의 카메라 아이콘으로 이미지를 저장할 수 있습니다.")
+        elif zip_path:
+            show_download(
+                zip_path,
+                label="⬇️ Download GSEA Term Results (ZIP)",
+                file_name="gseaplot_term_results.zip",
+                mime="application/zip"
+            )
         else:
             st.info("No files to download.")
\ No newline at end of file
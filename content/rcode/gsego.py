@@ -3,10 +3,15 @@ import streamlit as st
 import pandas as pd
 import requests
 import shutil
-import tempfile
 from pathlib import Path
 
 from src.common.common import page_setup
+from src.common.archive import download_archive
+from src.common.static_files import show_download
+from src.common.svg import optimize_svgs
+from src.analysis.gsea import run_gsego
+from src.analysis.godag import load_dag
+from src.analysis.semsim import MEASURES, SIMPLIFY_CUTOFF, simplify
 
 # ----------------- 기본 설정 -----------------
 params = page_setup()
@@ -56,6 +61,23 @@ with gsea_tab:
         pvalue_cutoff = st.number_input("P-value cutoff", value=0.05, step=0.01, format="%.2f")
         plot_width = st.number_input("Plot width", value=8.0, step=0.5)
         plot_height = st.number_input("Plot height", value=6.0, step=0.5)
+
+        # Local 모드는 BP/CC/MF 전체 gene set을 벡터화 + permutation 캐시로 계산 (plot은 R 모드에서만 생성)
+        gsea_mode = st.radio("Engine", ["Local (Python)", "R (backend)"], horizontal=True)
+        local = gsea_mode == "Local (Python)"
+
+        # 의미 유사도가 cutoff를 넘는 GO term 묶음은 p.adjust가 가장 작은 term만 남김 (clusterProfiler::simplify)
+        simplify_go = st.checkbox("Simplify redundant GO terms", value=False)
+        if simplify_go:
+            simplify_measure = st.selectbox("Semantic similarity", MEASURES)
+            simplify_cutoff = st.slider("Similarity cutoff", 0.0, 1.0, SIMPLIFY_CUTOFF, 0.05)
+            dag = load_dag()
+            if dag is None:
+                st.warning("GO DAG 인덱스가 없습니다. `python -m src.analysis.godag go-basic.obo`로 먼저 생성해주세요.")
+                simplify_go = False
+            elif simplify_measure != "Wang" and org_db not in dag["ic"]:
+                st.warning(f"{org_db}의 information content가 없습니다. GO collection 생성 후 GO DAG 인덱스를 다시 생성해주세요.")
+                simplify_go = False
         workspace = Path(st.session_state.workspace)
         csv_path = workspace / "csv-files" / "output" / selected_method/f"merged_results_{selected_method}.csv"
         st.info(f"📂 Selected CSV Path: {csv_path}")
@@ -75,7 +97,15 @@ with gsea_tab:
 
     # ----------------- Run -----------------
     with run_tab:
-        if "gsego_params" in st.session_state:
+        if local and selected_method:
+            if st.button("🚀 Run GSEA GO Analysis"):
+                with st.spinner("Running GSEA GO Analysis..."):
+                    try:
+                        counts = run_gsego(workspace, selected_method, org_db, min_gs_size, max_gs_size, pvalue_cutoff)
+                        st.success("✅ GSEA GO completed: " + ", ".join(f"{k} {v}" for k, v in counts.items()))
+                    except FileNotFoundError as e:
+                        st.error(f"❌ {e}. Build it with `python -m src.analysis.genesets org {org_db}`.")
+        elif "gsego_params" in st.session_state:
             if st.button("🚀 Run GSEA GO Analysis"):
                 payload = st.session_state["gsego_params"]
 
@@ -97,6 +127,7 @@ with gsea_tab:
 
                             # ZIP 압축 해제
                             shutil.unpack_archive(str(download_path), extract_dir=str(output_dir))
+                            optimize_svgs(output_dir)
 
                             # ZIP 파일 삭제
                             if download_path.exists():
@@ -125,6 +156,10 @@ with gsea_tab:
                     if csv_file.exists():
                         try:
                             df = pd.read_csv(csv_file)
+                            if simplify_go and not df.empty:
+                                n_terms = len(df)
+                                df = simplify(df, simplify_cutoff, simplify_measure, org_db)
+                                st.caption(f"Simplified: {n_terms} → {len(df)} terms ({simplify_measure}, cutoff {simplify_cutoff:g})")
                             if df.empty:
                                 st.info("No enriched terms found for this ontology.")
                             else:
@@ -138,15 +173,13 @@ with gsea_tab:
 
     # # ----------------- Download -----------------
     with download_tab:
-        if output_dir.exists() and any(output_dir.iterdir()):
-            with tempfile.TemporaryDirectory() as tmpdir:
-                zip_path = shutil.make_archive(os.path.join(tmpdir, "GSEA_GO_results"), "zip", output_dir)
-                with open(zip_path, "rb") as f:
-                    st.download_button(
-                        label="⬇️ Download GSEA GO Results (ZIP)",
-                        data=f,
-                        file_name="GSEA_GO_results.zip",
-                        mime="application/zip",
-                    )
+        zip_path = download_archive(output_dir, "GSEA_GO_results")
+        if zip_path:
+            show_download(
+                zip_path,
+                label="⬇️ Download GSEA GO Results (ZIP)",
+                file_name="GSEA_GO_results.zip",
+                mime="application/zip"
+            )
         else:
             st.info("No GSEA GO results available for download.")
\ No newline at end of file
@@ -4,7 +4,10 @@ import streamlit as st
 from pathlib import Path
 import pandas as pd
 
-from src.common.common import page_setup
+from src.common.common import page_setup, show_fig
+from src.analysis.heatmap import clustered_heatmap, heatmap_figure
+from src.common.static_files import show_download, show_image
+from src.common.svg import optimize_svg_file
 
 # 기본 설정
 params = page_setup()
@@ -55,9 +58,15 @@ with heatmap_tab:
         st.session_state.height_heatmap = height_heatmap
         st.session_state.top_n_genes = top_n_genes
 
+        # Interactive 모드는 클러스터링을 (method, N) 별로 캐시하므로 크기 변경 시 재계산 없음
+        heatmap_mode = st.radio("Rendering", ["Interactive", "R (pheatmap)"], horizontal=True)
+        interactive = heatmap_mode == "Interactive"
+
     # Run
     with run_tab:
-        if "selected_method" in st.session_state and st.session_state.selected_method:
+        if interactive:
+            st.info("Interactive 모드는 Result 탭에서 바로 그려집니다. Run이 필요 없습니다.")
+        elif "selected_method" in st.session_state and st.session_state.selected_method:
             selected_method = st.session_state.selected_method
             st.info(f"선택된 분석 방법: **{selected_method}**")
 
@@ -89,6 +98,7 @@ with heatmap_tab:
                             # SVG 파일 저장 (FastAPI와 동일한 위치)
                             with open(output_svg_heatmap, "wb") as f_out:
                                 f_out.write(response.content)
+                            optimize_svg_file(output_svg_heatmap)
                             
                             st.success(f"✅ Heatmap generated successfully at: {output_svg_heatmap}")
                         else:
@@ -103,12 +113,29 @@ with heatmap_tab:
 
     # Result
     with result_tab:
-        if "output_svg_heatmap" in st.session_state:
+        if interactive:
+            data = None
+            if selected_method:
+                with st.spinner("Clustering top genes..."):
+                    try:
+                        data = clustered_heatmap(st.session_state.workspace, selected_method, top_n_genes)
+                    except KeyError as e:
+                        st.error(f"결과 파일에 필요한 컬럼이 없습니다: {e}")
+                    except ValueError as e:
+                        st.error(f"Heatmap을 클러스터링할 수 없습니다: {e}")
+            if data is None:
+                st.info(f"merged_results_{selected_method}.csv 파일이 존재하지 않습니다. DESeq2 분석을 먼저 실행해주세요.")
+            elif not len(data["samples"]):
+                st.error("결과 파일에 normalized count 컬럼이 없습니다.")
+            else:
+                st.markdown(f"### Heatmap: top {len(data['genes'])} genes by padj")
+                show_fig(heatmap_figure(data, width_heatmap, height_heatmap), f"heatmap_{selected_method}_top{int(top_n_genes)}", container_width=False)
+        elif "output_svg_heatmap" in st.session_state:
             output_svg_heatmap = st.session_state.output_svg_heatmap
             
             if output_svg_heatmap.exists():
                 st.markdown(f"### Heatmap Result: {output_svg_heatmap.name}")
-                st.image(str(output_svg_heatmap), caption="Heatmap", use_container_width=True)
+                show_image(str(output_svg_heatmap), caption="Heatmap", use_container_width=True)
             else:
                 st.info("Heatmap을 생성하려면 Run 탭에서 실행해주세요.")
         else:
@@ -116,17 +143,18 @@ with heatmap_tab:
 
     # Download
     with download_tab:
-        if "output_svg_heatmap" in st.session_state:
+        if interactive:
+            st.info("Plot 우측 상단의 카메라 아이콘으로 이미지를 저장할 수 있습니다.")
+        elif "output_svg_heatmap" in st.session_state:
             output_svg_heatmap = st.session_state.output_svg_heatmap
             
             if output_svg_heatmap.exists():
-                with open(output_svg_heatmap, "rb") as f:
-                    st.download_button(
-                        label="⬇️ Download Heatmap SVG",
-                        data=f,
-                        file_name=output_svg_heatmap.name,
-                        mime="image/svg+xml"
-                    )
+                show_download(
+                    output_svg_heatmap,
+                    label="⬇️ Download Heatmap SVG",
+                    file_name=output_svg_heatmap.name,
+                    mime="image/svg+xml"
+                )
                 st.success(f"📁 File location: {output_svg_heatmap}")
             else:
                 st.warning("⚠️ Heatmap 파일이 존재하지 않습니다. Run 탭에서 먼저 실행해주세요.")
@@ -1,9 +1,14 @@
 import os
-import subprocess
-import tempfile
+import time
 import streamlit as st
 import pandas as pd
 
+from src.analysis.idmap import load_idmap
+from src.analysis.kegg import link_assets, list_pathways
+from src.analysis.keggmap import entrez_fold_changes, pathway_entrez, render_pathways
+from src.common.common import show_job
+from src.common.rworker import start_job
+
 st.title("Pathview")
 
 example_root  = "/data"
@@ -11,68 +16,7 @@ kegg_root     = "/data/Enrichkegg"
 pathview_root = "/data/pathview"
 example_csv   = "/data/example_data.csv"
 
-# ----------------- Main Tab -----------------
-main_tab = st.tabs(["🧬 Pathview Analysis"])[0]
-
-with main_tab:
-    # ----------------- Sub Tabs -----------------
-    sub_tabs = st.tabs(["⚙️ Configure", "🚀 Run", "📊 Result", "⬇️ Download"])
-    configure_tab, run_tab, result_tab, download_tab = sub_tabs
-
-    # ----------------- 1) Configure -----------------
-    with configure_tab:
-        combo_csv_path = "/data/Deg/combo_names.csv"
-
-        # CSV에서 콤보명 읽기
-        try:
-            combo_df = pd.read_csv(combo_csv_path)
-            if "combo" in combo_df.columns:
-                combo_names = combo_df["combo"].dropna().tolist()
-            else:
-                st.error("combo_names.csv에 'combo' 컬럼이 없습니다.")
-                combo_names = []
-        except Exception as e:
-            st.error(f"combo_names.csv 읽기 실패: {e}")
-            combo_names = []
-
-        if not combo_names:
-            st.warning("콤보 이름을 불러올 수 없습니다.")
-        else:
-            # selectbox로 콤보 선택
-            selected_combo = st.selectbox("Select a combo case", combo_names)
-            st.session_state["selected_combo"] = selected_combo
-
-            kegg_csv_path = os.path.join(kegg_root, selected_combo, "KEGG_result.csv")
-
-            # 선택한 combo의 KEGG_result.csv 출력
-            if os.path.exists(kegg_csv_path):
-                try:
-                    kegg_df = pd.read_csv(kegg_csv_path)
-                    st.markdown(f"### KEGG Result for {selected_combo}")
-                    st.dataframe(kegg_df)
-                except Exception as e:
-                    st.warning(f"KEGG_result.csv 읽기 실패: {e}")
-            else:
-                st.info(f"{selected_combo}에 대한 KEGG_result.csv 파일이 없습니다.")
-
-            # Pathway ID 입력
-            pathway_id_target = st.text_input("Pathway ID (e.g., hsa00230)", "")
-            st.session_state["pathway_id_target"] = pathway_id_target
-
-    # ----------------- 2) Run -----------------
-    with run_tab:
-        if st.button("Run Pathview"):
-            if "selected_combo" not in st.session_state or not st.session_state["selected_combo"]:
-                st.error("⚠️ Please select a combo case first in the Configure tab.")
-            elif "pathway_id_target" not in st.session_state or not st.session_state["pathway_id_target"].strip():
-                st.error("⚠️ Please enter a Pathway ID in the Configure tab.")
-            else:
-                selected_combo = st.session_state["selected_combo"]
-                pathway_id_target = st.session_state["pathway_id_target"]
-
-            with tempfile.NamedTemporaryFile(mode="w", suffix=".R", delete=False, encoding="utf-8") as tmp_r:
-                r_script_path = tmp_r.name
-                r_code = f"""
+PATHVIEW_R = r"""
 library(readr)
 library(dplyr)
 library(stringr)
@@ -80,11 +24,22 @@ library(clusterProfiler)
 library(org.Hs.eg.db)
 library(pathview)
 
-example_root  <- "{example_root.replace("\\\\", "/")}"
+# Prebuilt mapping of `python -m src.analysis.idmap`; bitr on the OrgDb when it has not been built.
+idmap_tsv <- file.path(Sys.getenv("GENE_SET_DIR", "gene-sets"), "org.Hs.eg.db", "idmap", "idmap.tsv")
+# Only symbol keys, like bitr(fromType = "SYMBOL"); aliases can name several genes.
+idmap <- if (file.exists(idmap_tsv)) filter(read_tsv(idmap_tsv, col_types = "ccc"), kind == "symbol") else NULL
+
+symbol_to_entrez <- function(symbols) {
+  symbols <- unique(symbols)
+  if (is.null(idmap)) {
+    return(bitr(symbols, fromType = "SYMBOL", toType = "ENTREZID", OrgDb = org.Hs.eg.db))
+  }
+  entrez <- idmap$entrez[match(toupper(symbols), idmap$key)]
+  if (anyNA(entrez)) message(sum(is.na(entrez)), " of ", length(symbols), " gene IDs could not be mapped")
+  data.frame(SYMBOL = symbols, ENTREZID = entrez)[!is.na(entrez), ]
+}
+
 example_csv   <- file.path(example_root, "example_data.csv")
-kegg_root     <- "{kegg_root.replace("\\\\", "/")}"
-pathview_root <- "{pathview_root.replace("\\\\", "/")}"
-pathway_id_target <- "{pathway_id_target}"
 
 gene_df <- read_csv(example_csv, show_col_types = FALSE)
 names(gene_df) <- str_trim(names(gene_df))
@@ -98,15 +53,13 @@ gene_tbl <- tibble(
   foldchange = as.numeric(gene_df[[fc_col]])
 ) %>% filter(!is.na(SYMBOL), SYMBOL != "", !is.na(foldchange))
 
-conv_all <- suppressWarnings(
-  bitr(gene_tbl$SYMBOL, fromType = "SYMBOL", toType = "ENTREZID", OrgDb = org.Hs.eg.db)
-)
+conv_all <- suppressWarnings(symbol_to_entrez(gene_tbl$SYMBOL))
 gene_entrez_tbl <- gene_tbl %>% inner_join(conv_all, by = "SYMBOL") %>% distinct(ENTREZID, .keep_all = TRUE)
 
 all_fc_vec <- gene_entrez_tbl$foldchange
 names(all_fc_vec) <- gene_entrez_tbl$ENTREZID
 
-kegg_csv <- file.path(kegg_root, "{selected_combo}", "KEGG_result.csv")
+kegg_csv <- file.path(kegg_root, selected_combo, "KEGG_result.csv")
 if (!file.exists(kegg_csv)) stop("KEGG_result.csv not found for selected combo.")
 
 kegg_res <- suppressWarnings(read_csv(kegg_csv, show_col_types = FALSE))
@@ -116,19 +69,19 @@ sel_row <- dplyr::filter(kegg_res, ID == pathway_id_target)
 if (nrow(sel_row) == 0) stop("No matching pathway ID in KEGG_result.csv.")
 
 genes_raw <- unique(toupper(trimws(unlist(strsplit(as.character(sel_row$geneID[1]), "/")))))
-if (all(grepl("^[0-9]+$", genes_raw))) {{
+if (all(grepl("^[0-9]+$", genes_raw))) {
   pathway_entrez <- genes_raw
-}} else {{
-  conv_pw <- suppressWarnings(bitr(genes_raw, fromType = "SYMBOL", toType = "ENTREZID", OrgDb = org.Hs.eg.db))
+} else {
+  conv_pw <- suppressWarnings(symbol_to_entrez(genes_raw))
   pathway_entrez <- unique(conv_pw$ENTREZID)
-}}
+}
 pathway_entrez <- pathway_entrez[!is.na(pathway_entrez)]
 if (!length(pathway_entrez)) stop("No valid Entrez IDs for pathway.")
 
 fc_for_pathway <- all_fc_vec
 fc_for_pathway[!(names(fc_for_pathway) %in% pathway_entrez)] <- NA_real_
 
-out_dir <- file.path(pathview_root, "{selected_combo}")
+out_dir <- file.path(pathview_root, selected_combo)
 if (!dir.exists(out_dir)) dir.create(out_dir, recursive = TRUE)
 
 old_wd <- getwd()
@@ -138,19 +91,154 @@ pathview(
   gene.data   = fc_for_pathway,
   pathway.id  = sel_row$ID[1],
   species     = "hsa",
+  kegg.dir    = kegg_dir,
   gene.idtype = "entrez",
-  out.suffix  = paste0("{selected_combo}_", sel_row$ID[1]),
+  out.suffix  = paste0(selected_combo, "_", sel_row$ID[1]),
   low  = list(gene = "blue",  cpd = "blue"),
   mid  = list(gene = "white", cpd = "white"),
   high = list(gene = "red",   cpd = "red")
 )
+message(sprintf("[OK] %s: rendered %s", selected_combo, sel_row$ID[1]))
 """
-                tmp_r.write(r_code)
 
-            # Run R script
-            result = subprocess.run(["Rscript", r_script_path], capture_output=True, text=True, encoding="utf-8")
-            st.session_state["run_log"] = result.stdout + "\n" + result.stderr
-            st.success("Pathview execution completed!")
+# ----------------- Main Tab -----------------
+main_tab = st.tabs(["🧬 Pathview Analysis"])[0]
+
+with main_tab:
+    # ----------------- Sub Tabs -----------------
+    sub_tabs = st.tabs(["⚙️ Configure", "🚀 Run", "📊 Result", "⬇️ Download"])
+    configure_tab, run_tab, result_tab, download_tab = sub_tabs
+
+    # ----------------- 1) Configure -----------------
+    with configure_tab:
+        combo_csv_path = "/data/Deg/combo_names.csv"
+
+        # CSV에서 콤보명 읽기
+        try:
+            combo_df = pd.read_csv(combo_csv_path)
+            if "combo" in combo_df.columns:
+                combo_names = combo_df["combo"].dropna().tolist()
+            else:
+                st.error("combo_names.csv에 'combo' 컬럼이 없습니다.")
+                combo_names = []
+        except Exception as e:
+            st.error(f"combo_names.csv 읽기 실패: {e}")
+            combo_names = []
+
+        if not combo_names:
+            st.warning("콤보 이름을 불러올 수 없습니다.")
+        else:
+            # selectbox로 콤보 선택
+            selected_combo = st.selectbox("Select a combo case", combo_names)
+            st.session_state["selected_combo"] = selected_combo
+
+            kegg_csv_path = os.path.join(kegg_root, selected_combo, "KEGG_result.csv")
+
+            # 선택한 combo의 KEGG_result.csv 출력
+            if os.path.exists(kegg_csv_path):
+                try:
+                    kegg_df = pd.read_csv(kegg_csv_path)
+                    st.markdown(f"### KEGG Result for {selected_combo}")
+                    st.dataframe(kegg_df)
+                except Exception as e:
+                    st.warning(f"KEGG_result.csv 읽기 실패: {e}")
+            else:
+                st.info(f"{selected_combo}에 대한 KEGG_result.csv 파일이 없습니다.")
+
+            stored = list_pathways("hsa")
+            if stored:
+                st.caption(f"KEGG asset store: {len(stored)} hsa pathways available offline")
+            else:
+                st.warning("KEGG asset store가 비어 있습니다. `python -m src.analysis.kegg <snapshot>`로 먼저 채워주세요.")
+
+            # Native 모드는 저장된 KGML 좌표와 base PNG에 Python으로 직접 색을 칠해 여러 pathway를 한 번에 그림
+            pathview_mode = st.radio("Rendering", ["Native (Python)", "R (pathview)"], horizontal=True)
+            native = pathview_mode == "Native (Python)"
+            if native:
+                p_cutoff = st.number_input("p.adjust cutoff", value=0.05, min_value=0.0, max_value=1.0, step=0.01)
+                significant = []
+                if "kegg_df" in locals() and {"ID", "p.adjust", "geneID"} <= set(kegg_df.columns):
+                    significant = kegg_df.loc[kegg_df["p.adjust"] <= p_cutoff, "ID"].astype(str).tolist()
+                available = [p for p in significant if p in stored]
+                if len(available) < len(significant):
+                    missing = len(significant) - len(available)
+                    st.caption(f"{missing} significant pathways are not in the KEGG asset store.")
+                pathway_ids = st.multiselect("Pathways to render", available, default=available)
+                st.session_state["pathway_ids"] = pathway_ids
+            else:
+                # Pathway ID 입력
+                pathway_id_target = st.text_input("Pathway ID (e.g., hsa00230)", "")
+                st.session_state["pathway_id_target"] = pathway_id_target
+
+    # ----------------- 2) Run -----------------
+    with run_tab:
+        job = st.session_state.get("pathview_job")
+        running = job is not None and not job["done"].is_set()
+        if "native" in locals() and native:
+            if st.button("Run Pathview"):
+                if not st.session_state.get("pathway_ids"):
+                    st.error("⚠️ Please select pathways to render in the Configure tab.")
+                else:
+                    selected_combo = st.session_state["selected_combo"]
+                    pathway_ids = st.session_state["pathway_ids"]
+                    try:
+                        entrez, fold_changes = entrez_fold_changes(pd.read_csv(example_csv))
+                    except (OSError, ValueError) as e:
+                        st.error(f"⚠️ {e}")
+                    else:
+                        # R 스크립트와 같이 pathway마다 KEGG 결과의 유전자만 색칠
+                        idmap = load_idmap("org.Hs.eg.db")
+                        kegg_ids = kegg_df.assign(ID=kegg_df["ID"].astype(str)).drop_duplicates("ID")
+                        gene_ids = kegg_ids.set_index("ID")["geneID"]
+                        pathway_genes = {p: pathway_entrez(gene_ids[p], idmap) for p in pathway_ids}
+                        start = time.perf_counter()
+                        with st.spinner(f"Rendering {len(pathway_ids)} pathways..."):
+                            out_dir = os.path.join(pathview_root, selected_combo)
+                            errors = render_pathways(pathway_genes, entrez, fold_changes, out_dir, selected_combo)
+                        failed = {p: e for p, e in errors.items() if e is not None}
+                        st.success(
+                            f"Rendered {len(errors) - len(failed)} pathways in {time.perf_counter() - start:.1f}s."
+                        )
+                        for pathway_id, error in failed.items():
+                            st.error(f"{pathway_id}: {error}")
+        elif st.button("Run Pathview", disabled=running):
+            if "selected_combo" not in st.session_state or not st.session_state["selected_combo"]:
+                st.error("⚠️ Please select a combo case first in the Configure tab.")
+            elif "pathway_id_target" not in st.session_state or not st.session_state["pathway_id_target"].strip():
+                st.error("⚠️ Please enter a Pathway ID in the Configure tab.")
+            else:
+                selected_combo = st.session_state["selected_combo"]
+                pathway_id_target = st.session_state["pathway_id_target"]
+
+                pathway_id_target = pathway_id_target.strip()
+
+                # KGML/PNG는 공유 KEGG asset store에서 링크 — pathview가 네트워크에서 다시 받지 않음
+                try:
+                    kegg_dir = link_assets([pathway_id_target], os.path.join(pathview_root, selected_combo, "kegg"))
+                except (ValueError, FileNotFoundError) as e:
+                    st.error(f"⚠️ {e}. `python -m src.analysis.kegg <snapshot>`로 KEGG asset store를 먼저 채워주세요.")
+                else:
+                    # 패키지가 미리 로드된 R worker에서 백그라운드로 실행
+                    job = start_job(PATHVIEW_R, [{
+                        "example_root": example_root,
+                        "kegg_root": kegg_root,
+                        "pathview_root": pathview_root,
+                        "kegg_dir": str(kegg_dir),
+                        "selected_combo": selected_combo,
+                        "pathway_id_target": pathway_id_target,
+                    }], [selected_combo])
+                    st.session_state["pathview_job"] = job
+
+        if job is not None:
+            show_job("pathview_job")
+            if job["done"].is_set():
+                result = next(iter(job["results"].values()), None)
+                if job["cancel"].is_set():
+                    st.warning("Pathview execution was cancelled.")
+                elif result is not None and result["ok"]:
+                    st.success("Pathview execution completed!")
+                else:
+                    st.error(f"Pathview execution failed: {result['error'] if result else 'no result'}")
 
     # ----------------- Result -----------------
     with result_tab:
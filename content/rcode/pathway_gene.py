@@ -1,10 +1,14 @@
 import os
-import tempfile
 import shutil
 import streamlit as st
+import pandas as pd
 import requests
 from pathlib import Path
-from src.common.common import page_setup
+from src.common.common import page_setup, show_fig
+from src.common.archive import download_archive
+from src.common.static_files import show_download, show_image
+from src.common.svg import optimize_svgs
+from src.analysis.heatplot import core_matrix, heatplot_figure, select_heatplot
 
 params = page_setup()
 st.title("Heatmaplike Functional Classification")
@@ -55,6 +59,22 @@ with main_tabs[0]:
         height = st.number_input("Plot height", value=6.0, step=0.5)
         max_setsize = st.number_input("Max gene set size", value=50, step=1, min_value=1)
 
+        # Interactive 모드는 gseGO 결과의 core gene을 한 번만 파싱해 두고 설정 변경 시 바로 다시 그림
+        heatplot_mode = st.radio("Rendering", ["Interactive", "R (heatplot)"], horizontal=True)
+        interactive = heatplot_mode == "Interactive"
+        selected_method = None
+        if interactive:
+            analysis_info_path = csv_dir / "output" / "analysis_info.csv"
+            method_options = []
+            if analysis_info_path.exists():
+                info_df = pd.read_csv(analysis_info_path)
+                if "analysis_type" in info_df.columns:
+                    method_options = info_df["analysis_type"].dropna().unique().tolist()
+            if method_options:
+                selected_method = st.selectbox("분석 방법 선택", method_options)
+            else:
+                st.warning("분석 방법을 찾을 수 없습니다. DESeq2 분석을 먼저 실행해주세요.")
+
         st.session_state["heatplot_params"] = {
             "csv_path": str(csv_path),
             "edox_dir": str(edox_dir),
@@ -68,7 +88,9 @@ with main_tabs[0]:
 
     # ----------------- RUN -----------------
     with run_tab:
-        if st.button("Run Heatplot Generation"):
+        if interactive:
+            st.info("Interactive 모드는 Result 탭에서 바로 그려집니다. Run이 필요 없습니다.")
+        elif st.button("Run Heatplot Generation"):
             params = st.session_state.get("heatplot_params", None)
             if not params:
                 st.warning("Please configure parameters first.")
@@ -82,6 +104,7 @@ with main_tabs[0]:
                         zip_path = output_dir / "heatplot_results.zip"
                         zip_path.write_bytes(response.content)
                         shutil.unpack_archive(str(zip_path), extract_dir=str(output_dir))
+                        optimize_svgs(output_dir)
                         if zip_path.exists():
                             zip_path.unlink()
 
@@ -93,7 +116,24 @@ with main_tabs[0]:
 
     # ----------------- RESULT -----------------
     with result_tab:
-        if output_dir.exists():
+        if interactive and selected_method:
+            gsego_dir = csv_dir / "output" / selected_method / "gsego"
+            ontology_tabs = st.tabs(["BP", "CC", "MF"])
+            for ont_tab, ont in zip(ontology_tabs, ["BP", "CC", "MF"]):
+                with ont_tab:
+                    st.subheader(f"Ontology: {ont}")
+                    core = core_matrix(gsego_dir / f"gse_{ont}.csv", workspace, selected_method)
+                    if core is None:
+                        st.info(f"No gseGO result found for {ont}. gseGO를 먼저 실행해주세요.")
+                        continue
+                    table = select_heatplot(core, top_pathways, top_genes_per_pathway, max_setsize)
+                    if table.empty:
+                        st.info(f"No {ont} pathways within the gene set size limit.")
+                    else:
+                        show_fig(heatplot_figure(table), f"heatplot_{ont}")
+        elif interactive:
+            st.info("분석 방법을 선택해주세요.")
+        elif output_dir.exists():
             ontology_tabs = st.tabs(["BP", "CC", "MF"])
             for ont_tab, ont in zip(ontology_tabs, ["BP", "CC", "MF"]):
                 with ont_tab:
@@ -106,7 +146,7 @@ with main_tabs[0]:
                             for col, svg_file in zip(cols, svg_pair):
                                 with col:
                                     st.markdown(f"**{svg_file}**")
-                                    st.image(output_dir / svg_file, width=950)
+                                    show_image(output_dir / svg_file, width=950)
                     else:
                         st.info(f"No {ont} heatplots found.")
         else:
@@ -114,15 +154,15 @@ with main_tabs[0]:
 
     # ----------------- DOWNLOAD -----------------
     with download_tab:
-        if output_dir.exists() and any(output_dir.iterdir()):
-            with tempfile.TemporaryDirectory() as tmpdir:
-                zip_path = shutil.make_archive(os.path.join(tmpdir, "heatplot_results"), "zip", output_dir)
-                with open(zip_path, "rb") as f:
-                    st.download_button(
-                        label="Download Heatplot Results (ZIP)",
-                        data=f,
-                        file_name="heatplot_results.zip",
-                        mime="application/zip"
-                    )
+        zip_path = None if interactive else download_archive(output_dir, "heatplot_results")
+        if interactive:
+            st.info("Plot 우측 상단의 카메라 아이콘으로 이미지를 저장할 수 있습니다.")
+        elif zip_path:
+            show_download(
+                zip_path,
+                label="Download Heatplot Results (ZIP)",
+                file_name="heatplot_results.zip",
+                mime="application/zip"
+            )
         else:
             st.info("No files to download.")
\ No newline at end of file
@@ -2,7 +2,10 @@ import os
 import streamlit as st
 import requests
 from pathlib import Path
-from src.common.common import page_setup
+from src.common.common import page_setup, show_fig
+from src.analysis.pca import pca, pca_figure, N_COMPONENTS
+from src.common.static_files import show_download, show_image
+from src.common.svg import optimize_svg_file
 import pandas as pd
 
 # 기본 설정
@@ -53,9 +56,19 @@ with main_tab:
         st.session_state.height_pca = height_pca
         st.session_state.top_n_genes_pca = top_n_genes
 
+        # Interactive 모드: 가장 변동이 큰 top N 유전자로 로컬 PCA (randomized SVD, 결과 캐시)
+        pca_mode = st.radio("Rendering", ["Interactive", "R"], horizontal=True)
+        interactive = pca_mode == "Interactive"
+        if interactive:
+            pc_options = list(range(1, N_COMPONENTS + 1))
+            pc_x = st.selectbox("X axis component", pc_options, index=0, format_func=lambda i: f"PC{i}")
+            pc_y = st.selectbox("Y axis component", pc_options, index=1, format_func=lambda i: f"PC{i}")
+
     # Run
     with run_tab:
-        if "selected_method_pca" in st.session_state and st.session_state.selected_method_pca:
+        if interactive:
+            st.info("Interactive 모드는 Result 탭에서 바로 그려집니다. Run이 필요 없습니다.")
+        elif "selected_method_pca" in st.session_state and st.session_state.selected_method_pca:
             selected_method = st.session_state.selected_method_pca
             st.info(f"선택된 분석 방법: **{selected_method}**")
 
@@ -87,6 +100,7 @@ with main_tab:
                             # SVG 파일 저장 (FastAPI와 동일한 위치)
                             with open(output_svg_pca, "wb") as f_out:
                                 f_out.write(response.content)
+                            optimize_svg_file(output_svg_pca)
                             
                             st.success(f"✅ PCA plot generated successfully at: {output_svg_pca}")
                         else:
@@ -101,12 +115,24 @@ with main_tab:
 
     # Result
     with result_tab:
-        if "output_svg_pca" in st.session_state:
+        if interactive:
+            result = None
+            if selected_method:
+                with st.spinner("Computing principal components..."):
+                    result = pca(st.session_state.workspace, selected_method, top_n_genes)
+            if result is None:
+                st.info(f"merged_results_{selected_method}.csv 파일이 존재하지 않습니다. DESeq2 분석을 먼저 실행해주세요.")
+            elif max(pc_x, pc_y) > len(result["explained"]):
+                st.warning(f"샘플 수가 적어 PC{len(result['explained'])}까지만 계산되었습니다.")
+            else:
+                st.markdown(f"### PCA: top {len(result['genes'])} most variable genes")
+                show_fig(pca_figure(result, pc_x, pc_y), f"pca_{selected_method}_top{int(top_n_genes)}")
+        elif "output_svg_pca" in st.session_state:
             output_svg_pca = st.session_state.output_svg_pca
             
             if output_svg_pca.exists():
                 st.markdown(f"### PCA Result: {output_svg_pca.name}")
-                st.image(str(output_svg_pca), caption="PCA Plot", use_container_width=True)
+                show_image(str(output_svg_pca), caption="PCA Plot", use_container_width=True)
             else:
                 st.info("PCA plot을 생성하려면 Run 탭에서 실행해주세요.")
         else:
@@ -114,17 +140,18 @@ with main_tab:
 
     # Download
     with download_tab:
-        if "output_svg_pca" in st.session_state:
+        if interactive:
+            st.info("Plot 우측 상단의 카메라 아이콘으로 이미지를 저장할 수 있습니다.")
+        elif "output_svg_pca" in st.session_state:
             output_svg_pca = st.session_state.output_svg_pca
             
             if output_svg_pca.exists():
-                with open(output_svg_pca, "rb") as f:
-                    st.download_button(
-                        label="⬇️ Download PCA SVG",
-                        data=f,
-                        file_name=output_svg_pca.name,
-                        mime="image/svg+xml"
-                    )
+                show_download(
+                    output_svg_pca,
+                    label="⬇️ Download PCA SVG",
+                    file_name=output_svg_pca.name,
+                    mime="image/svg+xml"
+                )
                 st.success(f"📁 File location: {output_svg_pca}")
             else:
                 st.warning("⚠️ PCA 파일이 존재하지 않습니다. Run 탭에서 먼저 실행해주세요.")
@@ -2,10 +2,15 @@ import os
 import streamlit as st
 import pandas as pd
 import requests
-import tempfile
 import shutil
 from pathlib import Path
-from src.common.common import page_setup
+from src.common.common import page_setup, show_fig
+from src.common.archive import download_archive
+from src.common.static_files import show_download, show_image
+from src.common.svg import optimize_svgs
+from src.analysis.ranked import ranked_list
+from src.analysis.gsea import term_hits
+from src.analysis.ridge import binned_kde, core_scores, ridgeplot_figure
 
 # ----------------- PAGE SETUP -----------------
 params = page_setup()
@@ -56,6 +61,13 @@ with ridge_tab:
         width = st.number_input("Plot width", value=10.0, step=0.5)
         height = st.number_input("Plot height", value=8.0, step=0.5)
 
+        # Interactive 모드는 캐시된 ranked list로 core gene 분포를 바로 계산해 그림
+        ridge_mode = st.radio("Rendering", ["Interactive", "R (ridgeplot)"], horizontal=True)
+        interactive = ridge_mode == "Interactive"
+        if interactive:
+            show_category = st.number_input("Number of categories to show", value=30, step=1, min_value=1)
+            org_db = st.selectbox("OrgDb", ["org.Hs.eg.db", "org.Mm.eg.db"], index=0)
+
         st.session_state["ridgeplot_params"] = {
             "input_file": str(gseaplot_dir),
             "output_dir": str(ridge_dir),
@@ -65,7 +77,9 @@ with ridge_tab:
 
     # ----------------- RUN -----------------
     with run_tab:
-        if st.button("Run Ridgeplot GSEA"):
+        if interactive:
+            st.info("Interactive 모드는 Result 탭에서 바로 그려집니다. Run이 필요 없습니다.")
+        elif st.button("Run Ridgeplot GSEA"):
             params = st.session_state.get("ridgeplot_params", {})
             with st.spinner("Running R script via FastAPI..."):
                 try:
@@ -82,6 +96,7 @@ with ridge_tab:
 
                         # ZIP 풀기
                         shutil.unpack_archive(str(download_path), extract_dir=str(ridge_dir))
+                        optimize_svgs(ridge_dir)
 
                         # ZIP 삭제
                         if download_path.exists():
@@ -96,7 +111,27 @@ with ridge_tab:
 
     # ----------------- RESULT -----------------
     with result_tab:
-        if ridge_dir.exists():
+        ranked = ranked_list(workspace, selected_method) if interactive and selected_method else None
+        if interactive:
+            ontology_tabs = st.tabs(["BP", "CC", "MF"])
+            for ont_tab, ont in zip(ontology_tabs, ["BP", "CC", "MF"]):
+                with ont_tab:
+                    st.subheader(f"Ontology: {ont}")
+                    csv_file = gseaplot_dir / f"gse_{ont}.csv"
+                    if ranked is None:
+                        st.warning("Ranked gene list not found. DESeq2 결과를 먼저 업로드해주세요.")
+                    elif not csv_file.exists():
+                        st.info(f"No CSV found for {ont}")
+                    else:
+                        # gseGO 결과 순서대로 상위 term을 고른 뒤 NES 순으로 정렬 (enrichplot과 동일)
+                        df = pd.read_csv(csv_file).head(int(show_category)).sort_values("NES", kind="stable")
+                        if df.empty:
+                            st.info(f"No enriched terms for {ont}")
+                        else:
+                            hits = term_hits(workspace, selected_method, org_db, f"GO_{ont}")
+                            grid, densities = binned_kde(*core_scores(ranked, df, hits))
+                            show_fig(ridgeplot_figure(df, grid, densities), f"ridgeplot_{ont}")
+        elif ridge_dir.exists():
             ontology_tabs = st.tabs(["BP", "CC", "MF"])
             for ont_tab, ont in zip(ontology_tabs, ["BP", "CC", "MF"]):
                 with ont_tab:
@@ -109,7 +144,7 @@ with ridge_tab:
                             for col, svg_file in zip(cols, svg_pair):
                                 with col:
                                     st.markdown(f"**{svg_file}**")
-                                    st.image(ridge_dir / svg_file, width=800)
+                                    show_image(ridge_dir / svg_file, width=800)
                     else:
                         st.info(f"No {ont} ridgeplots found.")
         else:
@@ -117,15 +152,15 @@ with ridge_tab:
 
     # ----------------- DOWNLOAD -----------------
     with download_tab:
-        if ridge_dir.exists() and os.listdir(ridge_dir):
-            with tempfile.TemporaryDirectory() as tmpdir:
-                zip_path = shutil.make_archive(Path(tmpdir, "ridgeplot_results"), "zip", ridge_dir)
-                with open(zip_path, "rb") as f:
-                    st.download_button(
-                        label="Download Ridgeplot Results (ZIP)",
-                        data=f,
-                        file_name="ridgeplot_results.zip",
-                        mime="application/zip"
-                    )
+        zip_path = None if interactive else download_archive(ridge_dir, "ridgeplot_results")
+        if interactive:
+            st.info("Plot 우측 상단의 카메라 아이콘으로 이미지를 저장할 수 있습니다.")
+        elif zip_path:
+            show_download(
+                zip_path,
+                label="Download Ridgeplot Results (ZIP)",
+                file_name="ridgeplot_results.zip",
+                mime="application/zip"
+            )
         else:
             st.info("No files to download.")
\ No newline at end of file
@@ -1,8 +1,10 @@
 import os
 import requests
 import streamlit as st
-import shutil
-import tempfile
+
+from src.common.archive import download_archive
+from src.common.static_files import show_download, show_image
+from src.common.svg import optimize_svgs
 
 st.title("STRING Network Analysis Dashboard (via FastAPI)")
 
@@ -38,6 +40,7 @@ with main_tabs[0]:
             try:
                 resp = requests.post("http://localhost:8000/run_string", json=payload, timeout=600)
                 if resp.status_code == 200:
+                    optimize_svgs(output_dir)
                     st.success("STRING network generation completed via FastAPI!")
                     st.text(resp.json().get("message", "Done"))
                 else:
@@ -56,7 +59,7 @@ with main_tabs[0]:
                     svgs = [f for f in os.listdir(d) if f.endswith(".svg")]
                     for f in svgs:
                         st.write(f"**{os.path.basename(d)}: {f}**")
-                        st.image(os.path.join(d, f), use_container_width=True)
+                        show_image(os.path.join(d, f), use_container_width=True)
             else:
                 st.info("No combo directories found.")
         else:
@@ -64,15 +67,13 @@ with main_tabs[0]:
 
     # ----------------- Download -----------------
     with download_tab:
-        if os.path.exists(output_dir) and os.listdir(output_dir):
-            with tempfile.TemporaryDirectory() as tmpdir:
-                zip_path = shutil.make_archive(os.path.join(tmpdir, "STRING_results"), "zip", output_dir)
-                with open(zip_path, "rb") as f:
-                    st.download_button(
-                        label="Download STRING results (ZIP)",
-                        data=f,
-                        file_name="STRING_results.zip",
-                        mime="application/zip"
-                    )
+        zip_path = download_archive(output_dir, "STRING_results")
+        if zip_path:
+            show_download(
+                zip_path,
+                label="Download STRING results (ZIP)",
+                file_name="STRING_results.zip",
+                mime="application/zip"
+            )
         else:
             st.info("No files to download.")
\ No newline at end of file
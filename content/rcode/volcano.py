@@ -2,7 +2,11 @@ import os
 import requests
 import streamlit as st
 from pathlib import Path
-from src.common.common import page_setup
+from src.common.common import page_setup, show_fig, show_table
+from src.analysis.results import load_results
+from src.analysis.volcano import volcano_figure, selected_genes
+from src.common.static_files import show_download, show_image
+from src.common.svg import optimize_svg_file
 import pandas as pd
 
 # ----------------- 기본 설정 -----------------
@@ -53,9 +57,15 @@ with volcano_tab:
         st.session_state.fc_cutoff = fc_cutoff
         st.session_state.pval_cutoff = pval_cutoff
 
+        # Interactive 모드는 결과 CSV로 바로 그리므로 cutoff 변경 시 백엔드 호출이 필요 없음
+        volcano_mode = st.radio("Rendering", ["Interactive (WebGL)", "R (EnhancedVolcano)"], horizontal=True)
+        interactive = volcano_mode == "Interactive (WebGL)"
+
     # Run
     with run_tab:
-        if "selected_method_volcano" in st.session_state and st.session_state.selected_method_volcano:
+        if interactive:
+            st.info("Interactive 모드는 Result 탭에서 바로 그려집니다. Run이 필요 없습니다.")
+        elif "selected_method_volcano" in st.session_state and st.session_state.selected_method_volcano:
             selected_method = st.session_state.selected_method_volcano
             st.info(f"선택된 분석 방법: **{selected_method}**")
 
@@ -86,6 +96,7 @@ with volcano_tab:
                             # SVG 파일 저장 (FastAPI와 동일한 위치)
                             with open(output_svg_volcano, "wb") as f_out:
                                 f_out.write(response.content)
+                            optimize_svg_file(output_svg_volcano)
                             
                             st.success(f"✅ Volcano Plot generated successfully at: {output_svg_volcano}")
                         else:
@@ -100,12 +111,27 @@ with volcano_tab:
 
     # Result
     with result_tab:
-        if "output_svg_volcano" in st.session_state:
+        results = load_results(st.session_state.workspace, selected_method) if selected_method else None
+        if interactive:
+            if results is None:
+                st.info(f"merged_results_{selected_method}.csv 파일이 존재하지 않습니다. DESeq2 분석을 먼저 실행해주세요.")
+            elif not {"log2FoldChange", "pvalue"} <= set(results.columns):
+                st.error("결과 파일에 log2FoldChange / pvalue 컬럼이 없습니다.")
+            else:
+                fig = volcano_figure(results, fc_cutoff, pval_cutoff)
+                show_fig(fig, f"volcano_{selected_method}", selection_session_state_key="volcano_selection")
+                selection = selected_genes(results, st.session_state.get("volcano_selection"))
+                if selection.empty:
+                    st.caption("Drag a box in the plot to list the selected genes.")
+                else:
+                    st.markdown(f"**Selected genes: {len(selection)}**")
+                    show_table(selection, f"volcano_selection_{selected_method}")
+        elif "output_svg_volcano" in st.session_state:
             output_svg_volcano = st.session_state.output_svg_volcano
             
             if output_svg_volcano.exists():
                 st.markdown(f"### Volcano Plot Result: {output_svg_volcano.name}")
-                st.image(str(output_svg_volcano), caption="Volcano Plot", use_container_width=True)
+                show_image(str(output_svg_volcano), caption="Volcano Plot", use_container_width=True)
             else:
                 st.info("Volcano Plot을 생성하려면 Run 탭에서 실행해주세요.")
         else:
@@ -113,17 +139,18 @@ with volcano_tab:
 
     # Download
     with download_tab:
-        if "output_svg_volcano" in st.session_state:
+        if interactive:
+            st.info("Plot 우측 상단의 카메라 아이콘으로 이미지를 저장하고, 선택한 유전자는 Result 탭에서 다운로드할 수 있습니다.")
+        elif "output_svg_volcano" in st.session_state:
             output_svg_volcano = st.session_state.output_svg_volcano
             
             if output_svg_volcano.exists():
-                with open(output_svg_volcano, "rb") as f:
-                    st.download_button(
-                        label="⬇️ Download Volcano SVG",
-                        data=f,
-                        file_name=output_svg_volcano.name,
-                        mime="image/svg+xml"
-                    )
+                show_download(
+                    output_svg_volcano,
+                    label="⬇️ Download Volcano SVG",
+                    file_name=output_svg_volcano.name,
+                    mime="image/svg+xml"
+                )
                 st.success(f"📁 File location: {output_svg_volcano}")
             else:
                 st.warning("⚠️ Volcano Plot 파일이 존재하지 않습니다. Run 탭에서 먼저 실행해주세요.")
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from src.analysis.network import cached_layout, edge_traces
+
+
+def cnet_graph(df: pd.DataFrame, show_category: int = 5) -> dict:
+    """
+    Build the gene-concept network of enrichment results like enrichplot's cnetplot.
+
+    Args:
+        df (pd.DataFrame): Results in the clusterProfiler layout.
+        show_category (int, optional): Number of terms with the smallest p.adjust to show. Defaults to 5.
+
+    Returns:
+        dict: 'nodes' (term IDs, then genes), 'labels', 'n_terms', 'edges' ((n_edges, 2) term to gene node
+        indices) and 'terms', the shown rows.
+    """
+    top = df.astype({"p.adjust": float, "Count": float}).sort_values("p.adjust", kind="stable")
+    top = top.head(int(show_category)).reset_index(drop=True)
+    members = [str(genes).split("/") if isinstance(genes, str) and genes else [] for genes in top["geneID"]]
+    genes = pd.Index(list(dict.fromkeys(g for term_genes in members for g in term_genes)))
+    n_terms = len(top)
+    term_rows = np.repeat(np.arange(n_terms), [len(m) for m in members])
+    gene_rows = n_terms + genes.get_indexer([g for m in members for g in m])
+    return {
+        "nodes": list(top["ID"].astype(str)) + list(genes),
+        "labels": list(top["Description"].astype(str)) + list(genes),
+        "n_terms": n_terms,
+        "edges": np.column_stack([term_rows, gene_rows]).astype(np.int64),
+        "terms": top,
+    }
+
+
+def cnet_figure(graph: dict, fold_change: pd.Series | None = None, scope: str = "") -> go.Figure:
+    """
+    Plot a gene-concept network.
+
+    The layout is cached per graph and warm-started from the previous graph of the same scope.
+
+    Args:
+        graph (dict): Output of `cnet_graph`.
+        fold_change (pd.Series | None, optional): log2 fold change by gene, colours the gene nodes.
+        scope (str, optional): Layout cache scope, e.g. the combination and ontology. Defaults to ''.
+
+    Returns:
+        go.Figure: Terms sized by count, genes coloured by fold change.
+    """
+    pos = cached_layout(graph["nodes"], graph["edges"], scope=scope)
+    n_terms = graph["n_terms"]
+    genes = graph["nodes"][n_terms:]
+    terms = graph["terms"]
+
+    fig = go.Figure(edge_traces(pos, graph["edges"], np.ones(len(graph["edges"])), n_widths=1))
+    max_count = float(terms["Count"].max()) if n_terms else 1.0
+    fig.add_trace(
+        go.Scatter(
+            x=pos[:n_terms, 0],
+            y=pos[:n_terms, 1],
+            mode="markers+text",
+            text=graph["labels"][:n_terms],
+            textposition="top center",
+            marker=dict(
+                size=terms["Count"],
+                sizemode="area",
+                sizeref=2.0 * max(max_count, 1.0) / 30**2,
+                color="#E5C494",
+                line=dict(width=0.5, color="white"),
+            ),
+            customdata=terms[["ID", "Count", "p.adjust"]].to_numpy(),
+            hovertemplate="%{customdata[0]}<br>%{text}<br>Count %{customdata[1]}<br>p.adjust %{customdata[2]:.2e}"
+            "<extra></extra>",
+            name="Term",
+            showlegend=False,
+        )
+    )
+    values = None if fold_change is None else fold_change.reindex(genes).to_numpy(dtype=float)
+    limit = float(np.nanmax(np.abs(values))) if values is not None and np.isfinite(values).any() else 1.0
+    fig.add_trace(
+        go.Scatter(
+            x=pos[n_terms:, 0],
+            y=pos[n_terms:, 1],
+            mode="markers+text",
+            text=genes,
+            textposition="bottom center",
+            textfont=dict(size=9),
+            marker=dict(
+                size=8,
+                color="#B3B3B3" if values is None else np.nan_to_num(values),
+                colorscale="RdBu_r",
+                cmin=-limit,
+                cmax=limit,
+                colorbar=None if values is None else dict(title="log2FC"),
+            ),
+            customdata=np.zeros(len(genes)) if values is None else values,
+            hovertemplate="%{text}"
+            + ("" if values is None else "<br>log2FC %{customdata:.2f}")
+            + "<extra></extra>",
+            name="Gene",
+            showlegend=False,
+        )
+    )
+    fig.update_layout(
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False, scaleanchor="x"),
+        height=max(500, 4 * len(graph["nodes"]) + 300),
+        plot_bgcolor="white",
+    )
+    return fig
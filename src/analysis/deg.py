@@ -0,0 +1,370 @@
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+
+from src.analysis.results import COLUMN_ALIASES, load_results, results_path
+
+# Bitmasks of all threshold combinations, written next to combo_names.csv.
+MASKS_FILE = "deg_masks.npz"
+GENE_LIST_FILE = "filtered_gene_list.csv"
+
+
+def deg_path(workspace: Path, method: str) -> Path:
+    """
+    Return the DEG output directory of an analysis method.
+
+    Args:
+        workspace (Path): The current workspace.
+        method (str): The analysis method.
+
+    Returns:
+        Path: Path to the 'deg' directory next to the merged results.
+    """
+    return Path(workspace, "csv-files", "output", method, "deg")
+
+
+def parse_thresholds(text: str) -> list[float]:
+    """
+    Parse a comma-separated list of thresholds.
+
+    Args:
+        text (str): e.g. "1.5,2".
+
+    Returns:
+        list[float]: The unique thresholds in input order.
+
+    Raises:
+        ValueError: If an entry is not a positive number.
+    """
+    values = []
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        value = float(item)
+        if value <= 0:
+            raise ValueError(f"Threshold must be positive: {item}")
+        if value not in values:
+            values.append(value)
+    return values
+
+
+def combo_name(fc: float, p: float) -> str:
+    """
+    Return the directory name of a threshold combination, formatted like R prints numbers, e.g. 'FC1.5_p0.05'.
+
+    Args:
+        fc (float): Fold change threshold.
+        p (float): Adjusted p-value threshold.
+
+    Returns:
+        str: The combination name.
+    """
+    return f"FC{fc:g}_p{p:g}"
+
+
+def filter_grid(log2fc: np.ndarray, padj: np.ndarray, fcs: list[float], ps: list[float]) -> np.ndarray:
+    """
+    Evaluate all fold change x p-value threshold combinations in one broadcasted pass.
+
+    A gene passes a combination if |log2FC| >= log2(fc) and padj < p. Genes with missing values never pass.
+
+    Args:
+        log2fc (np.ndarray): log2 fold changes of n genes.
+        padj (np.ndarray): Adjusted p-values of n genes.
+        fcs (list[float]): Fold change thresholds (not log-transformed).
+        ps (list[float]): Adjusted p-value thresholds.
+
+    Returns:
+        np.ndarray: Boolean array of shape (len(fcs), len(ps), n).
+    """
+    with np.errstate(invalid="ignore"):
+        passes_fc = np.abs(log2fc)[None, :] >= np.log2(np.asarray(fcs, dtype=np.float64))[:, None]
+        passes_p = padj[None, :] < np.asarray(ps, dtype=np.float64)[:, None]
+    return passes_fc[:, None, :] & passes_p[None, :, :]
+
+
+def run_deg(results: pd.DataFrame, fcs: list[float], ps: list[float], deg_dir: Path) -> list[str]:
+    """
+    Filter DEGs for every threshold combination and store the result as packed bitmasks.
+
+    Replaces any previous DEG results in deg_dir. Only 'combo_names.csv' and the bitmask file are written;
+    per-combination CSV files are created on demand by `export_combos`. The bitmasks record the length and
+    version of the results they index, so `load_deg` ignores them once the results change.
+
+    Args:
+        results (pd.DataFrame): Results loaded with `src.analysis.results.load_results`.
+        fcs (list[float]): Fold change thresholds.
+        ps (list[float]): Adjusted p-value thresholds.
+        deg_dir (Path): Output directory.
+
+    Returns:
+        list[str]: The combination names.
+    """
+    deg_dir = Path(deg_dir)
+    grid = filter_grid(results["log2FoldChange"].to_numpy(), results["padj"].to_numpy(), fcs, ps)
+    combos = [combo_name(fc, p) for fc in fcs for p in ps]
+
+    if deg_dir.exists():
+        shutil.rmtree(deg_dir)
+    deg_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = deg_dir / (MASKS_FILE + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            combos=np.array(combos),
+            bits=np.packbits(grid.reshape(len(combos), -1), axis=1),
+            n_genes=np.int64(len(results)),
+            source_mtime_ns=np.int64(results.attrs.get("mtime_ns", -1)),
+        )
+    os.replace(tmp_path, deg_dir / MASKS_FILE)
+    pd.DataFrame({"combo": combos}).to_csv(deg_dir / "combo_names.csv", index=False)
+    return combos
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _load_masks(path: str, mtime_ns: int, n_genes: int, source_mtime_ns: int) -> dict[str, np.ndarray] | None:
+    with np.load(path) as data:
+        n = int(data["n_genes"])
+        if n != n_genes or "source_mtime_ns" not in data.files or int(data["source_mtime_ns"]) != source_mtime_ns:
+            return None
+        bits = np.unpackbits(data["bits"], axis=1, count=n).astype(bool)
+        return {combo: np.flatnonzero(row) for combo, row in zip(data["combos"].tolist(), bits)}
+
+
+def load_deg(deg_dir: Path, results: pd.DataFrame | None) -> dict[str, np.ndarray] | None:
+    """
+    Load the DEG row indices per threshold combination.
+
+    Args:
+        deg_dir (Path): Directory written by `run_deg`.
+        results (pd.DataFrame | None): The current results, loaded with `src.analysis.results.load_results`.
+
+    Returns:
+        dict[str, np.ndarray] | None: Row indices into the results table per combination, or None if the
+        DEGs were not computed locally or were computed from another version of the results.
+    """
+    path = Path(deg_dir, MASKS_FILE)
+    if results is None or not path.exists():
+        return None
+    return _load_masks(str(path), path.stat().st_mtime_ns, len(results), int(results.attrs.get("mtime_ns", -1)))
+
+
+def combo_table(results: pd.DataFrame, rows: np.ndarray) -> pd.DataFrame:
+    """
+    Return the DEG table of one combination with the original column names of the results file.
+
+    Args:
+        results (pd.DataFrame): Results loaded with `src.analysis.results.load_results`.
+        rows (np.ndarray): Row indices from `load_deg`.
+
+    Returns:
+        pd.DataFrame: The filtered genes.
+    """
+    original = dict(results.attrs.get("original_columns", {}))
+    if str(original.get("gene", "")).startswith("Unnamed"):
+        original["gene"] = "Geneid"
+    return results.iloc[rows].rename(columns=original)
+
+
+def export_combos(workspace: Path, method: str) -> None:
+    """
+    Write '<combo>/filtered_gene_list.csv' for every locally computed combination without an up to date file.
+
+    Needed for downloads and for the R steps that read the DEG lists from disk. Does nothing if the DEGs
+    were computed by the backend.
+
+    Args:
+        workspace (Path): The current workspace.
+        method (str): The analysis method.
+
+    Returns:
+        None
+    """
+    deg_dir = deg_path(workspace, method)
+    results = load_results(workspace, method)
+    masks = load_deg(deg_dir, results)
+    if masks is None:
+        return
+    masks_mtime = (deg_dir / MASKS_FILE).stat().st_mtime_ns
+    for combo, rows in masks.items():
+        out_path = deg_dir / combo / GENE_LIST_FILE
+        if out_path.exists() and out_path.stat().st_mtime_ns >= masks_mtime:
+            continue
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        combo_table(results, rows).to_csv(out_path, index=False)
+
+
+def deg_genes(workspace: Path, method: str) -> dict[str, np.ndarray]:
+    """
+    Return the DEG gene identifiers of every threshold combination.
+
+    Reads the bitmasks of a local run, or the 'filtered_gene_list.csv' files written by the backend.
+
+    Args:
+        workspace (Path): The current workspace.
+        method (str): The analysis method.
+
+    Returns:
+        dict[str, np.ndarray]: Gene identifiers per combination, in the order of combo_names.csv.
+    """
+    deg_dir = deg_path(workspace, method)
+    combo_csv = deg_dir / "combo_names.csv"
+    if not combo_csv.exists():
+        return {}
+    combos = pd.read_csv(combo_csv)["combo"].tolist()
+    results = load_results(workspace, method)
+    masks = load_deg(deg_dir, results)
+    if masks is None and (deg_dir / MASKS_FILE).exists():
+        # A local run on an older version of the results; its exported lists are just as outdated.
+        return {}
+    genes = {}
+    for combo in combos:
+        if masks is not None and combo in masks:
+            genes[combo] = results["gene"].to_numpy()[masks[combo]]
+            continue
+        path = deg_dir / combo / GENE_LIST_FILE
+        if path.exists():
+            df = pd.read_csv(path)
+            aliases = {a.lower() for a in COLUMN_ALIASES["gene"]}
+            column = next((c for c in df.columns if c.lower() in aliases), df.columns[0])
+            genes[combo] = df[column].astype(str).to_numpy()
+    return genes
+
+def _prefix_levels(rank: np.ndarray) -> list[np.ndarray]:
+    # Level L sorts the ranks within aligned chunks of 2**L genes; the chunk id in the high part of the key
+    # lets one searchsorted call query every chunk at once.
+    n = rank.size
+    positions = np.arange(n, dtype=np.int64)
+    return [np.sort((positions >> level) * n + rank) for level in range(max(n, 1).bit_length())]
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _count_index(path: str, mtime_ns: int, workspace: str, method: str) -> dict:
+    df = load_results(Path(workspace), method)
+    log2fc = df["log2FoldChange"].to_numpy()
+    padj = df["padj"].to_numpy()
+    valid = ~(np.isnan(log2fc) | np.isnan(padj))
+    by_padj = np.argsort(padj[valid], kind="stable")
+    values = log2fc[valid][by_padj]
+    by_value = np.argsort(values, kind="stable")
+    rank = np.empty(values.size, dtype=np.int64)
+    rank[by_value] = np.arange(values.size)
+    return {
+        "padj": padj[valid][by_padj],
+        "log2fc": values[by_value],
+        "levels": _prefix_levels(rank),
+    }
+
+
+def count_index(workspace: Path, method: str) -> dict | None:
+    """
+    Build the index behind `count_degs` for the merged results of an analysis method.
+
+    Genes are sorted by padj, so the genes passing a p-value threshold are a prefix of that order. The
+    prefix is covered by at most log2(n) aligned chunks whose log2 fold changes are presorted, so every count
+    is a handful of binary searches. Built once per results file version.
+
+    This is a merge-sort tree rather than a precomputed 2-D cumulative count surface: a query costs
+    O(log^2 n), one binary search per level, and the index holds log2(n) sorted copies of n int64 keys. A
+    dense surface would answer in O(log n) but needs a cell for every distinct (|log2FC|, padj) pair, O(n^2)
+    memory, to stay exact for continuous thresholds; the tree stays exact in O(n log n).
+
+    Args:
+        workspace (Path): The current workspace.
+        method (str): The analysis method.
+
+    Returns:
+        dict | None: The index, or None without results.
+    """
+    path = results_path(workspace, method)
+    if not path.exists():
+        return None
+    return _count_index(str(path), path.stat().st_mtime_ns, str(workspace), method)
+
+
+def count_degs(index: dict, fc, p) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Count up- and down-regulated genes for any fold change and p-value thresholds.
+
+    Uses the same rule as `filter_grid`: |log2FC| >= log2(fc) and padj < p. Thresholds broadcast against each
+    other, so a whole grid is counted in one call.
+
+    Args:
+        index (dict): Output of `count_index`.
+        fc (float | np.ndarray): Fold change thresholds (not log-transformed), at least 1.
+        p (float | np.ndarray): Adjusted p-value thresholds.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Number of up- and down-regulated genes.
+    """
+    cutoff = np.log2(np.asarray(fc, dtype=np.float64))
+    prefix = np.searchsorted(index["padj"], np.asarray(p, dtype=np.float64), side="left")
+    cutoff, prefix = np.broadcast_arrays(cutoff, prefix)
+    sorted_fc = index["log2fc"]
+    n = sorted_fc.size
+    # Genes are up if their rank is at least up_rank and down if it is below down_rank. A cutoff of 0 counts
+    # genes without change once, as up.
+    up_rank = np.searchsorted(sorted_fc, cutoff, side="left")
+    down_rank = np.where(
+        cutoff > 0,
+        np.searchsorted(sorted_fc, -cutoff, side="right"),
+        np.searchsorted(sorted_fc, 0.0, side="left"),
+    )
+    up = np.zeros(prefix.shape, dtype=np.int64)
+    down = np.zeros(prefix.shape, dtype=np.int64)
+    for level, keys in enumerate(index["levels"]):
+        covered = (prefix >> level) & 1 == 1
+        if not covered.any():
+            continue
+        base = ((prefix[covered] >> level) - 1) * n
+        start = np.searchsorted(keys, base)
+        up[covered] += np.searchsorted(keys, base + n) - np.searchsorted(keys, base + up_rank[covered])
+        down[covered] += np.searchsorted(keys, base + down_rank[covered]) - start
+    return up, down
+
+
+def count_surface_figure(index: dict, fc: float, p: float, n_grid: int = 120) -> go.Figure:
+    """
+    Plot the number of DEGs over fold change and p-value thresholds as a contour map.
+
+    Args:
+        index (dict): Output of `count_index`.
+        fc (float): Selected fold change threshold, marked on the map.
+        p (float): Selected adjusted p-value threshold, marked on the map.
+        n_grid (int, optional): Grid points per axis. Defaults to 120.
+
+    Returns:
+        go.Figure: The contour map.
+    """
+    max_fc = 2 ** min(float(np.abs(index["log2fc"]).max(initial=1.0)), 10.0)
+    fcs = np.linspace(1.0, max(max_fc, 2.0), n_grid)
+    ps = np.logspace(-10, 0, n_grid)
+    up, down = count_degs(index, fcs[None, :], ps[:, None])
+    total = up + down
+    fig = go.Figure(
+        go.Contour(
+            x=fcs,
+            y=ps,
+            z=total,
+            colorscale="Viridis",
+            colorbar=dict(title="DEGs"),
+            contours=dict(showlabels=True),
+            customdata=np.dstack([up, down]),
+            hovertemplate="FC %{x:.2f}<br>padj %{y:.2e}<br>%{z} DEGs (%{customdata[0]} up, "
+            "%{customdata[1]} down)<extra></extra>",
+        )
+    )
+    fig.add_trace(go.Scatter(x=[fc], y=[p], mode="markers", marker=dict(color="red", size=12, symbol="x")))
+    fig.update_layout(
+        xaxis_title="Fold change threshold",
+        yaxis=dict(title="padj threshold", type="log"),
+        showlegend=False,
+        height=550,
+    )
+    return fig
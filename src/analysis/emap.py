@@ -0,0 +1,171 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+
+from src.analysis.network import cached_layout, edge_traces
+
+# Similarity measures of enrichplot::pairwise_termsim on gene sets and the default edge cutoff of emapplot.
+MEASURES = {"Jaccard": "jaccard", "Overlap": "overlap"}
+MIN_EDGE = 0.2
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """
+    Count the set bits of every 64-bit word.
+
+    Args:
+        words (np.ndarray): uint64 array.
+
+    Returns:
+        np.ndarray: Set bits per word, same shape.
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    return _POPCOUNT[words.view(np.uint8)].reshape(*words.shape, 8).sum(axis=-1, dtype=np.uint8)
+
+
+def gene_bitsets(gene_lists: list[list[str]]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Encode gene sets as packed bitsets over the union of their genes.
+
+    Args:
+        gene_lists (list[list[str]]): Genes of every set.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (n_sets, n_words) uint64 bitsets and the size of every set.
+    """
+    universe = pd.Index(sorted({g for genes in gene_lists for g in genes}))
+    n_words = max((len(universe) + 63) // 64, 1)
+    bits = np.zeros((len(gene_lists), n_words * 64), dtype=bool)
+    for row, genes in enumerate(gene_lists):
+        bits[row, universe.get_indexer(genes)] = True
+    sizes = bits.sum(axis=1)
+    packed = np.packbits(bits, axis=1)
+    return packed.view(np.uint64).reshape(len(gene_lists), n_words), sizes
+
+
+def pairwise_similarity(bits: np.ndarray, sizes: np.ndarray, measure: str = "jaccard") -> np.ndarray:
+    """
+    All-pairs similarity of gene set bitsets.
+
+    Intersections are popcounts of the AND of two bitsets, computed for a block of rows against all rows at a
+    time to bound the memory of the broadcast.
+
+    Args:
+        bits (np.ndarray): Output of `gene_bitsets`.
+        sizes (np.ndarray): Set sizes.
+        measure (str, optional): 'jaccard' (|A & B| / |A | B|) or 'overlap' (|A & B| / min(|A|, |B|)).
+
+    Returns:
+        np.ndarray: (n_sets, n_sets) float32 similarities.
+
+    Raises:
+        ValueError: If the measure is unknown.
+    """
+    if measure not in MEASURES.values():
+        raise ValueError(f"Unknown similarity measure: {measure}")
+    n_sets, n_words = bits.shape
+    intersect = np.zeros((n_sets, n_sets), dtype=np.int64)
+    block = max(1, 4_000_000 // max(n_sets * n_words, 1))
+    for start in range(0, n_sets, block):
+        stop = min(start + block, n_sets)
+        intersect[start:stop] = popcount(bits[start:stop, None, :] & bits[None, :, :]).sum(axis=-1)
+
+    sizes = np.asarray(sizes, dtype=np.int64)
+    if measure == "jaccard":
+        denominator = sizes[:, None] + sizes[None, :] - intersect
+    else:
+        denominator = np.minimum(sizes[:, None], sizes[None, :])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        similarity = np.where(denominator > 0, intersect / denominator, 0.0)
+    return similarity.astype(np.float32)
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _term_similarity(path: str, mtime_ns: int, measure: str) -> dict:
+    df = pd.read_csv(path, dtype={"ID": str, "Description": str, "geneID": str}, keep_default_na=False)
+    df = df.astype({"p.adjust": float, "Count": float}).sort_values("p.adjust", kind="stable")
+    df = df.reset_index(drop=True)
+    bits, sizes = gene_bitsets([genes.split("/") if genes else [] for genes in df["geneID"]])
+    return {"terms": df, "similarity": pairwise_similarity(bits, sizes, measure)}
+
+
+def term_similarity(result_csv: Path, measure: str = "jaccard") -> dict | None:
+    """
+    Load the term similarity matrix of an enrichment result.
+
+    All terms are compared once, in p.adjust order, so any number of top terms is a slice of the cached matrix.
+    The cache is keyed by the result file, i.e. per combination and ontology, and its modification time.
+
+    Args:
+        result_csv (Path): The enrichment result, e.g. 'deg/enrich/<combo>/GO_BP_result.csv'.
+        measure (str, optional): 'jaccard' or 'overlap'. Defaults to 'jaccard'.
+
+    Returns:
+        dict | None: 'terms' sorted by p.adjust and their 'similarity', or None if the result does not exist.
+    """
+    result_csv = Path(result_csv)
+    if not result_csv.exists():
+        return None
+    return _term_similarity(str(result_csv), result_csv.stat().st_mtime_ns, measure)
+
+
+def emap_figure(
+    similarity: dict, show_category: int = 30, min_edge: float = MIN_EDGE, scope: str = ""
+) -> go.Figure:
+    """
+    Plot an enrichment map like enrichplot's emapplot.
+
+    Args:
+        similarity (dict): Output of `term_similarity`.
+        show_category (int, optional): Number of terms with the smallest p.adjust to show. Defaults to 30.
+        min_edge (float, optional): Smallest similarity drawn as an edge. Defaults to 0.2.
+        scope (str, optional): Layout cache scope, e.g. the combination and ontology. Defaults to ''.
+
+    Returns:
+        go.Figure: Terms as nodes sized by count and coloured by p.adjust, similar terms joined by edges.
+    """
+    n = min(int(show_category), len(similarity["terms"]))
+    top = similarity["terms"].head(n)
+    matrix = similarity["similarity"][:n, :n]
+    rows, cols = np.nonzero(np.triu(matrix >= min_edge, k=1) & (matrix > 0))
+    edges = np.column_stack([rows, cols])
+    weights = matrix[rows, cols]
+    pos = cached_layout(list(top["ID"]), edges, weights, scope)
+
+    max_count = float(top["Count"].max()) if n else 1.0
+    fig = go.Figure(edge_traces(pos, edges, weights))
+    fig.add_trace(
+        go.Scatter(
+            x=pos[:, 0],
+            y=pos[:, 1],
+            mode="markers+text",
+            text=top["Description"],
+            textposition="top center",
+            marker=dict(
+                size=top["Count"],
+                sizemode="area",
+                sizeref=2.0 * max(max_count, 1.0) / 30**2,
+                color=top["p.adjust"],
+                colorscale="Bluered_r",
+                colorbar=dict(title="p.adjust"),
+                line=dict(width=0.5, color="white"),
+            ),
+            customdata=top[["ID", "Count", "p.adjust"]].to_numpy(),
+            hovertemplate="%{customdata[0]}<br>%{text}<br>Count %{customdata[1]}<br>p.adjust %{customdata[2]:.2e}"
+            "<extra></extra>",
+            showlegend=False,
+        )
+    )
+    fig.update_layout(
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False, scaleanchor="x"),
+        height=max(500, 12 * n + 300),
+        plot_bgcolor="white",
+    )
+    return fig
@@ -0,0 +1,309 @@
+"""
+On-disk gene set index shared by the local enrichment engines.
+
+Every collection (e.g. GO BP of org.Hs.eg.db or a user GMT file) is a directory with
+
+- genes.csv: the gene universe of the collection ('gene_id' and 'symbol'), in column order,
+- terms.csv: 'term', 'description' and 'size' per term, in row order,
+- indptr.npy / indices.npy: term x gene membership as CSR arrays,
+- bits.npy: the same membership as packed bitsets, one row of ceil(n_genes / 8) bytes per term.
+
+The arrays are memory-mapped, so all sessions and worker processes share the page cache instead of holding
+their own copies. Collections are built once with
+
+    python -m src.analysis.genesets org org.Hs.eg.db
+    python -m src.analysis.genesets gmt c2.cp.kegg.v2024.1.Hs.entrez.gmt --name KEGG
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import streamlit as st
+
+GENE_SET_DIR = Path(os.getenv("GENE_SET_DIR", "gene-sets"))
+GO_ONTOLOGIES = ("BP", "CC", "MF")
+GMT_SOURCE = "gmt"
+META_FILE = "meta.json"
+
+
+def collection_path(source: str, name: str) -> Path:
+    """
+    Return the directory of a gene set collection.
+
+    Args:
+        source (str): The annotation source, e.g. 'org.Hs.eg.db', or 'gmt' for user files.
+        name (str): The collection, e.g. 'GO_BP'.
+
+    Returns:
+        Path: The collection directory.
+    """
+    return GENE_SET_DIR / source / name
+
+
+def list_collections() -> dict[str, list[str]]:
+    """
+    List the built gene set collections.
+
+    Returns:
+        dict[str, list[str]]: Collection names per source.
+    """
+    if not GENE_SET_DIR.exists():
+        return {}
+    found = {}
+    for meta in sorted(GENE_SET_DIR.glob(f"*/*/{META_FILE}")):
+        found.setdefault(meta.parent.parent.name, []).append(meta.parent.name)
+    return found
+
+
+def write_collection(path: Path, genes: pd.DataFrame, terms: pd.DataFrame, members: list[np.ndarray]) -> None:
+    """
+    Write a gene set collection, replacing an existing one atomically.
+
+    Args:
+        path (Path): The collection directory.
+        genes (pd.DataFrame): 'gene_id' and 'symbol' of the gene universe.
+        terms (pd.DataFrame): 'term' and 'description' per gene set.
+        members (list[np.ndarray]): Column indices into genes for every term.
+
+    Returns:
+        None
+    """
+    path = Path(path)
+    n_genes = len(genes)
+    members = [np.unique(np.asarray(m, dtype=np.int32)) for m in members]
+    sizes = np.array([m.size for m in members], dtype=np.int64)
+    indptr = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+    indices = np.concatenate(members).astype(np.int32) if members else np.zeros(0, dtype=np.int32)
+
+    bits = np.zeros((len(members), (n_genes + 7) // 8), dtype=np.uint8)
+    rows = np.repeat(np.arange(len(members)), sizes)
+    np.bitwise_or.at(bits, (rows, indices >> 3), (0x80 >> (indices & 7)).astype(np.uint8))
+
+    tmp = path.with_name(path.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    genes[["gene_id", "symbol"]].to_csv(tmp / "genes.csv", index=False)
+    terms = terms[["term", "description"]].assign(size=sizes)
+    terms.to_csv(tmp / "terms.csv", index=False)
+    np.save(tmp / "indptr.npy", indptr)
+    np.save(tmp / "indices.npy", indices)
+    np.save(tmp / "bits.npy", bits)
+    (tmp / META_FILE).write_text(json.dumps({"n_genes": n_genes, "n_terms": len(terms), "nnz": int(indices.size)}))
+
+    old = path.with_name(path.name + ".old")
+    if path.exists():
+        os.replace(path, old)
+    os.replace(tmp, path)
+    if old.exists():
+        shutil.rmtree(old)
+
+
+def _gene_lookup(genes: pd.DataFrame) -> pd.Series:
+    # Entrez IDs first, so an ID wins over a symbol that happens to look the same.
+    columns = np.arange(len(genes))
+    lookup = pd.concat([pd.Series(columns, index=genes["gene_id"]), pd.Series(columns, index=genes["symbol"])])
+    lookup = lookup[lookup.index != ""]
+    return lookup[~lookup.index.duplicated()]
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _load_collection(path: str, mtime_ns: int) -> dict:
+    path = Path(path)
+    genes = pd.read_csv(path / "genes.csv", dtype=str, keep_default_na=False)
+    terms = pd.read_csv(path / "terms.csv", dtype={"term": str, "description": str}, keep_default_na=False)
+    indptr = np.load(path / "indptr.npy", mmap_mode="r")
+    indices = np.load(path / "indices.npy", mmap_mode="r")
+    matrix = sp.csr_matrix(
+        (np.ones(indices.size, dtype=np.float32), indices, indptr), shape=(len(terms), len(genes)), copy=False
+    )
+    return {
+        "genes": genes,
+        "terms": terms,
+        "matrix": matrix,
+        "bits": np.load(path / "bits.npy", mmap_mode="r"),
+        "lookup": _gene_lookup(genes),
+    }
+
+
+def load_collection(source: str, name: str) -> dict | None:
+    """
+    Load a gene set collection.
+
+    The arrays stay memory-mapped and read-only. The loaded collection is cached per build.
+
+    Args:
+        source (str): The annotation source.
+        name (str): The collection.
+
+    Returns:
+        dict | None: 'genes', 'terms', 'matrix' (terms x genes CSR), 'bits', or None if it was not built.
+    """
+    path = collection_path(source, name)
+    meta = path / META_FILE
+    if not meta.exists():
+        return None
+    return _load_collection(str(path), meta.stat().st_mtime_ns)
+
+
+def gene_columns(collection: dict, genes) -> np.ndarray:
+    """
+    Map gene identifiers to columns of a collection.
+
+    Args:
+        collection (dict): Output of `load_collection`.
+        genes (Iterable[str]): Entrez IDs or gene symbols.
+
+    Returns:
+        np.ndarray: Column index per gene, -1 if the gene is not annotated.
+    """
+    return collection["lookup"].reindex(np.asarray(genes, dtype=str)).fillna(-1).to_numpy(dtype=np.int64)
+
+
+def read_gmt(path: Path) -> tuple[pd.DataFrame, list[list[str]]]:
+    """
+    Read a GMT file: one gene set per line, 'name<TAB>description<TAB>gene<TAB>gene...'.
+
+    Args:
+        path (Path): The GMT file.
+
+    Returns:
+        tuple[pd.DataFrame, list[list[str]]]: 'term' and 'description' per set, and the genes of every set.
+    """
+    names, descriptions, members = [], [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.rstrip("\r\n").split("\t")
+            if len(fields) < 3:
+                continue
+            names.append(fields[0])
+            descriptions.append(fields[1])
+            members.append([g for g in fields[2:] if g])
+    return pd.DataFrame({"term": names, "description": descriptions}), members
+
+
+def build_gmt(path: Path, name: str) -> Path:
+    """
+    Build a collection from a user GMT file. Its gene universe is the union of all sets.
+
+    Args:
+        path (Path): The GMT file.
+        name (str): Name of the collection.
+
+    Returns:
+        Path: The collection directory.
+    """
+    terms, members = read_gmt(path)
+    universe = pd.Index(sorted({g for genes in members for g in genes}))
+    out = collection_path(GMT_SOURCE, name)
+    # GMT files carry a single identifier type; it serves as both id and symbol.
+    genes = pd.DataFrame({"gene_id": universe, "symbol": universe})
+    write_collection(out, genes, terms, [universe.get_indexer(m) for m in members])
+    return out
+
+
+def find_annotation_db(package: str, file_name: str) -> Path:
+    """
+    Locate the SQLite database shipped in the extdata of an installed Bioconductor annotation package.
+
+    Args:
+        package (str): The package, e.g. 'org.Hs.eg.db'.
+        file_name (str): The database file, e.g. 'org.Hs.eg.sqlite'.
+
+    Returns:
+        Path: Path to the database.
+
+    Raises:
+        FileNotFoundError: If R or the package is not installed.
+    """
+    expr = f'cat(system.file("extdata", "{file_name}", package = "{package}"))'
+    try:
+        result = subprocess.run(["Rscript", "-e", expr], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise FileNotFoundError(f"Could not locate {file_name} of {package}: {e}") from e
+    if not result.stdout.strip():
+        raise FileNotFoundError(f"{package} is not installed")
+    return Path(result.stdout.strip())
+
+
+def build_org(org_db: str, org_sqlite: Path | None = None, go_sqlite: Path | None = None) -> list[Path]:
+    """
+    Build the GO BP/CC/MF collections of an org.*.eg.db package.
+
+    Genes are annotated to every ancestor of their GO terms (the GO2ALLEGS mapping enrichGO uses). Term
+    descriptions are read from GO.db when available.
+
+    Args:
+        org_db (str): The annotation package, e.g. 'org.Hs.eg.db'.
+        org_sqlite (Path | None, optional): Its SQLite database; located through R if not given.
+        go_sqlite (Path | None, optional): The GO.db SQLite database; located through R if not given.
+
+    Returns:
+        list[Path]: The collection directories.
+    """
+    if org_sqlite is None:
+        org_sqlite = find_annotation_db(org_db, org_db.replace(".db", ".sqlite"))
+    if go_sqlite is None:
+        try:
+            go_sqlite = find_annotation_db("GO.db", "GO.sqlite")
+        except FileNotFoundError:
+            go_sqlite = None
+
+    descriptions = {}
+    if go_sqlite is not None:
+        with sqlite3.connect(f"file:{go_sqlite}?mode=ro", uri=True) as con:
+            descriptions = dict(con.execute("SELECT go_id, term FROM go_term").fetchall())
+
+    built = []
+    with sqlite3.connect(f"file:{org_sqlite}?mode=ro", uri=True) as con:
+        tables = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        genes = pd.read_sql_query(
+            "SELECT genes._id AS _id, gene_id, COALESCE(symbol, '') AS symbol "
+            "FROM genes LEFT JOIN gene_info ON genes._id = gene_info._id ORDER BY genes._id",
+            con,
+        )
+        column = pd.Series(np.arange(len(genes)), index=genes["_id"])
+        for ont in GO_ONTOLOGIES:
+            table = f"go_{ont.lower()}_all" if f"go_{ont.lower()}_all" in tables else f"go_{ont.lower()}"
+            pairs = pd.read_sql_query(f"SELECT DISTINCT _id, go_id FROM {table} ORDER BY go_id", con)
+            pairs = pairs[pairs["_id"].isin(column.index)]
+            term_ids, counts = np.unique(pairs["go_id"].to_numpy(dtype=str), return_counts=True)
+            cols = column.reindex(pairs["_id"]).to_numpy()
+            members = np.split(cols, np.cumsum(counts)[:-1])
+            terms = pd.DataFrame({"term": term_ids, "description": [descriptions.get(t, t) for t in term_ids]})
+            out = collection_path(org_db, f"GO_{ont}")
+            write_collection(out, genes, terms, members)
+            built.append(out)
+    return built
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the gene set index used by the local enrichment engines.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    org = commands.add_parser("org", help="GO collections of an org.*.eg.db package")
+    org.add_argument("org_db", help="e.g. org.Hs.eg.db")
+    org.add_argument("--org-sqlite", type=Path)
+    org.add_argument("--go-sqlite", type=Path)
+    gmt = commands.add_parser("gmt", help="a GMT file")
+    gmt.add_argument("path", type=Path)
+    gmt.add_argument("--name", required=True)
+    args = parser.parse_args()
+
+    if args.command == "org":
+        paths = build_org(args.org_db, args.org_sqlite, args.go_sqlite)
+    else:
+        paths = [build_gmt(args.path, args.name)]
+    for path in paths:
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
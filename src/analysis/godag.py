@@ -0,0 +1,310 @@
+"""
+GO DAG index built from a local OBO snapshot (e.g. go-basic.obo).
+
+The directory GENE_SET_DIR/go-dag holds
+
+- terms.csv: 'term', 'name', 'namespace', 'level' (shortest path from the root, root = 1) and 'depth'
+  (longest path), in index order,
+- parents / children / ancestors / descendants: CSR arrays ('<name>_indptr.npy', '<name>_indices.npy') over
+  term indices. Rows are sorted, and the ancestor and descendant rows are the transitive closure of the is_a
+  and part_of relations, the relations GOSemSim and clusterProfiler follow. 'parents_relation.npy' holds the
+  relation of every parent entry (0 is_a, 1 part_of),
+- ic_<OrgDb>.npy: information content -log(p) per term for every OrgDb with built GO collections, where p is
+  the share of the root's annotated genes annotated to the term.
+
+The arrays are memory-mapped and shared like the gene set index. Build it with
+
+    python -m src.analysis.godag go-basic.obo
+"""
+
+import argparse
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from src.analysis.genesets import GENE_SET_DIR, GO_ONTOLOGIES, META_FILE, list_collections, load_collection
+
+DAG_DIR = GENE_SET_DIR / "go-dag"
+# Relations followed, coded by their position.
+RELATIONS = ("is_a", "part_of")
+NAMESPACES = {"biological_process": "BP", "cellular_component": "CC", "molecular_function": "MF"}
+_RELATION_NAMES = ("parents", "children", "ancestors", "descendants")
+
+
+def read_obo(path: Path) -> tuple[pd.DataFrame, list[tuple[str, str, int]]]:
+    """
+    Read the terms of an OBO file and their is_a and part_of relations. Obsolete terms are skipped.
+
+    Args:
+        path (Path): The OBO file.
+
+    Returns:
+        tuple[pd.DataFrame, list[tuple[str, str, int]]]: 'term', 'name' and 'namespace' (BP, CC or MF) per
+        term, and (child, parent, relation code) triples.
+    """
+    terms, edges = [], []
+    stanza = None
+
+    def flush():
+        if stanza and stanza.get("id") and not stanza.get("obsolete"):
+            terms.append((stanza["id"], stanza.get("name", ""), NAMESPACES.get(stanza.get("namespace"), "")))
+            edges.extend((stanza["id"], parent, relation) for parent, relation in stanza["parents"])
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("["):
+                flush()
+                stanza = {"parents": []} if line == "[Term]" else None
+                continue
+            if stanza is None or ":" not in line:
+                continue
+            key, value = line.split(":", 1)
+            value = value.split("!", 1)[0].strip()
+            if key == "id":
+                stanza["id"] = value
+            elif key == "name":
+                stanza["name"] = value
+            elif key == "namespace":
+                stanza["namespace"] = value
+            elif key == "is_obsolete":
+                stanza["obsolete"] = value == "true"
+            elif key == "is_a":
+                stanza["parents"].append((value.split()[0], 0))
+            elif key == "relationship":
+                relation, *target = value.split()
+                if relation in RELATIONS and target:
+                    stanza["parents"].append((target[0], RELATIONS.index(relation)))
+        flush()
+    return pd.DataFrame(terms, columns=["term", "name", "namespace"]), edges
+
+
+def _csr(rows: list[list[int]]) -> tuple[np.ndarray, np.ndarray]:
+    indptr = np.concatenate([[0], np.cumsum([len(r) for r in rows])]).astype(np.int64)
+    indices = np.concatenate([np.sort(np.asarray(r, dtype=np.int32)) for r in rows]) if rows else np.zeros(0)
+    return indptr, indices.astype(np.int32)
+
+
+def _closure(parents: list[list[int]], order: list[int]) -> list[list[int]]:
+    # Every term's ancestors are the union over its parents, visited parents first.
+    closure = [set() for _ in parents]
+    for i in order:
+        for p in parents[i]:
+            closure[i].add(p)
+            closure[i] |= closure[p]
+    return [sorted(c) for c in closure]
+
+
+def build_dag(obo: Path) -> Path:
+    """
+    Build the GO DAG index from an OBO file, with the information content of every built OrgDb.
+
+    Args:
+        obo (Path): The OBO file, e.g. go-basic.obo.
+
+    Returns:
+        Path: The index directory.
+
+    Raises:
+        ValueError: If the relations contain a cycle.
+    """
+    terms, edges = read_obo(obo)
+    index = pd.Index(terms["term"])
+    n = len(terms)
+    parents = [[] for _ in range(n)]
+    children = [[] for _ in range(n)]
+    namespace = terms["namespace"].to_numpy()
+    pairs = np.column_stack(
+        [index.get_indexer([e[0] for e in edges]), index.get_indexer([e[1] for e in edges]), [e[2] for e in edges]]
+    ).reshape(-1, 3)
+    pairs = pairs[(pairs[:, :2] >= 0).all(axis=1)]
+    # Relations across ontologies (rare part_of links) would mix the DAGs.
+    pairs = np.unique(pairs[namespace[pairs[:, 0]] == namespace[pairs[:, 1]]], axis=0)
+    # A parent linked by both is_a and part_of counts as is_a; pairs are sorted by child, parent, relation.
+    pairs = pairs[np.concatenate([[True], (np.diff(pairs[:, :2], axis=0) != 0).any(axis=1)])]
+    for c, p, _ in pairs:
+        parents[c].append(p)
+        children[p].append(c)
+
+    # Topological order from the roots, with the shortest and longest path lengths.
+    pending = np.array([len(p) for p in parents])
+    order = list(np.flatnonzero(pending == 0))
+    level = np.where(pending == 0, 1, 0)
+    depth = level.copy()
+    head = 0
+    while head < len(order):
+        i = order[head]
+        head += 1
+        for c in children[i]:
+            level[c] = level[i] + 1 if level[c] == 0 else min(level[c], level[i] + 1)
+            depth[c] = max(depth[c], depth[i] + 1)
+            pending[c] -= 1
+            if pending[c] == 0:
+                order.append(c)
+    if len(order) != n:
+        raise ValueError("The GO relations contain a cycle")
+
+    ancestors = _closure(parents, order)
+    descendants = _closure(children, order[::-1])
+    terms = terms.assign(level=level, depth=depth)
+
+    out = DAG_DIR
+    tmp = out.with_name(out.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    terms.to_csv(tmp / "terms.csv", index=False)
+    for name, rows in zip(_RELATION_NAMES, (parents, children, ancestors, descendants)):
+        indptr, indices = _csr(rows)
+        np.save(tmp / f"{name}_indptr.npy", indptr)
+        np.save(tmp / f"{name}_indices.npy", indices)
+    np.save(tmp / "parents_relation.npy", pairs[:, 2].astype(np.int8))
+    org_dbs = []
+    for source in list_collections():
+        ic = information_content(index, source)
+        if ic is not None:
+            np.save(tmp / f"ic_{source}.npy", ic)
+            org_dbs.append(source)
+    (tmp / META_FILE).write_text(json.dumps({"obo": str(obo), "n_terms": n, "org_dbs": org_dbs}))
+
+    old = out.with_name(out.name + ".old")
+    if out.exists():
+        os.replace(out, old)
+    os.replace(tmp, out)
+    if old.exists():
+        shutil.rmtree(old)
+    return out
+
+
+def information_content(index: pd.Index, org_db: str) -> np.ndarray | None:
+    """
+    Compute -log(p) per term from the gene counts of the GO collections of an OrgDb.
+
+    The collections annotate genes to all ancestors of their terms, so p is the term's gene count over the
+    largest count of its ontology, the root's. Terms without genes get an infinite information content, as in
+    GOSemSim.
+
+    Args:
+        index (pd.Index): Term IDs in index order.
+        org_db (str): The annotation package.
+
+    Returns:
+        np.ndarray | None: float64 information content per term, or None without GO collections.
+    """
+    counts = np.zeros(len(index))
+    found = False
+    for ont in GO_ONTOLOGIES:
+        collection = load_collection(org_db, f"GO_{ont}")
+        if collection is None:
+            continue
+        found = True
+        rows = index.get_indexer(collection["terms"]["term"])
+        sizes = collection["terms"]["size"].to_numpy(dtype=np.float64)
+        counts[rows[rows >= 0]] = sizes[rows >= 0] / max(sizes.max(), 1.0)
+    if not found:
+        return None
+    with np.errstate(divide="ignore"):
+        return -np.log(counts)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _load_dag(path: str, mtime_ns: int) -> dict:
+    path = Path(path)
+    terms = pd.read_csv(path / "terms.csv", dtype={"term": str, "name": str, "namespace": str}, keep_default_na=False)
+    dag = {
+        "terms": terms,
+        "index": pd.Index(terms["term"]),
+        "level": terms["level"].to_numpy(),
+        "depth": terms["depth"].to_numpy(),
+    }
+    for name in _RELATION_NAMES:
+        dag[name] = (
+            np.load(path / f"{name}_indptr.npy", mmap_mode="r"),
+            np.load(path / f"{name}_indices.npy", mmap_mode="r"),
+        )
+    dag["parents_relation"] = np.load(path / "parents_relation.npy", mmap_mode="r")
+    dag["ic"] = {f.stem[3:]: np.load(f, mmap_mode="r") for f in sorted(path.glob("ic_*.npy"))}
+    # Rows and their indices are sorted, so (row, ancestor) keys are globally sorted for membership tests.
+    indptr, indices = dag["ancestors"]
+    dag["ancestor_keys"] = np.repeat(np.arange(len(terms), dtype=np.int64), np.diff(indptr)) * len(terms) + indices
+    return dag
+
+
+def load_dag() -> dict | None:
+    """
+    Load the GO DAG index.
+
+    Returns:
+        dict | None: 'terms', 'index' (term ID to index), 'level', 'depth', the CSR pairs 'parents',
+        'children', 'ancestors' and 'descendants', 'parents_relation', 'ancestor_keys' and 'ic' per OrgDb, or
+        None if it was not built.
+    """
+    meta = DAG_DIR / META_FILE
+    if not meta.exists():
+        return None
+    return _load_dag(str(DAG_DIR), meta.stat().st_mtime_ns)
+
+
+def related(dag: dict, relation: str, term: int) -> np.ndarray:
+    """
+    Return the sorted 'parents', 'children', 'ancestors' or 'descendants' of a term, by index.
+
+    Args:
+        dag (dict): Output of `load_dag`.
+        relation (str): The relation.
+        term (int): Term index.
+
+    Returns:
+        np.ndarray: Term indices; a view into the memory-mapped index.
+    """
+    indptr, indices = dag[relation]
+    return indices[indptr[term] : indptr[term + 1]]
+
+
+def is_ancestor(dag: dict, ancestor: np.ndarray, term: np.ndarray) -> np.ndarray:
+    """
+    Test whether terms are ancestors of other terms, element-wise.
+
+    Args:
+        dag (dict): Output of `load_dag`.
+        ancestor (np.ndarray): Candidate ancestor indices.
+        term (np.ndarray): Term indices.
+
+    Returns:
+        np.ndarray: True where ancestor[i] is a proper ancestor of term[i].
+    """
+    keys = np.asarray(term, dtype=np.int64) * len(dag["index"]) + np.asarray(ancestor, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(dag["ancestor_keys"], keys), max(dag["ancestor_keys"].size - 1, 0))
+    return (dag["ancestor_keys"].size > 0) & (dag["ancestor_keys"][pos] == keys)
+
+
+def filter_level(dag: dict, terms, level: int) -> np.ndarray:
+    """
+    Select GO terms at a level, like clusterProfiler's gofilter.
+
+    Args:
+        dag (dict): Output of `load_dag`.
+        terms (Iterable[str]): Term IDs.
+        level (int): The level; the root is level 1.
+
+    Returns:
+        np.ndarray: True for the terms whose shortest path from the root has this level.
+    """
+    rows = dag["index"].get_indexer(np.asarray(terms, dtype=str))
+    return (rows >= 0) & (dag["level"][np.maximum(rows, 0)] == level)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the GO DAG index from an OBO file.")
+    parser.add_argument("obo", type=Path, help="e.g. go-basic.obo")
+    args = parser.parse_args()
+    print(build_dag(args.obo))
+
+
+if __name__ == "__main__":
+    main()
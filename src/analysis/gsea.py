@@ -0,0 +1,432 @@
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+from plotly.subplots import make_subplots
+
+from src.analysis.genesets import GO_ONTOLOGIES, META_FILE, collection_path, gene_columns, load_collection
+from src.analysis.ora import bh_adjust, storey_qvalue
+from src.analysis.ranked import ranked_list
+
+# Columns of as.data.frame(gseGO(...)).
+RESULT_COLUMNS = [
+    "ID", "Description", "setSize", "enrichmentScore", "NES", "pvalue", "p.adjust", "qvalue",
+    "rank", "leading_edge", "core_enrichment",
+]
+# Same defaults as gseGO / fgsea.
+EXPONENT = 1.0
+N_PERM = 1000
+# Permutations are drawn in this many fixed blocks, each with its own random stream, so the null does not
+# depend on the number of workers.
+NULL_BLOCKS = 16
+
+
+def gsego_path(workspace: Path, method: str) -> Path:
+    """
+    Return the GSEA GO output directory of an analysis method.
+
+    Args:
+        workspace (Path): The current workspace.
+        method (str): The analysis method.
+
+    Returns:
+        Path: Path to the 'gsego' directory.
+    """
+    return Path(workspace, "csv-files", "output", method, "gsego")
+
+
+def hit_positions(collection: dict, genes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the positions of the members of every term in a ranked gene list.
+
+    Args:
+        collection (dict): Output of `src.analysis.genesets.load_collection`.
+        genes (np.ndarray): Ranked gene identifiers.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: CSR indptr over terms and the sorted 0-based positions of their genes;
+        genes missing from the list are dropped.
+    """
+    cols = gene_columns(collection, genes)
+    position = np.full(len(collection["genes"]), -1, dtype=np.int64)
+    # Several identifiers can map to one gene; the best ranked one counts. Positions are increasing, so
+    # np.unique's first occurrence of every gene is its best rank.
+    found = np.flatnonzero(cols >= 0)
+    members, first = np.unique(cols[found], return_index=True)
+    position[members] = found[first]
+    matrix = collection["matrix"]
+    positions = position[matrix.indices]
+    keep = positions >= 0
+    terms = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))[keep]
+    positions = positions[keep]
+    order = np.lexsort((positions, terms))
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=matrix.shape[0]))])
+    return indptr, positions[order]
+
+
+def _running_extremes(
+    positions: np.ndarray, local: np.ndarray, cum_weight: np.ndarray, weight: np.ndarray, norm: np.ndarray,
+    n_miss: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    # The running sum peaks right at a hit and is lowest right before one, so the hits alone give both extremes.
+    misses = (positions - local) / n_miss
+    with np.errstate(divide="ignore", invalid="ignore"):
+        peak = cum_weight / norm - misses
+        trough = (cum_weight - weight) / norm - misses
+    return peak, trough
+
+
+def enrichment_scores(
+    indptr: np.ndarray, positions: np.ndarray, scores: np.ndarray, exponent: float = EXPONENT
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the weighted running-sum enrichment score of all gene sets at once.
+
+    Args:
+        indptr (np.ndarray): CSR indptr over gene sets.
+        positions (np.ndarray): Sorted positions of the set members in the ranked list.
+        scores (np.ndarray): The ranked statistic.
+        exponent (float, optional): Weight of the statistic, 1 as in GSEA. Defaults to 1.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The enrichment score and its 0-based position per set; NaN and -1 for
+        empty sets.
+    """
+    n_sets = indptr.size - 1
+    sizes = np.diff(indptr)
+    es = np.full(n_sets, np.nan)
+    at = np.full(n_sets, -1, dtype=np.int64)
+    nonempty = np.flatnonzero(sizes > 0)
+    if nonempty.size == 0:
+        return es, at
+
+    weight = np.abs(scores[positions], dtype=np.float64) ** exponent
+    starts = indptr[:-1][nonempty]
+    segment = np.repeat(np.arange(n_sets), sizes)
+    cum_weight = np.cumsum(weight)
+    cum_weight -= np.concatenate([[0.0], cum_weight])[indptr[:-1]][segment]
+    norm = np.add.reduceat(weight, starts)
+    local = np.arange(positions.size) - indptr[:-1][segment]
+    peak, trough = _running_extremes(
+        positions, local, cum_weight, weight,
+        np.repeat(norm, sizes[nonempty]), (scores.size - sizes)[segment],
+    )
+    peak_max = np.maximum.reduceat(peak, starts)
+    trough_min = np.minimum.reduceat(trough, starts)
+    positive = peak_max > -trough_min
+    es[nonempty] = np.where(positive, peak_max, trough_min)
+
+    # Position of the extreme: the hit itself for a peak, the gene right before the hit for a trough.
+    value = np.where(np.repeat(positive, sizes[nonempty]), peak, trough)
+    is_extreme = value == np.repeat(es[nonempty], sizes[nonempty])
+    first = np.minimum.reduceat(np.where(is_extreme, np.arange(positions.size), positions.size), starts)
+    at[nonempty] = np.where(positive, positions[first], positions[first] - 1)
+    return es, at
+
+
+def _null_scores(weight: np.ndarray, sizes: list[int], n_perm: int, seed: int, block: int) -> dict[int, np.ndarray]:
+    # Random gene sets of every size are prefixes of the same random orderings of the ranked list. The orderings
+    # are full permutations, so their prefixes do not depend on the largest size requested with them.
+    rng = np.random.default_rng(np.random.SeedSequence([seed, block]))
+    n = weight.size
+    draws = np.stack([rng.permutation(n)[: max(sizes)] for _ in range(n_perm)])
+    null = {}
+    for size in sizes:
+        positions = np.sort(draws[:, :size], axis=1)
+        w = weight[positions]
+        cum_weight = np.cumsum(w, axis=1)
+        peak, trough = _running_extremes(
+            positions, np.arange(size), cum_weight, w, cum_weight[:, -1:], np.float64(n - size)
+        )
+        peak_max, trough_min = peak.max(axis=1), trough.min(axis=1)
+        null[size] = np.where(peak_max > -trough_min, peak_max, trough_min)
+    return null
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _null_cache(genes_key: str, exponent: float, n_perm: int, seed: int) -> dict[int, np.ndarray]:
+    return {}
+
+
+def null_distributions(
+    ranked: dict, sizes, exponent: float = EXPONENT, n_perm: int = N_PERM, seed: int = 0
+) -> dict[int, np.ndarray]:
+    """
+    Return permutation null enrichment scores for each gene set size.
+
+    Null scores only depend on the ranked statistic and the set size. They are cached per size for the ranked
+    list, so changing the set size limits or the collection only computes sizes not seen before. The scores of a
+    size only depend on the seed, n_perm and the ranked list, not on the sizes computed before or with it, or
+    on the number of CPUs: permutations are drawn in NULL_BLOCKS fixed blocks with their own random streams,
+    which are split across a process pool.
+
+    Args:
+        ranked (dict): Output of `src.analysis.ranked.ranked_list`.
+        sizes (Iterable[int]): Gene set sizes.
+        exponent (float, optional): Weight of the statistic. Defaults to 1.
+        n_perm (int, optional): Random gene sets per size. Defaults to 1000.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        dict[int, np.ndarray]: n_perm null enrichment scores per size.
+    """
+    cache = _null_cache(ranked["key"], exponent, n_perm, seed)
+    missing = sorted({int(s) for s in sizes} - set(cache))
+    if missing:
+        weight = np.abs(ranked["scores"], dtype=np.float64) ** exponent
+        blocks = [len(b) for b in np.array_split(np.arange(n_perm), NULL_BLOCKS) if len(b)]
+        args = [[weight] * len(blocks), [missing] * len(blocks), blocks, [seed] * len(blocks), range(len(blocks))]
+        workers = max(1, min(os.cpu_count() or 1, len(blocks), n_perm // 100))
+        if workers == 1:
+            parts = list(map(_null_scores, *args))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parts = list(pool.map(_null_scores, *args))
+        for size in missing:
+            cache[size] = np.concatenate([part[size] for part in parts])
+    return {int(s): cache[int(s)] for s in sizes}
+
+
+def gsea(
+    collection: dict,
+    ranked: dict,
+    min_size: int = 10,
+    max_size: int = 500,
+    exponent: float = EXPONENT,
+    n_perm: int = N_PERM,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Gene set enrichment analysis of all terms of a collection, following gseGO with the fgsea method.
+
+    p-values compare every score with the null scores of the same sign, NES divides it by their mean, as fgsea
+    does. With n_perm random sets the smallest p-value is 1 / (n_perm + 1).
+
+    Args:
+        collection (dict): Output of `src.analysis.genesets.load_collection`.
+        ranked (dict): Output of `src.analysis.ranked.ranked_list`.
+        min_size (int, optional): Minimal number of set genes in the ranked list. Defaults to 10.
+        max_size (int, optional): Maximal number of set genes in the ranked list. Defaults to 500.
+        exponent (float, optional): Weight of the statistic. Defaults to 1.
+        n_perm (int, optional): Random gene sets per size. Defaults to 1000.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: Unfiltered results in the gseGO layout, sorted by p-value.
+    """
+    genes, scores = ranked["genes"], ranked["scores"]
+    n = scores.size
+    indptr, positions = hit_positions(collection, genes)
+    sizes = np.diff(indptr)
+    tested = np.flatnonzero((sizes >= min_size) & (sizes <= max_size))
+    if tested.size == 0:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    sub_indptr = np.concatenate([[0], np.cumsum(sizes[tested])])
+    sub_positions = np.concatenate([positions[indptr[t] : indptr[t + 1]] for t in tested])
+    es, at = enrichment_scores(sub_indptr, sub_positions, scores, exponent)
+    null = null_distributions(ranked, sizes[tested], exponent, n_perm, seed)
+
+    pvalues = np.empty(tested.size)
+    nes = np.empty(tested.size)
+    for i, size in enumerate(sizes[tested]):
+        scores_null = null[int(size)]
+        same_sign = scores_null[scores_null >= 0] if es[i] >= 0 else scores_null[scores_null < 0]
+        if es[i] >= 0:
+            pvalues[i] = (np.count_nonzero(same_sign >= es[i]) + 1) / (same_sign.size + 1)
+        else:
+            pvalues[i] = (np.count_nonzero(same_sign <= es[i]) + 1) / (same_sign.size + 1)
+        mean = np.abs(same_sign.mean()) if same_sign.size else np.nan
+        nes[i] = es[i] / mean if mean else np.nan
+    adjusted = bh_adjust(pvalues)
+
+    symbols = np.asarray(genes, dtype=str)
+    weight = np.abs(scores, dtype=np.float64) ** exponent
+    leading_edge, core = [], []
+    for i in range(tested.size):
+        hits = sub_positions[sub_indptr[i] : sub_indptr[i + 1]]
+        if es[i] >= 0:
+            core_hits = hits[hits <= at[i]]
+            list_frac = (at[i] + 1) / n
+        else:
+            # clusterProfiler takes the hits after the lowest running score among hits.
+            cum_weight = np.cumsum(weight[hits])
+            running = cum_weight / cum_weight[-1] - (hits - np.arange(hits.size)) / (n - hits.size)
+            core_hits = hits[np.argmin(running) + 1 :]
+            list_frac = (n - at[i] - 1) / n
+        tags = core_hits.size / hits.size
+        signal = tags * (1 - list_frac) * n / (n - hits.size)
+        leading_edge.append(f"tags={tags * 100:.0f}%, list={list_frac * 100:.0f}%, signal={signal * 100:.0f}%")
+        core.append("/".join(symbols[core_hits]))
+
+    terms = collection["terms"]
+    df = pd.DataFrame(
+        {
+            "ID": terms["term"].to_numpy()[tested],
+            "Description": terms["description"].to_numpy()[tested],
+            "setSize": sizes[tested],
+            "enrichmentScore": es,
+            "NES": nes,
+            "pvalue": pvalues,
+            "p.adjust": adjusted,
+            "qvalue": storey_qvalue(pvalues, adjusted),
+            "rank": np.where(es >= 0, at + 1, n - at),
+            "leading_edge": leading_edge,
+            "core_enrichment": core,
+        },
+        columns=RESULT_COLUMNS,
+    )
+    return df.sort_values("pvalue", kind="stable").reset_index(drop=True)
+
+
+def run_gsego(
+    workspace: Path, method: str, org_db: str, min_size: int, max_size: int, pvalue_cutoff: float
+) -> dict[str, int]:
+    """
+    Run GSEA for GO BP, CC and MF and write 'gse_<ont>.csv' like the backend does.
+
+    Args:
+        workspace (Path): The current workspace.
+        method (str): The analysis method.
+        org_db (str): The annotation package of the GO collections.
+        min_size (int): Minimal gene set size.
+        max_size (int): Maximal gene set size.
+        pvalue_cutoff (float): Cutoff on p.adjust.
+
+    Returns:
+        dict[str, int]: Number of significant terms per ontology.
+
+    Raises:
+        FileNotFoundError: If the results or a GO collection are missing.
+    """
+    ranked = ranked_list(workspace, method)
+    if ranked is None:
+        raise FileNotFoundError(f"merged_results_{method}.csv not found")
+    collections = {}
+    for ont in GO_ONTOLOGIES:
+        collection = load_collection(org_db, f"GO_{ont}")
+        if collection is None:
+            raise FileNotFoundError(f"Gene set collection {org_db}/GO_{ont} has not been built")
+        collections[ont] = collection
+
+    output_dir = gsego_path(workspace, method)
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True)
+    counts = {}
+    for ont, collection in collections.items():
+        df = gsea(collection, ranked, int(min_size), int(max_size))
+        df = df[df["p.adjust"] <= pvalue_cutoff]
+        df.to_csv(output_dir / f"gse_{ont}.csv", index=False)
+        counts[ont] = len(df)
+    return counts
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def _term_hits(
+    ranked_key: str, workspace: str, method: str, source: str, name: str, collection_mtime_ns: int
+) -> dict:
+    collection = load_collection(source, name)
+    indptr, positions = hit_positions(collection, ranked_list(Path(workspace), method)["genes"])
+    return {"indptr": indptr, "positions": positions, "terms": pd.Index(collection["terms"]["term"])}
+
+
+def term_hits(workspace: Path, method: str, source: str, name: str) -> dict | None:
+    """
+    Return the positions of every term's genes in the ranked list of an analysis method.
+
+    Computed once per ranked list and collection version, so plotting any term is a slice of these arrays.
+
+    Args:
+        workspace (Path): The current workspace.
+        method (str): The analysis method.
+        source (str): The annotation source, e.g. 'org.Hs.eg.db'.
+        name (str): The collection, e.g. 'GO_BP'.
+
+    Returns:
+        dict | None: 'indptr' and 'positions' (see `hit_positions`) and 'terms', or None if the results or the
+        collection are missing.
+    """
+    ranked = ranked_list(workspace, method)
+    meta = collection_path(source, name) / META_FILE
+    if ranked is None or not meta.exists():
+        return None
+    return _term_hits(ranked["key"], str(workspace), method, source, name, meta.stat().st_mtime_ns)
+
+
+def term_positions(hits: dict, term: str) -> np.ndarray | None:
+    """
+    Return the sorted positions of one term's genes in the ranked list.
+
+    Args:
+        hits (dict): Output of `term_hits`.
+        term (str): Term ID, e.g. 'GO:0006955'.
+
+    Returns:
+        np.ndarray | None: The positions, or None for an unknown term.
+    """
+    i = hits["terms"].get_indexer([term])[0]
+    if i < 0:
+        return None
+    return hits["positions"][hits["indptr"][i] : hits["indptr"][i + 1]]
+
+
+def running_score(scores: np.ndarray, positions: np.ndarray, exponent: float = EXPONENT) -> np.ndarray:
+    """
+    Compute the running enrichment score of one gene set along the ranked list.
+
+    Args:
+        scores (np.ndarray): The ranked statistic.
+        positions (np.ndarray): Positions of the set genes.
+        exponent (float, optional): Weight of the statistic. Defaults to 1.
+
+    Returns:
+        np.ndarray: Running score at every position of the list.
+    """
+    n = scores.size
+    step = np.full(n, -1.0 / max(n - positions.size, 1))
+    weight = np.abs(scores[positions], dtype=np.float64) ** exponent
+    step[positions] = weight / weight.sum() if weight.sum() else 0.0
+    return np.cumsum(step)
+
+
+def gseaplot_figure(scores: np.ndarray, positions: np.ndarray, title: str = "") -> go.Figure:
+    """
+    Plot a gene set like gseaplot2: running score, hit positions and the ranked metric.
+
+    Args:
+        scores (np.ndarray): The ranked statistic.
+        positions (np.ndarray): Positions of the set genes.
+        title (str, optional): Plot title. Defaults to ''.
+
+    Returns:
+        go.Figure: Three panels over the ranked list.
+    """
+    running = running_score(scores, positions)
+    x = np.arange(1, scores.size + 1)
+    fig = make_subplots(rows=3, cols=1, shared_xaxes=True, row_heights=[0.6, 0.12, 0.28], vertical_spacing=0.02)
+    fig.add_trace(go.Scattergl(x=x, y=running, mode="lines", line=dict(color="green", width=2)), row=1, col=1)
+    fig.add_hline(y=0, line=dict(color="grey", width=1), row=1, col=1)
+    fig.add_trace(
+        go.Scattergl(
+            x=positions + 1,
+            y=np.zeros(positions.size),
+            mode="markers",
+            marker=dict(symbol="line-ns-open", size=18, color="black"),
+        ),
+        row=2,
+        col=1,
+    )
+    fig.add_trace(
+        go.Scattergl(x=x, y=scores, mode="lines", fill="tozeroy", line=dict(color="grey", width=1)), row=3, col=1
+    )
+    fig.update_yaxes(title_text="Running Enrichment Score", row=1, col=1)
+    fig.update_yaxes(visible=False, row=2, col=1)
+    fig.update_yaxes(title_text="Ranked List Metric", row=3, col=1)
+    fig.update_xaxes(title_text="Position in the Ranked List of Genes", row=3, col=1)
+    fig.update_layout(title=title, showlegend=False, height=600)
+    return fig
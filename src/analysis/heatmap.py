@@ -0,0 +1,124 @@
+from pathlib import Path
+
+import numpy as np
+import plotly.graph_objects as go
+import streamlit as st
+from scipy.cluster.hierarchy import leaves_list, linkage
+
+from src.analysis.results import load_results, results_path, sample_columns
+
+
+def top_n_by_padj(padj: np.ndarray, n: int) -> np.ndarray:
+    """
+    Return the row indices of the n genes with the smallest adjusted p-value.
+
+    Only the selected rows are sorted, the rest of the table is partitioned in linear time.
+
+    Args:
+        padj (np.ndarray): Adjusted p-values, NaN for genes without a test result.
+        n (int): Number of genes to select.
+
+    Returns:
+        np.ndarray: Indices ordered by increasing padj.
+    """
+    valid = np.flatnonzero(~np.isnan(padj))
+    n = min(n, valid.size)
+    if n == 0:
+        return valid
+    part = np.argpartition(padj[valid], n - 1)[:n]
+    idx = valid[part]
+    return idx[np.argsort(padj[idx], kind="stable")]
+
+
+def row_zscore(values: np.ndarray) -> np.ndarray:
+    """
+    Standardize every row of a matrix to mean 0 and standard deviation 1.
+
+    Args:
+        values (np.ndarray): Genes x samples matrix.
+
+    Returns:
+        np.ndarray: The z-scores; constant rows, and all rows of a single sample, become 0.
+    """
+    mean = values.mean(axis=1, keepdims=True)
+    std = values.std(axis=1, ddof=1, keepdims=True) if values.shape[1] > 1 else np.zeros((values.shape[0], 1))
+    std[~(std > 0)] = 1
+    return (values - mean) / std
+
+
+def _cluster_order(values: np.ndarray) -> np.ndarray:
+    if values.shape[0] < 2:
+        return np.arange(values.shape[0])
+    # Same defaults as pheatmap: complete linkage on euclidean distances.
+    return leaves_list(linkage(values, method="complete", metric="euclidean"))
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _clustered_heatmap(path: str, mtime_ns: int, workspace: str, method: str, n: int) -> dict:
+    df = load_results(Path(workspace), method)
+    samples = sample_columns(df)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        logged = np.log2(df[samples].to_numpy(dtype=np.float64) + 1)
+    # Genes with missing or negative counts cannot be clustered and are skipped.
+    padj = np.where(np.isfinite(logged).all(axis=1), df["padj"].to_numpy(), np.nan)
+    idx = top_n_by_padj(padj, n)
+    z = row_zscore(logged[idx])
+    row_order = _cluster_order(z)
+    col_order = _cluster_order(z.T)
+    return {
+        "z": z[np.ix_(row_order, col_order)],
+        "genes": df["gene"].to_numpy()[idx][row_order],
+        "samples": [samples[i] for i in col_order],
+    }
+
+
+def clustered_heatmap(workspace: Path, method: str, n: int) -> dict | None:
+    """
+    Select the top genes by padj, z-score their log2 normalized counts and cluster rows and columns.
+
+    The result is cached per (results file version, method, n), so changing only the plot size re-renders
+    without clustering again.
+
+    Args:
+        workspace (Path): The current workspace.
+        method (str): The analysis method.
+        n (int): Number of genes.
+
+    Returns:
+        dict | None: 'z' (clustered matrix), 'genes' and 'samples' in plot order, or None without results.
+    """
+    path = results_path(workspace, method)
+    if not path.exists():
+        return None
+    return _clustered_heatmap(str(path), path.stat().st_mtime_ns, str(workspace), method, int(n))
+
+
+def heatmap_figure(data: dict, width: float, height: float) -> go.Figure:
+    """
+    Build an interactive heatmap from `clustered_heatmap` output.
+
+    Args:
+        data (dict): Clustered matrix with gene and sample labels.
+        width (float): Plot width in inches.
+        height (float): Plot height in inches.
+
+    Returns:
+        go.Figure: The heatmap.
+    """
+    fig = go.Figure(
+        go.Heatmap(
+            z=data["z"],
+            x=data["samples"],
+            y=data["genes"],
+            colorscale="RdBu_r",
+            zmid=0,
+            colorbar=dict(title="z-score"),
+            hovertemplate="%{y}<br>%{x}<br>z %{z:.2f}<extra></extra>",
+        )
+    )
+    fig.update_layout(
+        width=int(width * 72),
+        height=int(height * 72),
+        yaxis=dict(autorange="reversed", showticklabels=len(data["genes"]) <= 200),
+    )
+    return fig
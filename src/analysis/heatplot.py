@@ -0,0 +1,125 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import scipy.sparse as sp
+import streamlit as st
+
+from src.analysis.results import load_results, results_path
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def _core_matrix(path: str, mtime_ns: int, workspace: str, method: str, results_mtime_ns: int) -> dict:
+    df = pd.read_csv(path, dtype={"ID": str, "Description": str, "core_enrichment": str}, keep_default_na=False)
+    members = [list(dict.fromkeys(genes.split("/"))) if genes else [] for genes in df["core_enrichment"]]
+    flat = [g for term_genes in members for g in term_genes]
+    genes = pd.Index(list(dict.fromkeys(flat)))
+    rows = genes.get_indexer(flat)
+    cols = np.repeat(np.arange(len(df)), [len(m) for m in members])
+
+    results = load_results(Path(workspace), method)
+    fold_change = np.full(len(genes), np.nan)
+    if results is not None:
+        fold_change = results.drop_duplicates("gene").set_index("gene")["log2FoldChange"].reindex(genes).to_numpy()
+    # Explicit entries, so genes without a fold change stay members with a NaN value.
+    matrix = sp.csc_matrix((fold_change[rows], (rows, cols)), shape=(len(genes), len(df)))
+    return {"terms": df, "genes": genes, "matrix": matrix, "fold_change": fold_change}
+
+
+def core_matrix(result_csv: Path, workspace: Path, method: str) -> dict | None:
+    """
+    Parse the core enrichment genes of GSEA results into a sparse gene x term matrix of fold changes.
+
+    The slash-delimited strings are parsed once per result and fold-change file version.
+
+    Args:
+        result_csv (Path): Results in the gseGO layout, e.g. 'gsego/gse_BP.csv'.
+        workspace (Path): The current workspace.
+        method (str): The analysis method whose log2 fold changes fill the matrix.
+
+    Returns:
+        dict | None: 'terms', 'genes', 'matrix' (genes x terms CSC) and 'fold_change' per gene, or None if the
+        results do not exist.
+    """
+    result_csv = Path(result_csv)
+    if not result_csv.exists():
+        return None
+    source = results_path(workspace, method)
+    results_mtime_ns = source.stat().st_mtime_ns if source.exists() else 0
+    return _core_matrix(str(result_csv), result_csv.stat().st_mtime_ns, str(workspace), method, results_mtime_ns)
+
+
+def select_heatplot(core: dict, top_pathways: int, top_genes_per_pathway: int, max_setsize: int) -> pd.DataFrame:
+    """
+    Select the terms and genes of a heatplot.
+
+    The first top_pathways terms (in result order) with at most max_setsize genes are kept, and per term its
+    top_genes_per_pathway core genes by absolute fold change. The per-term ranking is one lexsort over the
+    non-zeros of the selected columns.
+
+    Args:
+        core (dict): Output of `core_matrix`.
+        top_pathways (int): Maximal number of terms.
+        top_genes_per_pathway (int): Maximal number of genes per term.
+        max_setsize (int): Largest setSize of a shown term.
+
+    Returns:
+        pd.DataFrame: Fold change per term (rows, in result order) and gene (columns, by fold change); NaN if
+        the gene is not a core gene of the term.
+    """
+    terms = core["terms"]
+    eligible = np.flatnonzero(pd.to_numeric(terms["setSize"], errors="coerce").to_numpy() <= max_setsize)
+    selected = eligible[: int(top_pathways)]
+    sub = core["matrix"][:, selected]
+
+    column = np.repeat(np.arange(selected.size), np.diff(sub.indptr))
+    magnitude = np.nan_to_num(np.abs(sub.data), nan=-1.0)
+    order = np.lexsort((-magnitude, column))
+    rank = np.arange(order.size) - sub.indptr[column[order]]
+    keep = order[rank < int(top_genes_per_pathway)]
+
+    gene_rows = sub.indices[keep]
+    genes = np.unique(gene_rows)
+    genes = genes[np.argsort(core["fold_change"][genes], kind="stable")]
+    position = np.empty(len(core["genes"]), dtype=np.int64)
+    position[genes] = np.arange(genes.size)
+    table = np.full((selected.size, genes.size), np.nan)
+    table[column[keep], position[gene_rows]] = sub.data[keep]
+    return pd.DataFrame(
+        table, index=pd.Index(terms["Description"].to_numpy()[selected], name="term"), columns=core["genes"][genes]
+    )
+
+
+def heatplot_figure(table: pd.DataFrame) -> go.Figure:
+    """
+    Plot a gene x term heatplot like enrichplot's heatplot with a fold change.
+
+    Args:
+        table (pd.DataFrame): Output of `select_heatplot`.
+
+    Returns:
+        go.Figure: Core genes of every term coloured by log2 fold change.
+    """
+    values = table.to_numpy()
+    limit = float(np.nanmax(np.abs(values))) if np.isfinite(values).any() else 1.0
+    fig = go.Figure(
+        go.Heatmap(
+            z=values,
+            x=list(table.columns),
+            y=list(table.index),
+            colorscale="RdBu_r",
+            zmin=-limit,
+            zmax=limit,
+            colorbar=dict(title="log2FC"),
+            xgap=1,
+            ygap=1,
+            hovertemplate="%{y}<br>%{x}<br>log2FC %{z:.2f}<extra></extra>",
+        )
+    )
+    fig.update_layout(
+        xaxis=dict(tickangle=-60),
+        height=max(300, 30 * len(table) + 200),
+        plot_bgcolor="white",
+    )
+    return fig
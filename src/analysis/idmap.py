@@ -0,0 +1,143 @@
+"""
+Gene identifier to Entrez ID mapping per species, built once from an org.*.eg.db package.
+
+Gene symbols, Ensembl gene IDs and alias symbols are stored as one sorted key array, so converting a whole
+list is a single vectorized binary search. The same table is written as 'idmap.tsv' for the R scripts:
+
+    python -m src.analysis.idmap org.Hs.eg.db
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from src.analysis.genesets import GENE_SET_DIR, find_annotation_db
+
+# Identifier types in order of precedence when a key is ambiguous, e.g. an alias that is another gene's symbol.
+KINDS = ("symbol", "ensembl", "alias")
+TSV_FILE = "idmap.tsv"
+
+
+def idmap_path(org_db: str) -> Path:
+    """
+    Return the directory of the identifier mapping of an annotation package.
+
+    Args:
+        org_db (str): The annotation package, e.g. 'org.Hs.eg.db'.
+
+    Returns:
+        Path: The mapping directory.
+    """
+    return GENE_SET_DIR / org_db / "idmap"
+
+
+def build_idmap(org_db: str, org_sqlite: Path | None = None) -> Path:
+    """
+    Build the identifier mapping of an org.*.eg.db package from its SQLite database.
+
+    Keys are upper-cased; a key that names several genes maps to the gene of its first identifier type in
+    `KINDS`.
+
+    Args:
+        org_db (str): The annotation package.
+        org_sqlite (Path | None, optional): Its SQLite database; located through R if not given.
+
+    Returns:
+        Path: The mapping directory.
+    """
+    if org_sqlite is None:
+        org_sqlite = find_annotation_db(org_db, org_db.replace(".db", ".sqlite"))
+    # Table and key column per identifier type, in the order of KINDS.
+    sources = [("gene_info", "symbol"), ("ensembl", "ensembl_id"), ("alias", "alias_symbol")]
+    frames = []
+    with sqlite3.connect(f"file:{org_sqlite}?mode=ro", uri=True) as con:
+        tables = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for code, (table, key) in enumerate(sources):
+            if table in tables:
+                query = f"SELECT gene_id AS entrez, {key} AS key FROM genes JOIN {table} USING (_id)"
+                frames.append(pd.read_sql_query(query, con).assign(kind=code))
+    table = pd.concat(frames, ignore_index=True).dropna()
+    table["key"] = table["key"].str.strip().str.upper()
+    table = table[table["key"] != ""]
+    table = table.sort_values(["kind", "entrez"], kind="stable").drop_duplicates("key").sort_values("key")
+
+    out = idmap_path(org_db)
+    tmp = out.with_name(out.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    np.save(tmp / "keys.npy", table["key"].to_numpy(dtype=str))
+    np.save(tmp / "entrez.npy", table["entrez"].astype(str).to_numpy(dtype=str))
+    np.save(tmp / "kind.npy", table["kind"].to_numpy(dtype=np.int8))
+    table.assign(kind=np.array(KINDS)[table["kind"]])[["key", "kind", "entrez"]].to_csv(
+        tmp / TSV_FILE, sep="\t", index=False
+    )
+    old = out.with_name(out.name + ".old")
+    if out.exists():
+        os.replace(out, old)
+    os.replace(tmp, out)
+    if old.exists():
+        shutil.rmtree(old)
+    return out
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _load_idmap(path: str, mtime_ns: int) -> dict:
+    path = Path(path)
+    return {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in ("keys", "entrez", "kind")}
+
+
+def load_idmap(org_db: str) -> dict | None:
+    """
+    Load the memory-mapped identifier mapping of an annotation package.
+
+    Args:
+        org_db (str): The annotation package.
+
+    Returns:
+        dict | None: Sorted 'keys' with their 'entrez' IDs and 'kind' codes, or None if it was not built.
+    """
+    tsv = idmap_path(org_db) / TSV_FILE
+    if not tsv.exists():
+        return None
+    return _load_idmap(str(tsv.parent), tsv.stat().st_mtime_ns)
+
+
+def map_ids(idmap: dict, ids, kinds=KINDS) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Convert gene identifiers to Entrez IDs.
+
+    Args:
+        idmap (dict): Output of `load_idmap`.
+        ids (Iterable[str]): Gene symbols, Ensembl gene IDs or aliases, in any case.
+        kinds (Iterable[str], optional): Identifier types to accept. Defaults to all of `KINDS`.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The Entrez ID per input ('' if unmapped) and the unique unmapped inputs.
+    """
+    ids = np.asarray(ids, dtype=str)
+    keys = np.char.upper(np.char.strip(ids))
+    pos = np.searchsorted(idmap["keys"], keys)
+    pos = np.minimum(pos, max(idmap["keys"].size - 1, 0))
+    found = (idmap["keys"].size > 0) & (idmap["keys"][pos] == keys)
+    found &= np.isin(idmap["kind"][pos], [KINDS.index(k) for k in kinds])
+    entrez = np.where(found, idmap["entrez"][pos], "")
+    return entrez, np.unique(ids[~found])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the gene identifier to Entrez ID mapping of an OrgDb.")
+    parser.add_argument("org_db", help="e.g. org.Hs.eg.db")
+    parser.add_argument("--org-sqlite", type=Path)
+    args = parser.parse_args()
+    print(build_idmap(args.org_db, args.org_sqlite))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Shared offline store of KEGG pathway assets for pathview.
+
+GENE_SET_DIR/kegg holds the KGML and base PNG of every pathway as '<species>/<pathway>.xml' and
+'<species>/<pathway>.png', e.g. 'hsa/hsa00230.xml'. The files are read-only and never fetched from the
+network: the store is seeded from a snapshot, a tar or zip archive (or a directory, e.g. an old pathview
+output folder) containing such files at any depth,
+
+    python -m src.analysis.kegg kegg-snapshot.tar.gz
+
+or, with KEGG_SNAPSHOT set to a bundled snapshot, on first use. Seeding again adds to the store. Runs link
+the assets of their pathways into their own directory, which pathview gets as kegg.dir, so it finds them there
+instead of downloading them.
+
+Seeding also parses every KGML once into '<pathway>.nodes.npz': the boxes of its gene nodes and their Entrez
+IDs as CSR arrays, for the native renderer in `src.analysis.keggmap`.
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import tarfile
+import threading
+import xml.etree.ElementTree as ET
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+from src.analysis.genesets import GENE_SET_DIR, META_FILE
+
+KEGG_DIR = GENE_SET_DIR / "kegg"
+KEGG_SNAPSHOT = os.getenv("KEGG_SNAPSHOT", "")
+ASSET_SUFFIXES = (".xml", ".png")
+NODES_SUFFIX = ".nodes.npz"
+
+_ASSET = re.compile(r"(?:^|/)(([a-z]{2,4})\d{5})\.(xml|png)$")
+_PATHWAY = re.compile(r"^([a-z]{2,4})\d{5}$")
+_seed_lock = threading.Lock()
+
+
+def asset_paths(pathway_id: str) -> tuple[Path, Path]:
+    """
+    Return the KGML and base PNG paths of a pathway in the store.
+
+    Args:
+        pathway_id (str): The pathway, e.g. 'hsa00230'.
+
+    Returns:
+        tuple[Path, Path]: The .xml and .png paths; they may not exist.
+
+    Raises:
+        ValueError: If the ID is not a KEGG pathway ID of a species.
+    """
+    match = _PATHWAY.match(pathway_id)
+    if not match:
+        raise ValueError(f"Not a KEGG pathway ID: {pathway_id}")
+    species_dir = KEGG_DIR / match.group(1)
+    return species_dir / f"{pathway_id}.xml", species_dir / f"{pathway_id}.png"
+
+
+def parse_kgml(path: Path) -> dict:
+    """
+    Read the gene nodes of a KGML file.
+
+    Args:
+        path (Path): The KGML file.
+
+    Returns:
+        dict: Per node the pixel box 'x0', 'y0', 'x1', 'y1' (int32) and 'labels'; its Entrez IDs as the CSR pair
+        'indptr' / 'entrez'.
+    """
+    boxes, labels, members = [], [], []
+    for entry in ET.parse(path).getroot().iter("entry"):
+        graphics = entry.find("graphics")
+        if entry.get("type") != "gene" or graphics is None or graphics.get("type", "rectangle") != "rectangle":
+            continue
+        x, y = float(graphics.get("x", 0)), float(graphics.get("y", 0))
+        width, height = float(graphics.get("width", 0)), float(graphics.get("height", 0))
+        boxes.append((x - width / 2, y - height / 2, x + width / 2, y + height / 2))
+        labels.append(graphics.get("name", "").split(",")[0])
+        # 'hsa:1234 hsa:5678'; the part after the organism code is the Entrez ID.
+        members.append([name.split(":", 1)[-1] for name in entry.get("name", "").split()])
+    boxes = np.rint(np.asarray(boxes, dtype=np.float64).reshape(-1, 4)).astype(np.int32)
+    return {
+        "x0": boxes[:, 0],
+        "y0": boxes[:, 1],
+        "x1": boxes[:, 2],
+        "y1": boxes[:, 3],
+        "labels": np.asarray(labels, dtype=str),
+        "indptr": np.concatenate([[0], np.cumsum([len(m) for m in members])]).astype(np.int64),
+        "entrez": np.asarray([g for m in members for g in m], dtype=str),
+    }
+
+
+def load_nodes(pathway_id: str) -> dict:
+    """
+    Load the gene nodes of a stored pathway, parsed at seeding or, for older stores, from its KGML.
+
+    Args:
+        pathway_id (str): The pathway, e.g. 'hsa00230'.
+
+    Returns:
+        dict: Output of `parse_kgml`.
+
+    Raises:
+        FileNotFoundError: If the pathway is not in the store.
+    """
+    xml, _ = asset_paths(pathway_id)
+    nodes = xml.with_name(pathway_id + NODES_SUFFIX)
+    if nodes.exists():
+        with np.load(nodes) as data:
+            return {key: data[key] for key in data.files}
+    if not xml.exists():
+        raise FileNotFoundError(f"{xml.name} is not in the KEGG store {KEGG_DIR}")
+    return parse_kgml(xml)
+
+
+def _write(out: Path, name: str, data) -> None:
+    # Replacing keeps existing read-only files replaceable.
+    target = out / _ASSET.search(name).group(2) / Path(name).name
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + ".tmp")
+    with open(tmp, "wb") as f:
+        shutil.copyfileobj(data, f)
+    os.chmod(tmp, 0o444)
+    os.replace(tmp, target)
+
+
+def _extract(snapshot: Path, out: Path) -> None:
+    if snapshot.is_dir():
+        for path in snapshot.rglob("*"):
+            if path.is_file() and _ASSET.search(path.as_posix()):
+                with open(path, "rb") as f:
+                    _write(out, path.as_posix(), f)
+    elif zipfile.is_zipfile(snapshot):
+        with zipfile.ZipFile(snapshot) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and _ASSET.search(info.filename):
+                    with zf.open(info) as f:
+                        _write(out, info.filename, f)
+    else:
+        with tarfile.open(snapshot) as tf:
+            for member in tf:
+                if member.isfile() and _ASSET.search(member.name):
+                    _write(out, member.name, tf.extractfile(member))
+
+
+def seed_store(snapshot: Path) -> Path:
+    """
+    Add the KEGG assets of a snapshot to the store.
+
+    Args:
+        snapshot (Path): A tar or zip archive, or a directory.
+
+    Returns:
+        Path: The store directory.
+
+    Raises:
+        FileNotFoundError: If the snapshot does not exist.
+    """
+    snapshot = Path(snapshot)
+    if not snapshot.exists():
+        raise FileNotFoundError(f"KEGG snapshot not found: {snapshot}")
+    out = KEGG_DIR
+    tmp = out.with_name(out.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    snapshots = []
+    if out.exists():
+        shutil.copytree(out, tmp)
+        if (tmp / META_FILE).exists():
+            snapshots = json.loads((tmp / META_FILE).read_text())["snapshots"]
+    tmp.mkdir(parents=True, exist_ok=True)
+    _extract(snapshot, tmp)
+    for xml in tmp.glob("*/*.xml"):
+        try:
+            np.savez(xml.with_name(xml.stem + NODES_SUFFIX), **parse_kgml(xml))
+        except ET.ParseError:
+            continue
+    pathways = sorted(p.stem for p in tmp.glob("*/*.xml") if p.with_suffix(".png").exists())
+    (tmp / META_FILE).write_text(
+        json.dumps({"snapshots": snapshots + [str(snapshot)], "n_pathways": len(pathways)})
+    )
+
+    old = out.with_name(out.name + ".old")
+    if out.exists():
+        os.replace(out, old)
+    os.replace(tmp, out)
+    if old.exists():
+        shutil.rmtree(old)
+    return out
+
+
+def ensure_store() -> bool:
+    """
+    Seed the store from KEGG_SNAPSHOT if it has not been seeded yet.
+
+    Returns:
+        bool: Whether the store exists.
+    """
+    with _seed_lock:
+        if not (KEGG_DIR / META_FILE).exists() and KEGG_SNAPSHOT and Path(KEGG_SNAPSHOT).exists():
+            seed_store(Path(KEGG_SNAPSHOT))
+    return (KEGG_DIR / META_FILE).exists()
+
+
+def list_pathways(species: str) -> list[str]:
+    """
+    List the pathways of a species with both assets in the store.
+
+    Args:
+        species (str): The KEGG organism code, e.g. 'hsa'.
+
+    Returns:
+        list[str]: Sorted pathway IDs.
+    """
+    if not ensure_store():
+        return []
+    return sorted(p.stem for p in (KEGG_DIR / species).glob("*.xml") if p.with_suffix(".png").exists())
+
+
+def link_assets(pathway_ids: list[str], run_dir: Path) -> Path:
+    """
+    Symlink the stored assets of pathways into a run directory, to be passed to pathview as kegg.dir.
+
+    Args:
+        pathway_ids (list[str]): The pathways, e.g. ['hsa00230'].
+        run_dir (Path): Directory to link them into; created if needed.
+
+    Returns:
+        Path: run_dir.
+
+    Raises:
+        FileNotFoundError: If a pathway is not in the store.
+    """
+    ensure_store()
+    run_dir = Path(run_dir)
+    run_dir.mkdir(parents=True, exist_ok=True)
+    for pathway_id in pathway_ids:
+        for source in asset_paths(pathway_id):
+            if not source.exists():
+                raise FileNotFoundError(f"{source.name} is not in the KEGG store {KEGG_DIR}")
+            link = run_dir / source.name
+            if link.is_symlink() or link.exists():
+                link.unlink()
+            os.symlink(source.resolve(), link)
+    return run_dir
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed the offline KEGG asset store from a snapshot.")
+    parser.add_argument("snapshot", type=Path, help="tar or zip archive, or directory, of <pathway>.xml/.png files")
+    args = parser.parse_args()
+    out = seed_store(args.snapshot)
+    print(out, json.loads((out / META_FILE).read_text())["n_pathways"], "pathways")
+
+
+if __name__ == "__main__":
+    main()
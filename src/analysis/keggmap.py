@@ -0,0 +1,243 @@
+"""
+Native KEGG pathway overlays, drawn like pathview's native PNG output without R.
+
+The gene nodes of a pathway (their boxes and Entrez IDs, parsed once when the KEGG store is seeded) are
+matched against the fold changes of all genes in one vectorized binary search; node values are summed per node
+as with pathview's default node.sum, binned into the blue-white-red scale and painted onto the light pixels of
+the stored base PNG, so the node borders and labels stay on top. Pathways are independent and render in
+parallel over a process pool.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from PIL import Image, ImageDraw
+
+from src.analysis.idmap import load_idmap, map_ids
+from src.analysis.kegg import asset_paths, ensure_store, load_nodes
+
+# pathview's defaults: low/mid/high gene colours, limit of the scale and number of colour bins.
+LOW = (0, 0, 255)
+MID = (255, 255, 255)
+HIGH = (255, 0, 0)
+LIMIT = 1.0
+BINS = 10
+# Pixels of a node box brighter than this in every channel are its fill (KEGG's light green #BFFFBF or white);
+# darker ones are borders and text.
+LIGHT = 150
+SYMBOL_COLUMNS = ("GENEID", "SYMBOL", "GENE_ID", "GENE")
+FC_COLUMNS = ("FOLDCHANGE", "LOGFC", "FC")
+
+
+def entrez_fold_changes(df: pd.DataFrame, org_db: str = "org.Hs.eg.db") -> tuple[np.ndarray, np.ndarray]:
+    """
+    Map a gene table's fold changes to Entrez IDs, like the pathview R script.
+
+    The gene and fold change columns are found by name, case-insensitively; the first row of an Entrez ID wins.
+
+    Args:
+        df (pd.DataFrame): Table with a gene ID / symbol column and a fold change column.
+        org_db (str, optional): The annotation package of the identifier mapping. Defaults to 'org.Hs.eg.db'.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Entrez IDs sorted, and their fold changes.
+
+    Raises:
+        ValueError: If a column is missing or the identifier mapping has not been built.
+    """
+    columns = {str(c).strip().upper(): c for c in df.columns}
+    symbol = next((columns[c] for c in SYMBOL_COLUMNS if c in columns), None)
+    fc = next((columns[c] for c in FC_COLUMNS if c in columns), None)
+    if symbol is None or fc is None:
+        raise ValueError("Check the column names: geneid / foldchange.")
+    idmap = load_idmap(org_db)
+    if idmap is None:
+        raise ValueError(f"The identifier mapping of {org_db} has not been built (python -m src.analysis.idmap).")
+
+    values = pd.to_numeric(df[fc], errors="coerce").to_numpy(dtype=np.float64)
+    entrez, _ = map_ids(idmap, df[symbol].fillna("").astype(str), kinds=("symbol",))
+    keep = (entrez != "") & ~np.isnan(values)
+    entrez, first = np.unique(entrez[keep], return_index=True)
+    return entrez, values[keep][first]
+
+
+def pathway_entrez(gene_ids: str, idmap: dict | None) -> np.ndarray:
+    """
+    Convert the 'geneID' field of an enrichKEGG result row to Entrez IDs.
+
+    Args:
+        gene_ids (str): '/'-separated Entrez IDs or gene symbols.
+        idmap (dict | None): Output of `src.analysis.idmap.load_idmap`; needed for symbols.
+
+    Returns:
+        np.ndarray: Unique Entrez IDs.
+    """
+    genes = np.unique(np.char.upper(np.char.strip(np.asarray(str(gene_ids).split("/"), dtype=str))))
+    if np.char.isdigit(genes).all() or idmap is None:
+        return genes[np.char.isdigit(genes)]
+    entrez, _ = map_ids(idmap, genes, kinds=("symbol",))
+    return np.unique(entrez[entrez != ""])
+
+
+def node_values(nodes: dict, entrez: np.ndarray, values: np.ndarray, allowed: np.ndarray | None = None) -> np.ndarray:
+    """
+    Sum the values of the genes of every node.
+
+    Args:
+        nodes (dict): Output of `src.analysis.kegg.load_nodes`.
+        entrez (np.ndarray): Sorted Entrez IDs.
+        values (np.ndarray): Value per Entrez ID.
+        allowed (np.ndarray | None, optional): Entrez IDs to use; all if None.
+
+    Returns:
+        np.ndarray: float64 value per node, NaN for nodes without data.
+    """
+    n = nodes["indptr"].size - 1
+    members = nodes["entrez"]
+    owner = np.repeat(np.arange(n), np.diff(nodes["indptr"]))
+    pos = np.minimum(np.searchsorted(entrez, members), max(entrez.size - 1, 0))
+    found = (entrez.size > 0) & (entrez[pos] == members)
+    if allowed is not None:
+        found &= np.isin(members, allowed)
+    sums = np.bincount(owner[found], weights=values[pos[found]], minlength=n)
+    counts = np.bincount(owner[found], minlength=n)
+    return np.where(counts > 0, sums, np.nan)
+
+
+def fold_change_colors(values: np.ndarray, limit: float = LIMIT, bins: int = BINS) -> np.ndarray:
+    """
+    Map values to the binned diverging low-mid-high scale of pathview.
+
+    Args:
+        values (np.ndarray): Values; NaN for no colour.
+        limit (float, optional): Values beyond ±limit get the end colours. Defaults to 1.0.
+        bins (int, optional): Number of colours. Defaults to 10.
+
+    Returns:
+        np.ndarray: (n, 3) uint8 RGB colours; rows of NaN values are undefined.
+    """
+    ramp = np.linspace(0.0, 1.0, bins)[:, None]
+    low, mid, high = (np.asarray(c, dtype=np.float64) for c in (LOW, MID, HIGH))
+    palette = np.where(ramp < 0.5, low + (mid - low) * ramp * 2, mid + (high - mid) * (ramp * 2 - 1))
+    scaled = (np.clip(np.nan_to_num(values), -limit, limit) + limit) / (2 * limit)
+    return np.rint(palette[np.minimum((scaled * bins).astype(np.int64), bins - 1)]).astype(np.uint8)
+
+
+def _draw_key(image: Image.Image, limit: float, bins: int) -> None:
+    # Colour key in the top right corner, as pathview draws it.
+    draw = ImageDraw.Draw(image)
+    width, cell = 12 * bins, 12
+    x0, y0 = image.width - width - 20, 10
+    colors = fold_change_colors(np.linspace(-limit, limit, bins), limit, bins)
+    for i, color in enumerate(colors):
+        draw.rectangle([x0 + i * 12, y0, x0 + (i + 1) * 12, y0 + cell], fill=tuple(int(c) for c in color))
+    draw.rectangle([x0, y0, x0 + width, y0 + cell], outline=(0, 0, 0))
+    for x, label in ((x0, f"{-limit:g}"), (x0 + width // 2, "0"), (x0 + width, f"{limit:g}")):
+        draw.text((x - 3 * len(label), y0 + cell + 2), label, fill=(0, 0, 0))
+
+
+def render_pathway(
+    pathway_id: str,
+    entrez: np.ndarray,
+    values: np.ndarray,
+    out_dir: Path,
+    suffix: str,
+    allowed: np.ndarray | None = None,
+    limit: float = LIMIT,
+    bins: int = BINS,
+) -> Path:
+    """
+    Colour the gene nodes of a stored pathway by fold change and save it as '<pathway>.<suffix>.png'.
+
+    Args:
+        pathway_id (str): The pathway, e.g. 'hsa00230'.
+        entrez (np.ndarray): Sorted Entrez IDs.
+        values (np.ndarray): Fold change per Entrez ID.
+        out_dir (Path): Output directory; created if needed.
+        suffix (str): Output suffix, as pathview's out.suffix.
+        allowed (np.ndarray | None, optional): Entrez IDs to colour, e.g. the pathway's enriched genes.
+        limit (float, optional): Limit of the colour scale. Defaults to 1.0.
+        bins (int, optional): Number of colours. Defaults to 10.
+
+    Returns:
+        Path: The image.
+
+    Raises:
+        FileNotFoundError: If the pathway is not in the store.
+    """
+    nodes = load_nodes(pathway_id)
+    _, png = asset_paths(pathway_id)
+    if not png.exists():
+        raise FileNotFoundError(f"{png.name} is not in the KEGG store")
+    with Image.open(png) as base:
+        pixels = np.array(base.convert("RGB"))
+
+    node_value = node_values(nodes, entrez, values, allowed)
+    colored = np.flatnonzero(~np.isnan(node_value))
+    height, width = pixels.shape[:2]
+    # Later nodes overlap earlier ones, as when drawn in order; the outer pixel row is the node border.
+    owner = np.full((height, width), -1, dtype=np.int32)
+    x0 = np.clip(nodes["x0"][colored] + 1, 0, width)
+    x1 = np.clip(nodes["x1"][colored], 0, width)
+    y0 = np.clip(nodes["y0"][colored] + 1, 0, height)
+    y1 = np.clip(nodes["y1"][colored], 0, height)
+    for k in range(colored.size):
+        owner[y0[k] : y1[k], x0[k] : x1[k]] = k
+    fill = (owner >= 0) & (pixels.min(axis=2) >= LIGHT)
+    pixels[fill] = fold_change_colors(node_value[colored], limit, bins)[owner[fill]]
+
+    image = Image.fromarray(pixels)
+    _draw_key(image, limit, bins)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out = out_dir / f"{pathway_id}.{suffix}.png"
+    image.save(out)
+    return out
+
+
+def _render(pathway_id, allowed, entrez, values, out_dir, label, limit, bins) -> str | None:
+    try:
+        render_pathway(pathway_id, entrez, values, out_dir, f"{label}_{pathway_id}", allowed, limit, bins)
+    except (ValueError, OSError) as e:
+        return str(e)
+    return None
+
+
+def render_pathways(
+    pathway_genes: dict,
+    entrez: np.ndarray,
+    values: np.ndarray,
+    out_dir: Path,
+    label: str,
+    limit: float = LIMIT,
+    bins: int = BINS,
+) -> dict[str, str | None]:
+    """
+    Render many pathways in parallel, each saved as '<pathway>.<label>_<pathway>.png' like the R script.
+
+    Args:
+        pathway_genes (dict): Entrez IDs to colour per pathway ID, or None for all genes.
+        entrez (np.ndarray): Sorted Entrez IDs.
+        values (np.ndarray): Fold change per Entrez ID.
+        out_dir (Path): Output directory.
+        label (str): Output label, e.g. the combo.
+        limit (float, optional): Limit of the colour scale. Defaults to 1.0.
+        bins (int, optional): Number of colours. Defaults to 10.
+
+    Returns:
+        dict[str, str | None]: The error per pathway, None where it rendered.
+    """
+    ensure_store()
+    ids = list(pathway_genes)
+    shared = (entrez, values, out_dir, label, limit, bins)
+    args = [ids, [pathway_genes[p] for p in ids]] + [[a] * len(ids) for a in shared]
+    workers = max(1, min(os.cpu_count() or 1, len(ids)))
+    if workers == 1:
+        errors = list(map(_render, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            errors = list(pool.map(_render, *args))
+    return dict(zip(ids, errors))
@@ -0,0 +1,183 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import plotly.graph_objects as go
+import streamlit as st
+
+# Layouts kept per scope and steps of a warm-started layout.
+MAX_LAYOUTS = 32
+WARM_ITERATIONS = 30
+
+
+def spring_layout(
+    n_nodes: int,
+    edges: np.ndarray,
+    weights: np.ndarray | None = None,
+    pos: np.ndarray | None = None,
+    iterations: int = 100,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Place the nodes of a graph with the Fruchterman-Reingold force-directed algorithm.
+
+    Repulsion is computed in matrix form from the pairwise squared distances, so a step costs a few n x n
+    float32 array operations and no n x n x 2 displacement tensor; attraction is summed over the edge list.
+    Given start positions, the layout is warm-started: unknown nodes start next to their placed neighbours and
+    the initial temperature is lowered, so a graph that only gained or lost a few nodes settles in a fraction
+    of the steps.
+
+    Args:
+        n_nodes (int): Number of nodes.
+        edges (np.ndarray): (n_edges, 2) node indices.
+        weights (np.ndarray | None, optional): Attraction per edge. Defaults to 1.
+        pos (np.ndarray | None, optional): (n_nodes, 2) start positions, NaN for unknown nodes. Defaults to None.
+        iterations (int, optional): Number of steps. Defaults to 100.
+        seed (int, optional): Seed of the random start positions. Defaults to 0.
+
+    Returns:
+        np.ndarray: (n_nodes, 2) positions in [-1, 1].
+    """
+    if n_nodes < 2:
+        return np.zeros((n_nodes, 2))
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    weights = np.ones(len(edges)) if weights is None else np.asarray(weights, dtype=np.float64)
+
+    rng = np.random.default_rng(seed)
+    temperature = 0.1
+    if pos is None or np.isnan(pos).all():
+        pos = rng.uniform(-1, 1, size=(n_nodes, 2))
+    else:
+        pos = np.array(pos, dtype=np.float64)
+        unknown = np.isnan(pos[:, 0])
+        # New nodes start at the mean of their placed neighbours, or anywhere if they have none.
+        both = np.concatenate([edges, edges[:, ::-1]])
+        placed = both[unknown[both[:, 0]] & ~unknown[both[:, 1]]]
+        n_links = np.bincount(placed[:, 0], minlength=n_nodes)
+        start = rng.uniform(-1, 1, size=(n_nodes, 2))
+        for axis in range(2):
+            total = np.bincount(placed[:, 0], weights=pos[placed[:, 1], axis], minlength=n_nodes)
+            start[:, axis] = np.where(n_links > 0, total / np.maximum(n_links, 1), start[:, axis])
+        pos[unknown] = start[unknown] + rng.normal(scale=0.05, size=(int(unknown.sum()), 2))
+        temperature = 0.1 * max(unknown.mean(), 0.1)
+
+    k = np.sqrt(1.0 / n_nodes)
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        # Repulsion between all pairs in float32; the displacement of i is sum_j f_ij (p_i - p_j).
+        p32 = pos.astype(np.float32)
+        sq = (p32**2).sum(axis=1)
+        d2 = np.maximum(sq[:, None] + sq[None, :] - 2 * p32 @ p32.T, np.float32(1e-4))
+        force = np.float32(k * k) / d2
+        np.fill_diagonal(force, 0.0)
+        displacement = (p32 * force.sum(axis=1)[:, None] - force @ p32).astype(np.float64)
+        # Attraction only along edges.
+        delta = pos[edges[:, 0]] - pos[edges[:, 1]]
+        pull = delta * (weights * np.linalg.norm(delta, axis=1) / k)[:, None]
+        for axis in range(2):
+            displacement[:, axis] -= np.bincount(edges[:, 0], weights=pull[:, axis], minlength=n_nodes)
+            displacement[:, axis] += np.bincount(edges[:, 1], weights=pull[:, axis], minlength=n_nodes)
+        length = np.maximum(np.linalg.norm(displacement, axis=-1), 0.01)
+        pos += displacement * (temperature / length)[:, None]
+        temperature -= cooling
+
+    pos -= pos.mean(axis=0)
+    scale = np.abs(pos).max()
+    return pos / scale if scale > 0 else pos
+
+
+def graph_key(nodes: list[str], edges: np.ndarray) -> str:
+    """
+    Hash a graph by its node names and edges.
+
+    Args:
+        nodes (list[str]): Node names.
+        edges (np.ndarray): (n_edges, 2) node indices.
+
+    Returns:
+        str: Hex digest identifying the graph.
+    """
+    digest = hashlib.sha1("\0".join(nodes).encode())
+    digest.update(np.ascontiguousarray(edges, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def _layout_cache(scope: str) -> dict:
+    return {"layouts": OrderedDict(), "last": {}}
+
+
+def cached_layout(
+    nodes: list[str], edges: np.ndarray, weights: np.ndarray | None = None, scope: str = ""
+) -> np.ndarray:
+    """
+    Return the spring layout of a graph, cached by graph hash.
+
+    A graph not seen before is warm-started from the last layout of the same scope (e.g. one combination and
+    ontology), so raising or lowering the number of terms keeps the placed nodes where they were and only
+    needs a short refinement.
+
+    Args:
+        nodes (list[str]): Node names.
+        edges (np.ndarray): (n_edges, 2) node indices.
+        weights (np.ndarray | None, optional): Attraction per edge. Defaults to 1.
+        scope (str, optional): Layouts of one scope warm-start each other. Defaults to ''.
+
+    Returns:
+        np.ndarray: (n_nodes, 2) positions in [-1, 1].
+    """
+    cache = _layout_cache(scope)
+    key = graph_key(nodes, edges)
+    if key in cache["layouts"]:
+        cache["layouts"].move_to_end(key)
+        pos = cache["layouts"][key]
+    else:
+        last = cache["last"]
+        start = np.array([last.get(node, (np.nan, np.nan)) for node in nodes], dtype=np.float64).reshape(-1, 2)
+        warm = len(nodes) > 0 and not np.isnan(start).all()
+        pos = spring_layout(len(nodes), edges, weights, start if warm else None, WARM_ITERATIONS if warm else 100)
+        cache["layouts"][key] = pos
+        while len(cache["layouts"]) > MAX_LAYOUTS:
+            cache["layouts"].popitem(last=False)
+    cache["last"] = dict(zip(nodes, map(tuple, pos)))
+    return pos
+
+
+def edge_traces(pos: np.ndarray, edges: np.ndarray, weights: np.ndarray, n_widths: int = 4) -> list[go.Scatter]:
+    """
+    Draw the edges of a graph as line traces, one per width class, as Plotly lines share one width per trace.
+
+    Args:
+        pos (np.ndarray): (n_nodes, 2) positions.
+        edges (np.ndarray): (n_edges, 2) node indices.
+        weights (np.ndarray): Weight per edge, mapped to the line width.
+        n_widths (int, optional): Number of width classes. Defaults to 4.
+
+    Returns:
+        list[go.Scatter]: The edge traces.
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    if not len(edges):
+        return []
+    weights = np.asarray(weights, dtype=np.float64)
+    bounds = np.linspace(weights.min(), weights.max(), n_widths + 1)
+    classes = np.clip(np.searchsorted(bounds, weights, side="right") - 1, 0, n_widths - 1)
+    traces = []
+    for c in np.unique(classes):
+        selected = edges[classes == c]
+        # Segments separated by NaN gaps.
+        xy = np.full((len(selected), 3, 2), np.nan)
+        xy[:, 0] = pos[selected[:, 0]]
+        xy[:, 1] = pos[selected[:, 1]]
+        traces.append(
+            go.Scatter(
+                x=xy[:, :, 0].ravel(),
+                y=xy[:, :, 1].ravel(),
+                mode="lines",
+                line=dict(width=0.5 + 2.5 * (c + 1) / n_widths, color="rgba(150, 150, 150, 0.6)"),
+                hoverinfo="skip",
+                showlegend=False,
+            )
+        )
+    return traces
@@ -0,0 +1,310 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import scipy.sparse as sp
+from scipy.special import gammaln
+
+from src.analysis.deg import deg_genes, deg_path
+from src.analysis.genesets import GMT_SOURCE, GO_ONTOLOGIES, gene_columns, load_collection
+
+# Same columns and defaults as clusterProfiler::enrichGO / enrichKEGG.
+RESULT_COLUMNS = [
+    "ID", "Description", "GeneRatio", "BgRatio", "RichFactor", "FoldEnrichment", "zScore",
+    "pvalue", "p.adjust", "qvalue", "geneID", "Count",
+]
+MIN_GS_SIZE = 10
+MAX_GS_SIZE = 500
+QVALUE_CUTOFF = 0.2
+
+
+def membership_matrix(collection: dict, gene_lists: dict[str, np.ndarray]) -> sp.csr_matrix:
+    """
+    Encode gene lists as a sparse lists x genes matrix over the columns of a collection.
+
+    Args:
+        collection (dict): Output of `src.analysis.genesets.load_collection`.
+        gene_lists (dict[str, np.ndarray]): Gene identifiers per list; unknown genes are dropped.
+
+    Returns:
+        sp.csr_matrix: 1 where a list contains a gene.
+    """
+    rows, cols = [], []
+    for row, genes in enumerate(gene_lists.values()):
+        found = np.unique(gene_columns(collection, genes))
+        found = found[found >= 0]
+        rows.append(np.full(found.size, row))
+        cols.append(found)
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+    return sp.csr_matrix(
+        (np.ones(rows.size, dtype=np.float32), (rows, cols)), shape=(len(gene_lists), len(collection["genes"]))
+    )
+
+
+def _log_comb(n: np.ndarray, k: np.ndarray) -> np.ndarray:
+    return gammaln(n + 1) - gammaln(k + 1) - gammaln(n - k + 1)
+
+
+def hypergeom_sf(x: np.ndarray, universe: int, term_size: np.ndarray, list_size: np.ndarray) -> np.ndarray:
+    """
+    Hypergeometric upper tail P(X >= x), vectorized over all (list, term) pairs.
+
+    The probability of x comes from log-binomials; the tail is summed from x away from the mode with the pmf
+    ratio recurrence until the terms no longer change the sum, so only a few steps are needed per pair.
+    Overlaps below the mode are summed on the short side as 1 - P(X < x).
+
+    Args:
+        x (np.ndarray): Overlaps.
+        universe (int): Number of genes in the universe.
+        term_size (np.ndarray): Term sizes.
+        list_size (np.ndarray): List sizes.
+
+    Returns:
+        np.ndarray: Upper tail probabilities.
+    """
+    x, big_k, n = (np.asarray(a, dtype=np.float64) for a in np.broadcast_arrays(x, term_size, list_size))
+    rest = universe - big_k
+    lo = np.maximum(0, n - rest)
+    hi = np.minimum(big_k, n)
+    mode = np.floor((n + 1) * (big_k + 1) / (universe + 2))
+    upper = x > mode
+    # Upper side sums pmf(x..hi), lower side pmf(lo..x-1).
+    k = np.where(upper, x, x - 1)
+    log_pmf = _log_comb(big_k, k) + _log_comb(rest, n - k) - _log_comb(universe, n)
+    term = np.where(k >= lo, np.exp(log_pmf), 0.0)
+    total = term.copy()
+    active = np.flatnonzero(np.where(upper, k < hi, k > lo) & (term > 0))
+    while active.size:
+        ka, ba, na, ra = k[active], big_k[active], n[active], rest[active]
+        up = upper[active]
+        ratio = np.where(
+            up,
+            (ba - ka) * (na - ka) / ((ka + 1) * (ra - na + ka + 1)),
+            ka * (ra - na + ka) / np.maximum((ba - ka + 1) * (na - ka + 1), 1),
+        )
+        term[active] *= ratio
+        k[active] = np.where(up, ka + 1, ka - 1)
+        total[active] += term[active]
+        done = (term[active] <= total[active] * 1e-16) | np.where(up, k[active] >= hi[active], k[active] <= lo[active])
+        active = active[~done]
+    return np.clip(np.where(upper, total, 1.0 - total), 0.0, 1.0)
+
+
+def bh_adjust(pvalues: np.ndarray) -> np.ndarray:
+    """
+    Benjamini-Hochberg adjusted p-values, as p.adjust(method = "BH").
+
+    Args:
+        pvalues (np.ndarray): p-values of one list.
+
+    Returns:
+        np.ndarray: Adjusted p-values in input order.
+    """
+    m = pvalues.size
+    if m == 0:
+        return pvalues
+    order = np.argsort(pvalues)[::-1]
+    adjusted = np.minimum.accumulate(pvalues[order] * m / np.arange(m, 0, -1))
+    out = np.empty(m)
+    out[order] = np.minimum(adjusted, 1.0)
+    return out
+
+
+def storey_qvalue(pvalues: np.ndarray, adjusted: np.ndarray, lam: float = 0.05) -> np.ndarray:
+    """
+    q-values as clusterProfiler computes them (qvalue with a single lambda of 0.05).
+
+    With one lambda, pi0 = #(p >= lambda) / (m * (1 - lambda)) and the q-values are pi0 times the BH values.
+
+    Args:
+        pvalues (np.ndarray): p-values of one list.
+        adjusted (np.ndarray): Their BH adjusted values.
+        lam (float, optional): The lambda of the pi0 estimate. Defaults to 0.05.
+
+    Returns:
+        np.ndarray: q-values.
+    """
+    if pvalues.size == 0:
+        return adjusted
+    pi0 = min(1.0, float(np.mean(pvalues >= lam)) / (1 - lam))
+    return pi0 * adjusted
+
+
+def ora(
+    collection: dict, gene_lists: dict[str, np.ndarray], min_size: int = MIN_GS_SIZE, max_size: int = MAX_GS_SIZE
+) -> dict[str, pd.DataFrame]:
+    """
+    Over-representation analysis of many gene lists against all terms of a collection at once.
+
+    Overlaps of every list with every term come from one sparse matrix product, the hypergeometric upper tails
+    of all tested (list, term) pairs from one vectorized call. As in clusterProfiler, the universe is the set of
+    genes annotated in the collection, only terms with at least one list gene and min_size..max_size annotated
+    genes are tested, and p-values are adjusted per list.
+
+    Args:
+        collection (dict): Output of `src.analysis.genesets.load_collection`.
+        gene_lists (dict[str, np.ndarray]): Gene identifiers (Entrez IDs or symbols) per list.
+        min_size (int, optional): Minimal term size. Defaults to 10.
+        max_size (int, optional): Maximal term size. Defaults to 500.
+
+    Returns:
+        dict[str, pd.DataFrame]: Unfiltered results per list in the clusterProfiler layout, sorted by p-value.
+    """
+    terms = collection["matrix"]
+    annotated = np.asarray(terms.sum(axis=0)).ravel() > 0
+    lists = membership_matrix(collection, gene_lists)
+    lists = lists @ sp.diags(annotated.astype(np.float32))
+    lists.eliminate_zeros()
+    lists = lists.tocsr()
+
+    universe = int(annotated.sum())
+    list_sizes = np.asarray(lists.sum(axis=1)).ravel().astype(np.int64)
+    term_sizes = np.diff(terms.indptr)
+    overlap = (lists @ terms.T).tocoo()
+    row, term, count = overlap.row, overlap.col, overlap.data.astype(np.int64)
+    keep = (term_sizes[term] >= min_size) & (term_sizes[term] <= max_size)
+    row, term, count = row[keep], term[keep], count[keep]
+
+    big_k = term_sizes[term]
+    small_n = list_sizes[row]
+    pvalues = hypergeom_sf(count, universe, big_k, small_n)
+    expected = small_n * big_k / universe
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (count - expected) / np.sqrt(expected * (1 - big_k / universe))
+
+    genes = collection["genes"]["symbol"].where(collection["genes"]["symbol"] != "", collection["genes"]["gene_id"])
+    genes = genes.to_numpy()
+    descriptions = collection["terms"]["description"].to_numpy()
+    term_ids = collection["terms"]["term"].to_numpy()
+    results = {}
+    for i, name in enumerate(gene_lists):
+        sel = np.flatnonzero(row == i)
+        sel = sel[np.argsort(pvalues[sel], kind="stable")]
+        p = pvalues[sel]
+        adjusted = bh_adjust(p)
+        overlap_genes = terms[term[sel]].multiply(lists[i]).tocsr()
+        overlap_genes.sort_indices()
+        names = genes[overlap_genes.indices].tolist()
+        bounds = overlap_genes.indptr.tolist()
+        hits = ["/".join(names[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+        results[name] = pd.DataFrame(
+            {
+                "ID": term_ids[term[sel]],
+                "Description": descriptions[term[sel]],
+                "GeneRatio": [f"{c}/{list_sizes[i]}" for c in count[sel]],
+                "BgRatio": [f"{k}/{universe}" for k in big_k[sel]],
+                "RichFactor": count[sel] / big_k[sel],
+                "FoldEnrichment": count[sel] / expected[sel],
+                "zScore": z[sel],
+                "pvalue": p,
+                "p.adjust": adjusted,
+                "qvalue": storey_qvalue(p, adjusted),
+                "geneID": hits,
+                "Count": count[sel],
+            },
+            columns=RESULT_COLUMNS,
+        )
+    return results
+
+
+def filter_results(df: pd.DataFrame, pvalue_cutoff: float, qvalue_cutoff: float = QVALUE_CUTOFF) -> pd.DataFrame:
+    """
+    Keep the significant terms, with the cutoffs clusterProfiler applies before writing results.
+
+    Args:
+        df (pd.DataFrame): Output of `ora` for one list.
+        pvalue_cutoff (float): Cutoff on pvalue and p.adjust.
+        qvalue_cutoff (float, optional): Cutoff on qvalue. Defaults to 0.2.
+
+    Returns:
+        pd.DataFrame: The significant terms.
+    """
+    keep = (df["pvalue"] < pvalue_cutoff) & (df["p.adjust"] < pvalue_cutoff) & (df["qvalue"] < qvalue_cutoff)
+    return df[keep]
+
+
+def run_enrichment(
+    workspace: Path, method: str, org_db: str, gmt_collections: list[str], pvalue_cutoff: float
+) -> dict[str, int]:
+    """
+    Run GO BP/CC/MF and the selected GMT collections for every DEG combination in one pass.
+
+    Results are written to 'deg/enrich/<combo>/<collection>_result.csv', e.g. 'GO_BP_result.csv', the files the
+    backend writes.
+
+    Args:
+        workspace (Path): The current workspace.
+        method (str): The analysis method.
+        org_db (str): The annotation package of the GO collections.
+        gmt_collections (list[str]): Names of user GMT collections, e.g. ['KEGG'].
+        pvalue_cutoff (float): Cutoff on pvalue and p.adjust.
+
+    Returns:
+        dict[str, int]: Number of significant terms per collection over all combinations.
+
+    Raises:
+        FileNotFoundError: If a collection has not been built.
+    """
+    gene_lists = deg_genes(workspace, method)
+    sources = [(org_db, f"GO_{ont}") for ont in GO_ONTOLOGIES] + [(GMT_SOURCE, name) for name in gmt_collections]
+    collections = {}
+    for source, name in sources:
+        collection = load_collection(source, name)
+        if collection is None:
+            raise FileNotFoundError(f"Gene set collection {source}/{name} has not been built")
+        collections[name] = collection
+
+    output_dir = deg_path(workspace, method) / "enrich"
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    counts = {}
+    for name, collection in collections.items():
+        counts[name] = 0
+        for combo, df in ora(collection, gene_lists).items():
+            df = filter_results(df, pvalue_cutoff)
+            out = output_dir / combo / f"{name}_result.csv"
+            out.parent.mkdir(parents=True, exist_ok=True)
+            df.to_csv(out, index=False)
+            counts[name] += len(df)
+    return counts
+
+
+def dotplot_figure(df: pd.DataFrame, show_category: int = 10) -> go.Figure:
+    """
+    Plot enrichment results like clusterProfiler's dotplot.
+
+    Args:
+        df (pd.DataFrame): Results in the clusterProfiler layout.
+        show_category (int, optional): Number of terms with the smallest p.adjust to show. Defaults to 10.
+
+    Returns:
+        go.Figure: Gene ratio on the x-axis, dot size by count and colour by p.adjust.
+    """
+    # Empty result files are read back with object columns.
+    top = df.astype({"p.adjust": float, "Count": float}).sort_values("p.adjust").head(int(show_category))
+    ratio = top["GeneRatio"].astype(str).str.split("/", expand=True).reindex(columns=[0, 1]).astype(float)
+    top = top.assign(ratio=ratio[0] / ratio[1]).sort_values("ratio")
+    max_count = float(top["Count"].max()) if len(top) else 1.0
+    fig = go.Figure(
+        go.Scatter(
+            x=top["ratio"],
+            y=top["Description"],
+            mode="markers",
+            marker=dict(
+                size=top["Count"],
+                sizemode="area",
+                sizeref=2.0 * max(max_count, 1.0) / 30**2,
+                color=top["p.adjust"],
+                colorscale="Bluered_r",
+                colorbar=dict(title="p.adjust"),
+            ),
+            customdata=top[["ID", "Count", "p.adjust"]].to_numpy(),
+            hovertemplate="%{customdata[0]}<br>%{y}<br>Count %{customdata[1]}<br>p.adjust %{customdata[2]:.2e}"
+            "<extra></extra>",
+        )
+    )
+    fig.update_layout(xaxis_title="GeneRatio", height=max(300, 40 * len(top) + 120))
+    return fig
@@ -0,0 +1,196 @@
+from pathlib import Path
+
+import numpy as np
+import plotly.graph_objects as go
+import streamlit as st
+from plotly.subplots import make_subplots
+
+from src.analysis.results import load_results, results_path, sample_columns
+
+# Number of principal components computed and cached per gene selection.
+N_COMPONENTS = 10
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _stabilized_matrix(path: str, mtime_ns: int, workspace: str, method: str) -> dict:
+    df = load_results(Path(workspace), method)
+    samples = sample_columns(df)
+    counts = df[samples].to_numpy(dtype=np.float32)
+    # log2(x + 1) of the normalized counts, the same transform DESeq2's normTransform applies.
+    values = np.log2(counts + 1, dtype=np.float32)
+    return {
+        "values": values,
+        "variance": values.var(axis=1, ddof=1),
+        "genes": df["gene"].to_numpy(),
+        "samples": samples,
+    }
+
+
+def stabilized_matrix(workspace: Path, method: str) -> dict | None:
+    """
+    Return the log-transformed normalized counts of an analysis method as a float32 genes x samples matrix.
+
+    The matrix and its per-gene variance are computed once per results file version.
+
+    Args:
+        workspace (Path): The current workspace.
+        method (str): The analysis method.
+
+    Returns:
+        dict | None: 'values', 'variance', 'genes' and 'samples', or None without results.
+    """
+    path = results_path(workspace, method)
+    if not path.exists():
+        return None
+    return _stabilized_matrix(str(path), path.stat().st_mtime_ns, str(workspace), method)
+
+
+def top_variable(variance: np.ndarray, n: int) -> np.ndarray:
+    """
+    Return the indices of the n genes with the highest variance, in no particular order.
+
+    Args:
+        variance (np.ndarray): Per-gene variance.
+        n (int): Number of genes to select.
+
+    Returns:
+        np.ndarray: Selected row indices.
+    """
+    if n >= variance.size:
+        return np.arange(variance.size)
+    return np.argpartition(variance, variance.size - n)[variance.size - n :]
+
+
+def randomized_svd(
+    x: np.ndarray, k: int, oversample: int = 10, n_iter: int = 4, seed: int = 0
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute a truncated SVD with the randomized range finder of Halko, Martinsson and Tropp.
+
+    Args:
+        x (np.ndarray): Matrix to decompose.
+        k (int): Number of singular vectors.
+        oversample (int, optional): Extra random projections for accuracy. Defaults to 10.
+        n_iter (int, optional): Power iterations, helpful for slowly decaying spectra. Defaults to 4.
+        seed (int, optional): Seed of the random projection. Defaults to 0.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: u, s and vt truncated to k components.
+    """
+    m, n = x.shape
+    size = min(k + oversample, m, n)
+    if size >= min(m, n):
+        u, s, vt = np.linalg.svd(x, full_matrices=False)
+        return u[:, :k], s[:k], vt[:k]
+    rng = np.random.default_rng(seed)
+    q = x @ rng.standard_normal((n, size), dtype=x.dtype)
+    q, _ = np.linalg.qr(q)
+    for _ in range(n_iter):
+        q, _ = np.linalg.qr(x.T @ q)
+        q, _ = np.linalg.qr(x @ q)
+    u_small, s, vt = np.linalg.svd(q.T @ x, full_matrices=False)
+    return (q @ u_small)[:, :k], s[:k], vt[:k]
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _pca(path: str, mtime_ns: int, workspace: str, method: str, n: int) -> dict:
+    matrix = stabilized_matrix(Path(workspace), method)
+    idx = top_variable(matrix["variance"], n)
+    # Samples are the observations: center every gene across samples.
+    x = matrix["values"][idx].T
+    x = x - x.mean(axis=0, keepdims=True)
+    k = min(N_COMPONENTS, *x.shape)
+    u, s, vt = randomized_svd(x, k)
+    total = float(np.square(x, dtype=np.float64).sum())
+    return {
+        "scores": u * s,
+        "loadings": vt.T,
+        "explained": (s.astype(np.float64) ** 2) / total if total else np.zeros_like(s),
+        "genes": matrix["genes"][idx],
+        "samples": matrix["samples"],
+    }
+
+
+def pca(workspace: Path, method: str, n: int) -> dict | None:
+    """
+    Run PCA on the n most variable genes of an analysis method.
+
+    Scores, loadings and explained variance ratios of the first components are cached per (results version,
+    method, n); choosing which components to plot does not recompute them.
+
+    Args:
+        workspace (Path): The current workspace.
+        method (str): The analysis method.
+        n (int): Number of most variable genes.
+
+    Returns:
+        dict | None: 'scores' (samples x PCs), 'loadings' (genes x PCs), 'explained', 'genes' and 'samples'.
+    """
+    path = results_path(workspace, method)
+    if not path.exists():
+        return None
+    return _pca(str(path), path.stat().st_mtime_ns, str(workspace), method, int(n))
+
+
+def pca_figure(result: dict, pc_x: int = 1, pc_y: int = 2, n_loadings: int = 20) -> go.Figure:
+    """
+    Plot the PCA scores of the samples next to the gene loadings.
+
+    Args:
+        result (dict): Output of `pca`.
+        pc_x (int, optional): Component on the x-axis, 1-based. Defaults to 1.
+        pc_y (int, optional): Component on the y-axis, 1-based. Defaults to 2.
+        n_loadings (int, optional): Number of genes with the largest loadings to label. Defaults to 20.
+
+    Returns:
+        go.Figure: Scores and loadings side by side.
+    """
+    i, j = pc_x - 1, pc_y - 1
+    label_x = f"PC{pc_x} ({result['explained'][i]:.1%})"
+    label_y = f"PC{pc_y} ({result['explained'][j]:.1%})"
+    fig = make_subplots(rows=1, cols=2, subplot_titles=("Scores", "Loadings"))
+    fig.add_trace(
+        go.Scatter(
+            x=result["scores"][:, i],
+            y=result["scores"][:, j],
+            mode="markers+text",
+            text=result["samples"],
+            textposition="top center",
+            marker=dict(size=10),
+            name="samples",
+        ),
+        row=1,
+        col=1,
+    )
+    loadings = result["loadings"][:, [i, j]]
+    strongest = np.argsort(np.hypot(loadings[:, 0], loadings[:, 1]))[-n_loadings:]
+    fig.add_trace(
+        go.Scattergl(
+            x=loadings[:, 0],
+            y=loadings[:, 1],
+            mode="markers",
+            marker=dict(size=4, color="grey", opacity=0.6),
+            hovertext=result["genes"],
+            hoverinfo="text",
+            name="genes",
+        ),
+        row=1,
+        col=2,
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=loadings[strongest, 0],
+            y=loadings[strongest, 1],
+            mode="markers+text",
+            text=result["genes"][strongest],
+            textposition="top center",
+            marker=dict(size=6, color="red"),
+            name=f"top {len(strongest)} loadings",
+        ),
+        row=1,
+        col=2,
+    )
+    fig.update_xaxes(title_text=label_x)
+    fig.update_yaxes(title_text=label_y)
+    fig.update_layout(height=600, showlegend=False)
+    return fig
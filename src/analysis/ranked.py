@@ -0,0 +1,126 @@
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from src.analysis.results import load_results, results_path
+
+META_FILE = "meta.json"
+
+
+def ranked_path(workspace: Path, method: str) -> Path:
+    """
+    Return the directory of the ranked gene list of an analysis method.
+
+    Args:
+        workspace (Path): The current workspace.
+        method (str): The analysis method.
+
+    Returns:
+        Path: Path to the 'ranked' directory next to the merged results.
+    """
+    return Path(workspace, "csv-files", "output", method, "ranked")
+
+
+def build_ranked_list(workspace: Path, method: str) -> Path | None:
+    """
+    Rank the genes of an analysis method by decreasing log2 fold change, the geneList of gseGO, and store it.
+
+    Writes 'scores.npy' (float32), 'genes.npy' and 'rows.npy' (row in the merged results) in rank order. Genes
+    without a fold change and repeated gene identifiers are dropped.
+
+    Args:
+        workspace (Path): The current workspace.
+        method (str): The analysis method.
+
+    Returns:
+        Path | None: The ranked list directory, or None without results.
+    """
+    source = results_path(workspace, method)
+    df = load_results(workspace, method)
+    if df is None:
+        return None
+    scores = df["log2FoldChange"].to_numpy()
+    rows = np.flatnonzero(~np.isnan(scores) & ~df["gene"].duplicated().to_numpy())
+    rows = rows[np.argsort(-scores[rows], kind="stable")]
+
+    out = ranked_path(workspace, method)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    # Unique temporary names, so sessions building the same list at once never remove each other's files.
+    tmp = Path(tempfile.mkdtemp(dir=out.parent, prefix=out.name + ".", suffix=".tmp"))
+    np.save(tmp / "scores.npy", scores[rows].astype(np.float32))
+    np.save(tmp / "genes.npy", df["gene"].to_numpy()[rows].astype(str))
+    np.save(tmp / "rows.npy", rows.astype(np.int32))
+    (tmp / META_FILE).write_text(json.dumps({"source_mtime_ns": source.stat().st_mtime_ns, "n_genes": int(rows.size)}))
+
+    old = Path(tempfile.mkdtemp(dir=out.parent, prefix=out.name + ".", suffix=".old"))
+    try:
+        os.replace(out, old)
+    except FileNotFoundError:
+        pass
+    try:
+        os.replace(tmp, out)
+    except OSError:
+        # Another session swapped in its list first; it was built from the same results.
+        shutil.rmtree(tmp)
+    shutil.rmtree(old)
+    return out
+
+
+def build_ranked_lists(workspace: Path) -> list[Path]:
+    """
+    Build the ranked gene lists of all analysis methods with merged results in a workspace.
+
+    Args:
+        workspace (Path): The current workspace.
+
+    Returns:
+        list[Path]: The ranked list directories.
+    """
+    built = []
+    for source in sorted(Path(workspace, "csv-files", "output").glob("*/merged_results_*.csv")):
+        path = build_ranked_list(workspace, source.parent.name)
+        if path is not None:
+            built.append(path)
+    return built
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _load_ranked_list(path: str, mtime_ns: int) -> dict:
+    path = Path(path)
+    genes = np.load(path / "genes.npy", mmap_mode="r")
+    return {
+        "scores": np.load(path / "scores.npy", mmap_mode="r"),
+        "genes": genes,
+        "rows": np.load(path / "rows.npy", mmap_mode="r"),
+        "index": pd.Index(genes),
+        # Identifies this version of the list in caches derived from it.
+        "key": f"{path}:{mtime_ns}",
+    }
+
+
+def ranked_list(workspace: Path, method: str) -> dict | None:
+    """
+    Return the memory-mapped ranked gene list of an analysis method, building it if it is missing or older
+    than the merged results.
+
+    Args:
+        workspace (Path): The current workspace.
+        method (str): The analysis method.
+
+    Returns:
+        dict | None: 'scores', 'genes' and 'rows' in rank order, 'index' (gene to rank) and 'key', or None
+        without results.
+    """
+    source = results_path(workspace, method)
+    if not source.exists():
+        return None
+    meta = ranked_path(workspace, method) / META_FILE
+    if not meta.exists() or json.loads(meta.read_text())["source_mtime_ns"] != source.stat().st_mtime_ns:
+        build_ranked_list(workspace, method)
+    return _load_ranked_list(str(meta.parent), meta.stat().st_mtime_ns)
@@ -0,0 +1,94 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Column names written by DESeq2 (and a few common aliases), mapped to the names used by the analysis engines.
+COLUMN_ALIASES = {
+    "gene": ("Geneid", "Gene_Symbol", "SYMBOL", "gene", "gene_id", "Gene"),
+    "log2FoldChange": ("log2FoldChange", "logFC", "log2FC"),
+    "pvalue": ("pvalue", "PValue", "P.Value"),
+    "padj": ("padj", "FDR", "adj.P.Val"),
+}
+
+# DESeq2 statistics that are not per-sample values.
+STAT_COLUMNS = {"baseMean", "lfcSE", "stat"}
+
+
+def results_path(workspace: Path, method: str) -> Path:
+    """
+    Return the path of the merged DESeq2 results of an analysis method.
+
+    Args:
+        workspace (Path): The current workspace.
+        method (str): The analysis method, e.g. 'wald' or 'LRT'.
+
+    Returns:
+        Path: Path to 'merged_results_<method>.csv'.
+    """
+    return Path(workspace, "csv-files", "output", method, f"merged_results_{method}.csv")
+
+
+def _resolve_columns(columns: list[str]) -> dict[str, str]:
+    lower = {c.lower(): c for c in columns}
+    renames = {}
+    for target, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias.lower() in lower:
+                renames[lower[alias.lower()]] = target
+                break
+    if "gene" not in renames.values():
+        # The gene identifier is written as an unnamed index column by write.csv.
+        renames[columns[0]] = "gene"
+    return renames
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _read_results(path: str, mtime_ns: int) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    renames = _resolve_columns(list(df.columns))
+    df = df.rename(columns=renames)
+    # Exports restore the names the R scripts expect.
+    df.attrs["original_columns"] = {new: old for old, new in renames.items()}
+    # Lets derived files such as the DEG bitmasks record which version of the results they index.
+    df.attrs["mtime_ns"] = mtime_ns
+    df["gene"] = df["gene"].astype(str)
+    for col in ("log2FoldChange", "pvalue", "padj"):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(np.float64)
+    return df
+
+
+def load_results(workspace: Path, method: str) -> pd.DataFrame | None:
+    """
+    Load the merged DESeq2 results of an analysis method.
+
+    The table is parsed once per file version and shared between reruns and sessions, so callers must treat
+    it as read-only. Columns are renamed to 'gene', 'log2FoldChange', 'pvalue' and 'padj' where found.
+
+    Args:
+        workspace (Path): The current workspace.
+        method (str): The analysis method.
+
+    Returns:
+        pd.DataFrame | None: The results, or None if the file does not exist.
+    """
+    path = results_path(workspace, method)
+    if not path.exists():
+        return None
+    return _read_results(str(path), path.stat().st_mtime_ns)
+
+
+def sample_columns(df: pd.DataFrame) -> list[str]:
+    """
+    Return the per-sample (normalized count) columns of a results table.
+
+    Args:
+        df (pd.DataFrame): Results loaded with `load_results`.
+
+    Returns:
+        list[str]: Names of the numeric columns that are not DESeq2 statistics.
+    """
+    known = set(COLUMN_ALIASES) | STAT_COLUMNS
+    return [c for c in df.select_dtypes(include="number").columns if c not in known]
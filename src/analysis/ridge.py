@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.colors import sample_colorscale
+
+from src.analysis.gsea import term_positions
+
+GRID_SIZE = 512
+
+
+def bw_nrd0(values: np.ndarray) -> float:
+    """
+    Silverman's rule of thumb, R's bw.nrd0.
+
+    Args:
+        values (np.ndarray): The sample.
+
+    Returns:
+        float: The bandwidth.
+    """
+    if values.size < 2:
+        return 1.0
+    spread = min(np.std(values, ddof=1), np.subtract(*np.percentile(values, [75, 25])) / 1.34)
+    if not spread > 0:
+        spread = np.std(values, ddof=1) or abs(values[0]) or 1.0
+    return float(0.9 * spread * values.size**-0.2)
+
+
+def core_scores(ranked: dict, df: pd.DataFrame, hits: dict | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Collect the ranked-list statistic of every term's core enrichment genes.
+
+    Core genes are looked up in the ranked list by name. Terms whose core genes are not in the list, e.g. results
+    keyed by another identifier, fall back to their genes in the gene set index up to the 'rank' of the leading
+    edge.
+
+    Args:
+        ranked (dict): Output of `src.analysis.ranked.ranked_list`.
+        df (pd.DataFrame): Results in the gseGO layout.
+        hits (dict | None, optional): Output of `src.analysis.gsea.term_hits` for the fallback.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: CSR-style 'indptr' per row of df and the statistic values.
+    """
+    n = ranked["scores"].size
+    parts = []
+    for _, row in df.iterrows():
+        genes = str(row["core_enrichment"]).split("/") if pd.notna(row["core_enrichment"]) else []
+        positions = ranked["index"].get_indexer(genes)
+        positions = positions[positions >= 0]
+        if positions.size == 0 and hits is not None:
+            term = term_positions(hits, row["ID"])
+            if term is not None:
+                rank = int(row["rank"])
+                positions = term[term < rank] if row["enrichmentScore"] >= 0 else term[term >= n - rank]
+        parts.append(np.asarray(ranked["scores"])[positions])
+    indptr = np.concatenate([[0], np.cumsum([p.size for p in parts])]).astype(np.int64)
+    values = np.concatenate(parts).astype(np.float64) if parts else np.zeros(0)
+    return indptr, values
+
+
+def binned_kde(indptr: np.ndarray, values: np.ndarray, grid_size: int = GRID_SIZE) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Gaussian kernel densities of many samples on one grid, in a single pass.
+
+    All samples are linearly binned onto a shared grid with one bincount, then convolved with the kernel by one
+    batched real FFT. Like ggridges, every sample uses the same bandwidth, the mean of their bw.nrd0.
+
+    Args:
+        indptr (np.ndarray): Sample boundaries in values.
+        values (np.ndarray): Concatenated samples.
+        grid_size (int, optional): Number of grid points. Defaults to 512.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The grid and (n_samples, grid_size) densities, each integrating to 1.
+    """
+    n_samples = indptr.size - 1
+    sizes = np.diff(indptr)
+    if values.size == 0:
+        return np.linspace(-1, 1, grid_size), np.zeros((n_samples, grid_size))
+    bandwidth = np.mean([bw_nrd0(values[indptr[i] : indptr[i + 1]]) for i in range(n_samples) if sizes[i] > 0])
+    lo, hi = values.min() - 3 * bandwidth, values.max() + 3 * bandwidth
+    grid = np.linspace(lo, hi, grid_size)
+    step = grid[1] - grid[0]
+
+    # Linear binning: each value is split between its two neighbouring grid points.
+    sample = np.repeat(np.arange(n_samples), sizes)
+    where = (values - lo) / step
+    left = np.minimum(np.floor(where).astype(np.int64), grid_size - 2)
+    frac = where - left
+    flat = sample * grid_size + left
+    counts = np.bincount(flat, weights=1 - frac, minlength=n_samples * grid_size)
+    counts += np.bincount(flat + 1, weights=frac, minlength=n_samples * grid_size)
+    counts = counts.reshape(n_samples, grid_size)
+
+    # Zero padding to twice the grid keeps the circular convolution from wrapping around.
+    offsets = np.arange(2 * grid_size)
+    offsets = np.minimum(offsets, 2 * grid_size - offsets) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    smoothed = np.fft.irfft(np.fft.rfft(counts, n=2 * grid_size, axis=1) * np.fft.rfft(kernel), n=2 * grid_size)
+    densities = smoothed[:, :grid_size] / np.maximum(sizes, 1)[:, None]
+    return grid, np.maximum(densities, 0.0)
+
+
+def ridgeplot_figure(df: pd.DataFrame, grid: np.ndarray, densities: np.ndarray, overlap: float = 1.5) -> go.Figure:
+    """
+    Plot core enrichment distributions like enrichplot's ridgeplot.
+
+    Args:
+        df (pd.DataFrame): The shown terms, bottom to top.
+        grid (np.ndarray): Output of `binned_kde`.
+        densities (np.ndarray): Output of `binned_kde`, one row per term.
+        overlap (float, optional): Height of the highest ridge in rows. Defaults to 1.5.
+
+    Returns:
+        go.Figure: One filled ridge per term, coloured by p.adjust.
+    """
+    padj = df["p.adjust"].to_numpy(dtype=float)
+    span = np.ptp(padj) if padj.size else 0.0
+    colors = sample_colorscale("Bluered_r", (padj - padj.min()) / span if span > 0 else np.zeros(padj.size))
+    scale = overlap / densities.max() if densities.size and densities.max() > 0 else 0.0
+
+    fig = go.Figure()
+    x = np.concatenate([grid, grid[::-1]])
+    for i, (description, color) in enumerate(zip(df["Description"], colors)):
+        y = np.concatenate([i + densities[i] * scale, np.full(grid.size, i)])
+        fig.add_trace(
+            go.Scatter(
+                x=x,
+                y=y,
+                fill="toself",
+                fillcolor=color,
+                line=dict(color="black", width=0.5),
+                opacity=0.8,
+                name=description,
+                hoverinfo="name",
+                showlegend=False,
+            )
+        )
+    # Invisible markers carry the p.adjust colour bar.
+    fig.add_trace(
+        go.Scatter(
+            x=[None],
+            y=[None],
+            mode="markers",
+            marker=dict(
+                color=padj,
+                colorscale="Bluered_r",
+                cmin=padj.min() if padj.size else 0,
+                cmax=padj.max() if padj.size else 1,
+                colorbar=dict(title="p.adjust"),
+            ),
+            hoverinfo="skip",
+            showlegend=False,
+        )
+    )
+    fig.update_layout(
+        xaxis_title="log2FoldChange",
+        yaxis=dict(tickmode="array", tickvals=np.arange(len(df)), ticktext=list(df["Description"])),
+        height=max(400, 28 * len(df) + 150),
+        plot_bgcolor="white",
+    )
+    return fig
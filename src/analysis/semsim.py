@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from src.analysis.genesets import META_FILE
+from src.analysis.godag import DAG_DIR, load_dag
+
+MEASURES = ("Wang", "Resnik", "Lin")
+# Semantic contribution of is_a and part_of edges in Wang's measure, as in GOSemSim.
+WANG_WEIGHTS = np.array([0.8, 0.6])
+# Defaults of clusterProfiler::simplify.
+SIMPLIFY_CUTOFF = 0.7
+
+# Position of the first set bit of a byte, most significant bit first (np.packbits order).
+_FIRST_BIT = np.array([8] + [7 - int(np.log2(v)) for v in range(1, 256)], dtype=np.int64)
+
+
+def _ancestor_columns(dag: dict, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # The terms and all their ancestors, and which of them every term reaches (itself included).
+    indptr, indices = dag["ancestors"]
+    own = [np.append(indices[indptr[r] : indptr[r + 1]], r) for r in rows]
+    columns = np.unique(np.concatenate(own)) if own else np.zeros(0, dtype=np.int64)
+    reach = np.zeros((rows.size, columns.size), dtype=bool)
+    for i, ancestors in enumerate(own):
+        reach[i, np.searchsorted(columns, ancestors)] = True
+    return columns, reach
+
+
+def wang_similarity(dag: dict, rows: np.ndarray) -> np.ndarray:
+    """
+    Wang's graph-based similarity of all pairs of GO terms.
+
+    The semantic values S_A(t) of every term A on its ancestors t are propagated for all terms at once, one
+    depth of the DAG at a time from the deepest; the shared-ancestor sums are then two matrix products.
+
+    Args:
+        dag (dict): Output of `src.analysis.godag.load_dag`.
+        rows (np.ndarray): Term indices in the DAG.
+
+    Returns:
+        np.ndarray: (n, n) similarities in [0, 1].
+    """
+    columns, reach = _ancestor_columns(dag, rows)
+    position = pd.Index(columns)
+    values = np.zeros((columns.size, rows.size))
+    values[position.get_indexer(rows), np.arange(rows.size)] = 1.0
+
+    indptr, indices = dag["parents"]
+    depth = dag["depth"][columns]
+    for d in np.unique(depth)[::-1]:
+        children = np.flatnonzero(depth == d)
+        counts = indptr[columns[children] + 1] - indptr[columns[children]]
+        if not counts.sum():
+            continue
+        entries = np.concatenate([np.arange(indptr[c], indptr[c + 1]) for c in columns[children]])
+        child = np.repeat(children, counts)
+        parent = position.get_indexer(indices[entries])
+        weight = WANG_WEIGHTS[dag["parents_relation"][entries]]
+        np.maximum.at(values, parent, weight[:, None] * values[child])
+
+    values = values.T
+    present = values > 0
+    shared = values @ present.T + present @ values.T
+    total = values.sum(axis=1)
+    return shared / (total[:, None] + total[None, :])
+
+
+def ic_similarity(dag: dict, rows: np.ndarray, ic: np.ndarray, measure: str = "Resnik") -> np.ndarray:
+    """
+    Resnik or Lin similarity of all pairs of GO terms from the information content of their most informative
+    common ancestor (MICA).
+
+    Ancestor sets are packed as bitsets with the ancestors ordered by decreasing information content, so the
+    MICA of a pair is the first set bit of the AND of their bitsets. Resnik is scaled by the largest finite
+    information content, so both measures lie in [0, 1].
+
+    Args:
+        dag (dict): Output of `src.analysis.godag.load_dag`.
+        rows (np.ndarray): Term indices in the DAG.
+        ic (np.ndarray): Information content per DAG term.
+        measure (str, optional): 'Resnik' or 'Lin'. Defaults to 'Resnik'.
+
+    Returns:
+        np.ndarray: (n, n) similarities.
+    """
+    columns, reach = _ancestor_columns(dag, rows)
+    column_ic = np.where(np.isfinite(ic[columns]), ic[columns], np.nan)
+    # Unannotated ancestors (NaN) sort last and never win.
+    order = np.argsort(-np.nan_to_num(column_ic, nan=-np.inf), kind="stable")
+    column_ic = np.nan_to_num(column_ic[order], nan=0.0)
+    bits = np.packbits(reach[:, order], axis=1)
+
+    n = rows.size
+    mica = np.zeros((n, n))
+    block = max(1, 8_000_000 // max(n * bits.shape[1], 1))
+    for start in range(0, n, block):
+        common = bits[start : start + block, None, :] & bits[None, :, :]
+        nonzero = common != 0
+        found = nonzero.any(axis=-1)
+        byte = nonzero.argmax(axis=-1)
+        first = byte * 8 + _FIRST_BIT[np.take_along_axis(common, byte[..., None], axis=-1)[..., 0]]
+        mica[start : start + block] = np.where(found, column_ic[np.minimum(first, column_ic.size - 1)], 0.0)
+
+    if measure == "Resnik":
+        finite = ic[np.isfinite(ic)]
+        return mica / finite.max() if finite.size and finite.max() > 0 else mica
+    own = np.where(np.isfinite(ic[rows]), ic[rows], np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lin = 2 * mica / (own[:, None] + own[None, :])
+    return np.nan_to_num(lin, nan=0.0)
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _similarity(terms: tuple, measure: str, org_db: str, dag_mtime_ns: int) -> np.ndarray:
+    dag = load_dag()
+    rows = dag["index"].get_indexer(list(terms))
+    known = np.flatnonzero(rows >= 0)
+    similarity = np.zeros((len(terms), len(terms)))
+    if measure == "Wang":
+        sub = wang_similarity(dag, rows[known])
+    else:
+        sub = ic_similarity(dag, rows[known], dag["ic"][org_db], measure)
+    similarity[np.ix_(known, known)] = sub
+    # Terms missing from the DAG are only similar to themselves.
+    np.fill_diagonal(similarity, np.maximum(np.diag(similarity), (rows < 0).astype(float)))
+    return similarity
+
+
+def semantic_similarity(terms, measure: str = "Wang", org_db: str = "") -> np.ndarray | None:
+    """
+    Semantic similarity of all pairs of GO terms, cached per term list, measure and DAG build.
+
+    Args:
+        terms (Iterable[str]): GO IDs.
+        measure (str, optional): 'Wang', 'Resnik' or 'Lin'. Defaults to 'Wang'.
+        org_db (str, optional): The OrgDb of the information content; required for Resnik and Lin.
+
+    Returns:
+        np.ndarray | None: (n, n) similarities, or None if the GO DAG index, or the information content of
+        org_db for IC-based measures, has not been built.
+
+    Raises:
+        ValueError: If the measure is unknown.
+    """
+    if measure not in MEASURES:
+        raise ValueError(f"Unknown semantic similarity measure: {measure}")
+    dag = load_dag()
+    if dag is None or (measure != "Wang" and org_db not in dag["ic"]):
+        return None
+    mtime_ns = (DAG_DIR / META_FILE).stat().st_mtime_ns
+    return _similarity(tuple(str(t) for t in terms), measure, org_db, mtime_ns)
+
+
+def simplify(
+    df: pd.DataFrame,
+    cutoff: float = SIMPLIFY_CUTOFF,
+    measure: str = "Wang",
+    org_db: str = "",
+    by: str = "p.adjust",
+) -> pd.DataFrame | None:
+    """
+    Remove redundant GO terms like clusterProfiler's simplify.
+
+    For every term, of the terms more similar to it than the cutoff (itself included) only those with the
+    smallest value of `by` are kept, so every cluster of near-duplicates collapses to its most significant
+    representative.
+
+    Args:
+        df (pd.DataFrame): Enrichment or gseGO results with an 'ID' column.
+        cutoff (float, optional): Similarity above which terms are redundant. Defaults to 0.7.
+        measure (str, optional): 'Wang', 'Resnik' or 'Lin'. Defaults to 'Wang'.
+        org_db (str, optional): The OrgDb of the information content; required for Resnik and Lin.
+        by (str, optional): Column to select representatives by, smallest first. Defaults to 'p.adjust'.
+
+    Returns:
+        pd.DataFrame | None: The kept rows in their original order, or None if the similarity is unavailable.
+    """
+    if df.empty:
+        return df
+    similarity = semantic_similarity(df["ID"], measure, org_db)
+    if similarity is None:
+        return None
+    values = df[by].to_numpy(dtype=float)
+    similar = similarity > cutoff
+    best = np.where(similar, values[:, None], np.inf).min(axis=0)
+    redundant = (similar & (values[:, None] > best[None, :])).any(axis=1)
+    return df[~redundant]
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Same classes and colours as EnhancedVolcano, indexed by (|log2FC| >= cutoff) + 2 * (p <= cutoff).
+CATEGORIES = [
+    ("NS", "grey"),
+    ("Log2 FC", "forestgreen"),
+    ("p-value", "royalblue"),
+    ("p-value and log2 FC", "red"),
+]
+
+
+def classify(log2fc: np.ndarray, pvalue: np.ndarray, fc_cutoff: float, pval_cutoff: float) -> np.ndarray:
+    """
+    Assign every gene to one of the volcano plot categories.
+
+    Args:
+        log2fc (np.ndarray): log2 fold changes.
+        pvalue (np.ndarray): p-values.
+        fc_cutoff (float): Cutoff on the absolute log2 fold change.
+        pval_cutoff (float): Cutoff on the p-value.
+
+    Returns:
+        np.ndarray: Category index per gene, see `CATEGORIES`. Genes with missing values are 'NS'.
+    """
+    with np.errstate(invalid="ignore"):
+        passes_fc = np.abs(log2fc) >= fc_cutoff
+        passes_p = pvalue <= pval_cutoff
+    return passes_fc.astype(np.int8) + 2 * passes_p.astype(np.int8)
+
+
+def volcano_figure(df: pd.DataFrame, fc_cutoff: float, pval_cutoff: float) -> go.Figure:
+    """
+    Build an interactive WebGL volcano plot from DESeq2 results.
+
+    Points carry their row position in df as custom data, so a box selection can be mapped back to genes
+    with `selected_genes`.
+
+    Args:
+        df (pd.DataFrame): Results loaded with `src.analysis.results.load_results`.
+        fc_cutoff (float): Cutoff on the absolute log2 fold change.
+        pval_cutoff (float): Cutoff on the p-value.
+
+    Returns:
+        go.Figure: The volcano plot.
+    """
+    log2fc = df["log2FoldChange"].to_numpy()
+    pvalue = df["pvalue"].to_numpy()
+    valid = ~(np.isnan(log2fc) | np.isnan(pvalue))
+    # p-values of 0 would end up at infinity, draw them at the smallest reported p-value instead.
+    positive = pvalue[valid & (pvalue > 0)]
+    floor = positive.min() if positive.size else np.finfo(np.float64).tiny
+    neg_log_p = -np.log10(np.clip(pvalue, floor, 1.0))
+    category = classify(log2fc, pvalue, fc_cutoff, pval_cutoff)
+    genes = df["gene"].to_numpy()
+
+    fig = go.Figure()
+    for code, (name, color) in enumerate(CATEGORIES):
+        idx = np.flatnonzero(valid & (category == code))
+        fig.add_trace(
+            go.Scattergl(
+                x=log2fc[idx],
+                y=neg_log_p[idx],
+                mode="markers",
+                name=f"{name} ({idx.size})",
+                marker=dict(color=color, size=5, opacity=0.7),
+                customdata=idx,
+                hovertext=genes[idx],
+                hovertemplate="%{hovertext}<br>log2FC %{x:.3f}<br>-log10 p %{y:.2f}<extra></extra>",
+            )
+        )
+    line = dict(color="black", dash="dash", width=1)
+    fig.add_vline(x=fc_cutoff, line=line)
+    fig.add_vline(x=-fc_cutoff, line=line)
+    if pval_cutoff > 0:
+        fig.add_hline(y=-np.log10(pval_cutoff), line=line)
+    fig.update_layout(
+        xaxis_title="log<sub>2</sub> fold change",
+        yaxis_title="-log<sub>10</sub> p-value",
+        dragmode="select",
+        legend=dict(orientation="h", y=1.08),
+        height=650,
+    )
+    return fig
+
+
+def selected_genes(df: pd.DataFrame, selection: dict | None) -> pd.DataFrame:
+    """
+    Return the rows of the results table selected in a volcano plot.
+
+    Args:
+        df (pd.DataFrame): The results the plot was built from.
+        selection (dict | None): The selection event stored by `st.plotly_chart`.
+
+    Returns:
+        pd.DataFrame: The selected genes, empty if nothing is selected.
+    """
+    if not selection:
+        return df.iloc[0:0]
+    points = selection.get("selection", {}).get("points", [])
+    rows = [p["customdata"] for p in points if "customdata" in p]
+    rows = np.unique([r[0] if isinstance(r, list) else r for r in rows]).astype(int)
+    return df.iloc[rows]
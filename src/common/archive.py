@@ -0,0 +1,231 @@
+import fcntl
+import json
+import os
+import struct
+import tempfile
+import threading
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+
+# Prebuilt archives and their manifests live in a hidden directory inside the
+# archived root, so they are never picked up as members themselves.
+ARCHIVE_DIR = ".downloads"
+
+# Derived files that are only kept for transfer, e.g. precompressed SVG plots.
+EXCLUDE_SUFFIXES = (".svgz",)
+
+# ZIP record layouts (APPNOTE 4.3): local file header, central directory header, end of central directory.
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+_END_RECORD = struct.Struct("<4s4H2LH")
+# Entries past these limits need zip64 records, which only a full build writes.
+_MAX_ENTRIES = 0xFFFF
+_MAX_OFFSET = 0xFFFFFFFF
+
+_locks: dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _lock_for(path: Path):
+    # The thread lock serializes the sessions of one process, the file lock other server processes.
+    with _locks_guard:
+        lock = _locks.setdefault(str(path), threading.Lock())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with lock, open(path.with_suffix(".lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _temp_path(path: Path) -> Path:
+    # A unique name next to the target, so concurrent writers never share a temporary file.
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    os.close(fd)
+    return Path(tmp)
+
+
+def build_manifest(root: Path, members: list[str] | None = None, pattern: str = "*") -> dict[str, list[int]]:
+    """
+    Collect the files that make up an archive together with their size and modification time.
+
+    Args:
+        root (Path): Directory the archive member names are relative to.
+        members (list[str], optional): Sub-directories or files of root to include. Defaults to everything in root.
+        pattern (str, optional): Glob pattern file names must match. Defaults to "*".
+
+    Returns:
+        dict[str, list[int]]: Mapping of archive member name to [size, mtime_ns].
+    """
+    root = Path(root)
+    sources = [root / m for m in members] if members is not None else [root]
+    manifest = {}
+    for src in sources:
+        if src.is_file():
+            files = [src]
+        elif src.is_dir():
+            files = (f for f in src.rglob(pattern) if f.is_file())
+        else:
+            continue
+        for f in files:
+            rel = f.relative_to(root)
+            if ARCHIVE_DIR in rel.parts or f.suffix in EXCLUDE_SUFFIXES or not f.match(pattern):
+                continue
+            stat = f.stat()
+            manifest[rel.as_posix()] = [stat.st_size, stat.st_mtime_ns]
+    return manifest
+
+
+def _full_build(root: Path, zip_path: Path, manifest: dict[str, list[int]]) -> None:
+    tmp_path = _temp_path(zip_path)
+    try:
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name in sorted(manifest):
+                zf.write(root / name, name)
+        os.replace(tmp_path, zip_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def _copy_entries(source: Path, names: set[str], out, entries: list) -> None:
+    # Copy the local records of members byte for byte, without decompressing them.
+    with zipfile.ZipFile(source) as zf, open(source, "rb") as f:
+        for info in zf.infolist():
+            if info.filename not in names:
+                continue
+            if info.flag_bits & 0x08 or info.file_size > _MAX_OFFSET or info.compress_size > _MAX_OFFSET:
+                raise zipfile.BadZipFile(f"{info.filename}: data descriptors and zip64 are not copied")
+            f.seek(info.header_offset)
+            header = f.read(_LOCAL_HEADER.size)
+            name_length, extra_length = _LOCAL_HEADER.unpack(header)[-2:]
+            offset = out.tell()
+            if offset > _MAX_OFFSET:
+                raise zipfile.BadZipFile("Archive needs zip64")
+            out.write(header)
+            out.write(f.read(name_length + extra_length + info.compress_size))
+            entries.append((info, offset))
+
+
+def _write_central_directory(out, entries: list) -> None:
+    start = out.tell()
+    for info, offset in entries:
+        name = info.filename.encode("utf-8" if info.flag_bits & 0x800 else "cp437")
+        year, month, day, hour, minute, second = info.date_time
+        out.write(
+            _CENTRAL_HEADER.pack(
+                b"PK\x01\x02",
+                info.create_system << 8 | info.create_version,
+                info.extract_version,
+                info.flag_bits,
+                info.compress_type,
+                hour << 11 | minute << 5 | second // 2,
+                (year - 1980) << 9 | month << 5 | day,
+                info.CRC,
+                info.compress_size,
+                info.file_size,
+                len(name),
+                len(info.extra),
+                len(info.comment),
+                0,
+                info.internal_attr,
+                info.external_attr,
+                offset,
+            )
+        )
+        out.write(name + info.extra + info.comment)
+    size = out.tell() - start
+    if start > _MAX_OFFSET or len(entries) > _MAX_ENTRIES:
+        raise zipfile.BadZipFile("Archive needs zip64")
+    out.write(_END_RECORD.pack(b"PK\x05\x06", 0, 0, len(entries), len(entries), size, start, 0))
+
+
+def _patch(root: Path, zip_path: Path, manifest: dict[str, list[int]], changed: list[str]) -> None:
+    # Unchanged members are copied as stored, only changed ones are compressed again. The result is
+    # written to a new file and swapped in, so the published archive is never modified in place.
+    changed_zip = _temp_path(zip_path)
+    tmp_path = _temp_path(zip_path)
+    try:
+        with zipfile.ZipFile(changed_zip, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name in changed:
+                zf.write(root / name, name)
+        entries = []
+        with open(tmp_path, "wb") as out:
+            _copy_entries(zip_path, set(manifest) - set(changed), out, entries)
+            _copy_entries(changed_zip, set(changed), out, entries)
+            if {info.filename for info, _ in entries} != set(manifest):
+                raise zipfile.BadZipFile("Archive is missing members")
+            entries.sort(key=lambda entry: entry[0].filename)
+            _write_central_directory(out, entries)
+        with zipfile.ZipFile(tmp_path) as zf:
+            if len(zf.infolist()) != len(manifest):
+                raise zipfile.BadZipFile("Patched archive is unreadable")
+        os.replace(tmp_path, zip_path)
+    finally:
+        changed_zip.unlink(missing_ok=True)
+        tmp_path.unlink(missing_ok=True)
+
+
+def _write_manifest(manifest_path: Path, manifest: dict[str, list[int]]) -> None:
+    tmp_path = _temp_path(manifest_path)
+    try:
+        tmp_path.write_text(json.dumps(manifest), encoding="utf-8")
+        os.replace(tmp_path, manifest_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def download_archive(root: Path, name: str, members: list[str] | None = None, pattern: str = "*") -> Path | None:
+    """
+    Return a ZIP archive of a result directory, building or updating it only when its content changed.
+
+    The archive is stored in a hidden '.downloads' directory inside root together with the manifest it was
+    built from. On the next call the manifest is compared with the files on disk: an unchanged directory
+    returns the stored archive as is. Otherwise a new archive is written next to it, with the unchanged
+    members copied over still compressed and only changed files compressed again, and atomically replaces
+    the old one, so a download in progress keeps reading a complete file.
+
+    Args:
+        root (Path): Directory the archive member names are relative to.
+        name (str): Base name of the archive file, without extension.
+        members (list[str], optional): Sub-directories or files of root to include. Defaults to everything in root.
+        pattern (str, optional): Glob pattern file names must match. Defaults to "*".
+
+    Returns:
+        Path | None: Path to the ZIP archive, or None if there is nothing to archive.
+    """
+    root = Path(root)
+    if not root.is_dir():
+        return None
+    archive_dir = root / ARCHIVE_DIR
+    zip_path = archive_dir / f"{name}.zip"
+    manifest_path = archive_dir / f"{name}.manifest.json"
+
+    with _lock_for(zip_path):
+        manifest = build_manifest(root, members, pattern)
+        if not manifest:
+            return None
+
+        previous = None
+        if zip_path.exists() and manifest_path.exists():
+            try:
+                previous = json.loads(manifest_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                previous = None
+
+        if previous == manifest:
+            return zip_path
+
+        if previous is None:
+            _full_build(root, zip_path, manifest)
+        else:
+            changed = [n for n, entry in manifest.items() if previous.get(n) != entry]
+            try:
+                _patch(root, zip_path, manifest, changed)
+            except (OSError, zipfile.BadZipFile):
+                _full_build(root, zip_path, manifest)
+
+        _write_manifest(manifest_path, manifest)
+    return zip_path
@@ -20,6 +20,7 @@ except ImportError:
     TK_AVAILABLE = False
 
 from src.common.captcha_ import captcha_control
+from src.common.rworker import cancel_job
 
 # Detect system platform
 OS_PLATFORM = sys.platform
@@ -589,6 +590,44 @@ def show_fig(
         )
 
 
+@st.fragment(run_every=1)
+def _live_job(key: str, tail: int) -> None:
+    job = st.session_state[key]
+    if job["done"].is_set():
+        # Let the page render the final state outside the fragment.
+        st.rerun()
+    finished, total = len(job["results"]), len(job["labels"])
+    st.progress(finished / max(total, 1), text=f"{finished}/{total} done · {time.time() - job['started']:.0f} s")
+    if job["progress"]:
+        st.caption(" · ".join(f"{combo}: {status}" for combo, status in job["progress"].items()))
+    st.code("".join(list(job["log"])[-tail:]) or "Waiting for output...", language=None)
+    if st.button("Cancel", key=f"{key}_cancel", disabled=job["cancel"].is_set()):
+        cancel_job(job)
+
+
+def show_job(key: str, tail: int = 30) -> None:
+    """
+    Displays an R job of `src.common.rworker.start_job` stored in the session state.
+
+    While the job runs, a fragment refreshes its progress, per-combo markers and log tail every second
+    without rerunning the page, and offers to cancel it. Once done, the page reruns and the log is shown in an
+    expander.
+
+    Args:
+        key (str): Session state key of the job.
+        tail (int, optional): Log lines shown while the job runs. Defaults to 30.
+
+    Returns:
+        None
+    """
+    job = st.session_state[key]
+    if not job["done"].is_set():
+        _live_job(key, tail)
+        return
+    with st.expander("Log"):
+        st.code("".join(job["log"]) or "No output.", language=None)
+
+
 def reset_directory(path: Path) -> None:
     """
     Remove the given directory and re-create it.
@@ -0,0 +1,381 @@
+"""
+Pool of warm R worker processes.
+
+Pages that run R code locally used to write a script and start a fresh Rscript for every run, paying for
+loading clusterProfiler, the OrgDb, enrichplot and pathview each time. Workers are long-lived Rscript
+processes that load R_WORKER_PACKAGES once and then run jobs sent over stdin, one JSON line each:
+{"id", "code", "args"}. The code is evaluated in a fresh environment holding the args as variables, so values
+are passed as data instead of being pasted into the script. Everything a job prints is its log; the worker
+ends every job with a marker line carrying its id and status. Workers need jsonlite.
+
+The pool is shared by all sessions of the server process and holds at most R_WORKERS workers (default: the
+number of CPUs). Idle workers are health-checked before reuse, and replaced after MAX_JOBS jobs, a timeout,
+a crash or a failed health check. `map_r` fans independent jobs, e.g. one per combo, out over the pool.
+
+`start_job` runs such a fan-out in the background for the UI: log lines stream into a bounded ring buffer as
+they are printed, progress markers ('[OK] <combo>: ...', '[SKIP] ...', '[FAIL] ...') are tracked per combo, and
+the job can be cancelled, which kills the workers of its running parts.
+"""
+
+import atexit
+import itertools
+import re
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+
+RSCRIPT = os.getenv("RSCRIPT", "Rscript")
+R_WORKERS = int(os.getenv("R_WORKERS", os.cpu_count() or 1))
+R_WORKER_PACKAGES = os.getenv(
+    "R_WORKER_PACKAGES", "clusterProfiler,enrichplot,pathview,ggplot2,readr,dplyr,stringr,org.Hs.eg.db"
+).split(",")
+
+# Jobs before a worker is replaced, bounding leaks across jobs.
+MAX_JOBS = 50
+# Seconds a worker may sit idle before it is pinged on checkout.
+HEALTH_INTERVAL = 60
+STARTUP_TIMEOUT = 300
+# Seconds a part of a background job may run before it is abandoned, so a lost reply cannot hang it.
+JOB_TIMEOUT = float(os.getenv("R_JOB_TIMEOUT", "3600"))
+PING_TIMEOUT = 10
+# Seconds between checks for cancellation while a job runs.
+POLL_INTERVAL = 0.2
+# Log lines kept per background job, and per job result when nobody streams them.
+LOG_LINES = 2000
+
+_MARKER = "\x1erworker "
+_PROGRESS = re.compile(r"^\[(OK|SKIP|FAIL)\] ([^:]+):")
+
+WORKER_R = r"""
+options(warn = 1)
+marker <- "\036rworker "
+for (pkg in strsplit(Sys.getenv("R_WORKER_PACKAGES"), ",", fixed = TRUE)[[1]]) {
+  suppressPackageStartupMessages(library(pkg, character.only = TRUE))
+}
+reply <- function(id, error = NULL) {
+  cat(marker, jsonlite::toJSON(list(id = id, error = error), auto_unbox = TRUE, null = "null"), "\n", sep = "")
+  flush(stdout())
+}
+home <- getwd()
+input <- file("stdin", "r")
+reply("ready")
+repeat {
+  line <- readLines(input, n = 1)
+  if (!length(line)) break
+  job <- jsonlite::fromJSON(line)
+  env <- list2env(as.list(job$args), parent = globalenv())
+  error <- tryCatch({
+    eval(parse(text = job$code), envir = env)
+    NULL
+  }, error = function(e) {
+    cat("Error:", conditionMessage(e), "\n", file = stderr())
+    conditionMessage(e)
+  })
+  # Jobs must not leak state into the next one.
+  graphics.off()
+  setwd(home)
+  reply(job$id, error)
+}
+"""
+
+_ids = itertools.count()
+_idle: list[dict] = []
+_live = 0
+_cond = threading.Condition()
+
+
+def _read_lines(stream, lines: queue.Queue) -> None:
+    for line in stream:
+        lines.put(line)
+    lines.put(None)
+
+
+def _read_reply(
+    worker: dict,
+    job_id: str,
+    timeout: float | None,
+    on_line: Callable[[str], None] | None = None,
+    cancel: threading.Event | None = None,
+) -> dict:
+    # Collect log lines up to the job's marker line; a closed stream means the worker died. Streamed lines are
+    # the caller's to keep.
+    log = deque(maxlen=0 if on_line is not None else LOG_LINES)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        if cancel is not None and cancel.is_set():
+            return {"ok": False, "error": "Cancelled", "log": "".join(log), "alive": False}
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+        if cancel is not None:
+            remaining = POLL_INTERVAL if remaining is None else min(remaining, POLL_INTERVAL)
+        try:
+            line = worker["lines"].get(timeout=remaining)
+        except queue.Empty:
+            if deadline is None or time.monotonic() < deadline:
+                continue
+            return {"ok": False, "error": f"Timed out after {timeout:g} s", "log": "".join(log), "alive": False}
+        if line is None:
+            return {"ok": False, "error": "The R worker exited", "log": "".join(log), "alive": False}
+        # Output the job left unterminated, e.g. a bare cat() or a progress bar, precedes the marker on its line.
+        text, found, reply = line.partition(_MARKER)
+        if found and text:
+            text += "\n"
+        if text:
+            log.append(text)
+            if on_line is not None:
+                on_line(text)
+        if not found:
+            continue
+        reply = json.loads(reply)
+        if reply["id"] == job_id:
+            return {"ok": reply["error"] is None, "error": reply["error"], "log": "".join(log), "alive": True}
+
+
+def _start_worker() -> dict:
+    try:
+        process = subprocess.Popen(
+            [RSCRIPT, "-e", WORKER_R],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+            env={**os.environ, "R_WORKER_PACKAGES": ",".join(R_WORKER_PACKAGES)},
+        )
+    except OSError as e:
+        raise RuntimeError(f"Could not start an R worker: {e}") from e
+    worker = {"process": process, "lines": queue.Queue(), "jobs": 0, "last_used": time.monotonic()}
+    threading.Thread(target=_read_lines, args=(process.stdout, worker["lines"]), daemon=True).start()
+    reply = _read_reply(worker, "ready", STARTUP_TIMEOUT)
+    if not reply["ok"]:
+        _stop_worker(worker, force=True)
+        raise RuntimeError(f"Could not start an R worker: {reply['error']}\n{reply['log']}")
+    return worker
+
+
+def _stop_worker(worker: dict, force: bool = False) -> None:
+    # A worker still busy with an abandoned job is killed; an idle one exits when its stdin closes.
+    process = worker["process"]
+    try:
+        if force:
+            process.kill()
+        process.stdin.close()
+        process.wait(timeout=5)
+    except (OSError, subprocess.TimeoutExpired):
+        process.kill()
+        process.wait()
+
+
+def _submit(
+    worker: dict,
+    code: str,
+    args: dict,
+    timeout: float | None,
+    on_line: Callable[[str], None] | None = None,
+    cancel: threading.Event | None = None,
+) -> dict:
+    job_id = str(next(_ids))
+    try:
+        worker["process"].stdin.write(json.dumps({"id": job_id, "code": code, "args": args}) + "\n")
+        worker["process"].stdin.flush()
+    except OSError:
+        return {"ok": False, "error": "The R worker exited", "log": "", "alive": False}
+    reply = _read_reply(worker, job_id, timeout, on_line, cancel)
+    worker["jobs"] += 1
+    worker["last_used"] = time.monotonic()
+    return reply
+
+
+def _healthy(worker: dict) -> bool:
+    if worker["process"].poll() is not None:
+        return False
+    if time.monotonic() - worker["last_used"] < HEALTH_INTERVAL:
+        return True
+    return _submit(worker, "invisible(TRUE)", {}, PING_TIMEOUT)["ok"]
+
+
+def _discard(worker: dict | None, force: bool = False) -> None:
+    global _live
+    if worker is not None:
+        _stop_worker(worker, force)
+    with _cond:
+        _live -= 1
+        _cond.notify()
+
+
+def _checkout() -> dict:
+    global _live
+    while True:
+        with _cond:
+            while not _idle and _live >= R_WORKERS:
+                _cond.wait()
+            worker = _idle.pop() if _idle else None
+            if worker is None:
+                _live += 1
+        if worker is None:
+            try:
+                return _start_worker()
+            except Exception:
+                _discard(None)
+                raise
+        # Health checks run outside the lock, so a slow ping does not block other sessions.
+        if _healthy(worker):
+            return worker
+        _discard(worker, force=True)
+
+
+def _checkin(worker: dict, alive: bool) -> None:
+    if not alive or worker["jobs"] >= MAX_JOBS or worker["process"].poll() is not None:
+        _discard(worker, force=not alive)
+        return
+    with _cond:
+        _idle.append(worker)
+        _cond.notify()
+
+
+def run_r(
+    code: str,
+    args: dict | None = None,
+    timeout: float | None = None,
+    on_line: Callable[[str], None] | None = None,
+    cancel: threading.Event | None = None,
+) -> dict:
+    """
+    Run R code on a warm worker, waiting for a free one if all R_WORKERS are busy.
+
+    Args:
+        code (str): R code. It runs in its own environment, with the preloaded packages attached.
+        args (dict | None, optional): JSON-serializable values bound as variables in that environment.
+        timeout (float | None, optional): Seconds before the job is abandoned and its worker killed.
+        on_line (Callable[[str], None] | None, optional): Called with every log line as it is printed.
+        cancel (threading.Event | None, optional): Abandons the job, killing its worker, once set.
+
+    Returns:
+        dict: 'ok', 'error' (the R error message, or None) and 'log' (the last LOG_LINES lines the job printed;
+        empty when they went to on_line).
+
+    Raises:
+        RuntimeError: If no worker could be started, e.g. R or one of R_WORKER_PACKAGES is missing.
+    """
+    if cancel is not None and cancel.is_set():
+        return {"ok": False, "error": "Cancelled", "log": ""}
+    worker = _checkout()
+    try:
+        reply = _submit(worker, code, args or {}, timeout, on_line, cancel)
+    except BaseException:
+        _checkin(worker, False)
+        raise
+    _checkin(worker, reply.pop("alive"))
+    return reply
+
+
+def map_r(
+    code: str,
+    args_list: list[dict],
+    timeout: float | None = JOB_TIMEOUT,
+    on_line: Callable[[int, str], None] | None = None,
+    cancel: threading.Event | None = None,
+) -> Iterator[tuple[int, dict]]:
+    """
+    Run R code once per argument set, in parallel on up to R_WORKERS workers.
+
+    Every job succeeds or fails on its own; a failed start of a worker only fails the job that needed it.
+
+    Args:
+        code (str): R code, as for `run_r`.
+        args_list (list[dict]): One set of arguments per job, e.g. per combo.
+        timeout (float | None, optional): Seconds per job before it is abandoned. Defaults to JOB_TIMEOUT.
+        on_line (Callable[[int, str], None] | None, optional): Called with the job position and every log line.
+        cancel (threading.Event | None, optional): Cancels running and pending jobs once set.
+
+    Yields:
+        tuple[int, dict]: The position of the job in args_list and its `run_r` result, as jobs finish.
+    """
+    pool = ThreadPoolExecutor(max_workers=max(1, min(R_WORKERS, len(args_list))))
+    try:
+        futures = {
+            pool.submit(run_r, code, args, timeout, on_line and (lambda line, i=i: on_line(i, line)), cancel): i
+            for i, args in enumerate(args_list)
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except RuntimeError as e:
+                result = {"ok": False, "error": str(e), "log": ""}
+            yield futures[future], result
+    finally:
+        # Jobs not started yet are dropped when the caller stops early, e.g. on a rerun.
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def start_job(
+    code: str, args_list: list[dict], labels: list[str], timeout: float | None = JOB_TIMEOUT
+) -> dict:
+    """
+    Start a `map_r` fan-out in a background thread and return a handle the UI can poll.
+
+    Args:
+        code (str): R code, as for `run_r`.
+        args_list (list[dict]): One set of arguments per part.
+        labels (list[str]): A name per part, e.g. the combo, used to prefix its log lines.
+        timeout (float | None, optional): Seconds per part before it is abandoned. Defaults to JOB_TIMEOUT.
+
+    Returns:
+        dict: 'labels'; 'log', a ring buffer of the last LOG_LINES lines; 'progress', the last marker status
+        per combo; 'results', the `run_r` result per finished label, without its log; the events 'cancel' (set
+        it, or call `cancel_job`, to stop) and 'done'; and 'started', a time.time() stamp.
+    """
+    job = {
+        "labels": labels,
+        "log": deque(maxlen=LOG_LINES),
+        "progress": {},
+        "results": {},
+        "cancel": threading.Event(),
+        "done": threading.Event(),
+        "started": time.time(),
+    }
+
+    def on_line(i: int, line: str) -> None:
+        job["log"].append(f"[{labels[i]}] {line}" if len(labels) > 1 else line)
+        match = _PROGRESS.match(line)
+        if match:
+            job["progress"][match.group(2)] = match.group(1)
+
+    def run() -> None:
+        try:
+            for i, result in map_r(code, args_list, timeout, on_line, job["cancel"]):
+                if not result["ok"]:
+                    on_line(i, f"Error: {result['error']}\n")
+                # The lines are already in the ring buffer; the job handle lives in session state.
+                result.pop("log", None)
+                job["results"][labels[i]] = result
+        finally:
+            job["done"].set()
+
+    threading.Thread(target=run, daemon=True).start()
+    return job
+
+
+def cancel_job(job: dict) -> None:
+    """Cancel a job of `start_job`: running parts are killed and pending ones never start."""
+    job["cancel"].set()
+
+
+def shutdown() -> None:
+    """Stop the idle workers, e.g. at exit."""
+    global _live
+    with _cond:
+        workers = list(_idle)
+        _idle.clear()
+        _live -= len(workers)
+    for worker in workers:
+        _stop_worker(worker)
+
+
+atexit.register(shutdown)
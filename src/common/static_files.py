@@ -0,0 +1,127 @@
+import base64
+import hashlib
+import os
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+import streamlit as st
+
+# Shared with nginx (secure_link_md5 in infra/nginx/nginx.conf). Without it, files fall back to the websocket.
+SECRET_ENV = "STATIC_FILES_SECRET"
+
+
+def _static_settings() -> dict:
+    settings = st.session_state.settings.get("static_files", {})
+    if not settings.get("enabled", False) or not os.getenv(SECRET_ENV):
+        return {}
+    return settings
+
+
+def _base_url() -> str:
+    # Links must be absolute, otherwise st.image treats them as local file paths.
+    headers = st.context.headers
+    host = headers.get("X-Forwarded-Host") or headers.get("Host")
+    if not host:
+        return ""
+    scheme = headers.get("X-Forwarded-Proto", "https")
+    return f"{scheme}://{host}"
+
+
+def sign_path(uri: str, expires: int, secret: str) -> str:
+    """
+    Compute the nginx secure_link signature for a URI.
+
+    Args:
+        uri (str): The decoded URI path, as in the nginx $uri variable.
+        expires (int): Unix timestamp after which the link is rejected.
+        secret (str): Secret shared with nginx.
+
+    Returns:
+        str: URL-safe base64 MD5 digest without padding.
+    """
+    digest = hashlib.md5(f"{expires}{uri} {secret}".encode("utf-8")).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+
+def signed_url(path: Path, download_name: str = "") -> str | None:
+    """
+    Return a signed, expiring URL under which nginx serves a workspace file.
+
+    The expiry is rounded up to the next multiple of the configured lifetime, so the URL of an unchanged file stays
+    the same across reruns and the browser can reuse its cached copy. The file modification time is appended as
+    a version parameter to bust that cache once the file is rewritten.
+
+    Args:
+        path (Path): File inside the workspaces directory.
+        download_name (str, optional): If set, nginx serves the file as an attachment with this name.
+
+    Returns:
+        str | None: The URL, or None if static file serving is disabled or the file cannot be served by nginx.
+    """
+    settings = _static_settings()
+    if not settings or "workspace" not in st.session_state:
+        return None
+    path = Path(path)
+    try:
+        rel = path.resolve().relative_to(Path(st.session_state.workspace).parent.resolve())
+        mtime = path.stat().st_mtime_ns
+    except (ValueError, OSError):
+        return None
+    base = _base_url()
+    if not base:
+        return None
+
+    lifetime = int(settings.get("expires", 3600))
+    expires = (int(time.time()) // lifetime + 2) * lifetime
+    uri = settings.get("url_prefix", "/files").rstrip("/") + "/" + rel.as_posix()
+    signature = sign_path(uri, expires, os.environ[SECRET_ENV])
+    url = f"{base}{quote(uri)}?md5={signature}&expires={expires}&v={mtime}"
+    if download_name:
+        url += f"&dl=1&name={quote(download_name, safe='')}"
+    return url
+
+
+def show_image(path: Path, **kwargs) -> None:
+    """
+    Display an image file, letting the browser load it from nginx when possible.
+
+    Args:
+        path (Path): The image file.
+        ...: Additional keyword arguments to pass to the `st.image` function.
+
+    Returns:
+        None
+    """
+    path = Path(path)
+    # Browsers decode the precompressed copy written at ingest time, see src/common/svg.py.
+    svgz_path = path.with_suffix(".svgz")
+    url = None
+    if path.suffix == ".svg" and svgz_path.exists():
+        url = signed_url(svgz_path)
+    st.image(url or signed_url(path) or str(path), **kwargs)
+
+
+def show_download(path: Path, label: str, file_name: str = "", mime: str | None = None) -> None:
+    """
+    Display a download button for a file without reading it into the Streamlit process when possible.
+
+    With static file serving enabled the button is a link to a signed nginx URL, otherwise the file is sent
+    through `st.download_button` as before.
+
+    Args:
+        path (Path): The file to download.
+        label (str): Button label.
+        file_name (str, optional): Name of the downloaded file. Defaults to the name of path.
+        mime (str, optional): MIME type for the fallback download button.
+
+    Returns:
+        None
+    """
+    path = Path(path)
+    url = signed_url(path, download_name=file_name or path.name)
+    if url:
+        st.link_button(label, url)
+    else:
+        with open(path, "rb") as f:
+            st.download_button(label=label, data=f, file_name=file_name or path.name, mime=mime)
@@ -0,0 +1,174 @@
+import gzip
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+
+# Attributes whose values are names or references rather than geometry.
+_SKIP_ATTRS = {"id", "class", "href", "xlink:href", "font-family", "version", "xmlns", "xmlns:xlink"}
+
+_TAG = re.compile(r"<([A-Za-z][\w:.-]*)((?:\s+[\w:.-]+\s*=\s*(?:\"[^\"]*\"|'[^']*'))*)\s*(/?)>")
+_ATTR = re.compile(r"([\w:.-]+)\s*=\s*(\"[^\"]*\"|'[^']*')")
+_NUMBER = re.compile(r"-?(?:\d+\.\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_SVG_OPEN = re.compile(r"<svg\b[^>]*>")
+
+# Paths shorter than this are cheaper to repeat than to reference.
+MIN_SHARED_PATH = 64
+
+
+def _round_number(match: re.Match, precision: int) -> str:
+    value = float(match.group(0))
+    if value == 0:
+        return "0"
+    # Keep three significant digits for small values such as transform scale factors.
+    digits = max(precision, 2 - int(math.floor(math.log10(abs(value)))))
+    text = f"{value:.{digits}f}".rstrip("0").rstrip(".")
+    return "0" if text in ("", "-0") else text
+
+
+def _parse_attrs(attrs: str) -> list[list[str]]:
+    return [[name, value[1:-1]] for name, value in _ATTR.findall(attrs)]
+
+
+def _format_tag(name: str, attrs: list[list[str]], closing: str) -> str:
+    parts = "".join(f' {k}="{v}"' if '"' not in v else f" {k}='{v}'" for k, v in attrs)
+    return f"<{name}{parts}{closing}>"
+
+
+def _normalize_style(style: str) -> str:
+    declarations = [d.strip() for d in style.split(";")]
+    return ";".join(d.replace(": ", ":") for d in declarations if d)
+
+
+def optimize_svg(text: str, precision: int = 2) -> str:
+    """
+    Shrink an SVG document written by the R graphics devices.
+
+    Numbers in attribute values are rounded to the given number of decimals, inline style attributes that occur
+    more than once are replaced by shared CSS classes, and long paths that occur more than once are moved to
+    <defs> and referenced with <use>. Text content is left untouched.
+
+    Args:
+        text (str): The SVG document.
+        precision (int, optional): Decimals to keep for coordinates. Defaults to 2.
+
+    Returns:
+        str: The optimized SVG document.
+    """
+    svg_open = _SVG_OPEN.search(text)
+    if not svg_open:
+        return text
+
+    tags = []
+    for match in _TAG.finditer(text, svg_open.end()):
+        attrs = _parse_attrs(match.group(2))
+        for attr in attrs:
+            if attr[0] == "style":
+                attr[1] = _normalize_style(_NUMBER.sub(lambda m: _round_number(m, precision), attr[1]))
+            elif attr[0] not in _SKIP_ATTRS:
+                attr[1] = _NUMBER.sub(lambda m: _round_number(m, precision), attr[1])
+        tags.append((match, attrs))
+
+    style_counts = Counter(v for _, attrs in tags for k, v in attrs if k == "style")
+    classes = {style: f"_s{i}" for i, (style, n) in enumerate(style_counts.most_common()) if n > 1}
+    for _, attrs in tags:
+        style = next((v for k, v in attrs if k == "style"), None)
+        if style in classes:
+            attrs[:] = [a for a in attrs if a[0] != "style"]
+            existing = next((a for a in attrs if a[0] == "class"), None)
+            if existing:
+                existing[1] = f"{existing[1]} {classes[style]}"
+            else:
+                attrs.append(["class", classes[style]])
+
+    # Identical self-closing paths are defined once and referenced; the definition keeps all attributes so
+    # stylesheet rules match it exactly as they matched the original element.
+    def path_key(match, attrs):
+        if match.group(1) != "path" or not match.group(3) or any(k == "id" for k, _ in attrs):
+            return None
+        if len(next((v for k, v in attrs if k == "d"), "")) < MIN_SHARED_PATH:
+            return None
+        return tuple(tuple(a) for a in attrs)
+
+    path_counts = Counter(key for key in (path_key(m, a) for m, a in tags) if key)
+    shared_paths = {key: f"_p{i}" for i, (key, n) in enumerate(path_counts.most_common()) if n > 1}
+
+    out = [text[: svg_open.end()]]
+    if classes or shared_paths:
+        out.append("<defs>")
+        if classes:
+            # Inline styles beat any stylesheet the device wrote, so the shared rules must as well.
+            rules = (
+                f".{cls}{{" + ";".join(f"{d}!important" for d in style.split(";")) + "}"
+                for style, cls in classes.items()
+            )
+            out.append("<style>" + "".join(rules) + "</style>")
+        out.extend(_format_tag("path", [["id", pid], *map(list, key)], "/") for key, pid in shared_paths.items())
+        out.append("</defs>")
+
+    position = svg_open.end()
+    for match, attrs in tags:
+        out.append(text[position : match.start()])
+        position = match.end()
+        key = path_key(match, attrs)
+        if key in shared_paths:
+            out.append(f'<use href="#{shared_paths[key]}"/>')
+        else:
+            out.append(_format_tag(match.group(1), attrs, match.group(3)))
+    out.append(text[position:])
+    return "".join(out)
+
+
+def optimize_svg_file(path: Path, precision: int = 2) -> Path:
+    """
+    Optimize an SVG file in place and store a gzip-compressed copy next to it.
+
+    Files whose compressed copy is newer than the SVG itself are skipped, so the function can be run repeatedly
+    over a result directory.
+
+    Args:
+        path (Path): The SVG file.
+        precision (int, optional): Decimals to keep for coordinates. Defaults to 2.
+
+    Returns:
+        Path: The compressed '.svgz' file.
+    """
+    path = Path(path)
+    svgz_path = path.with_suffix(".svgz")
+    if svgz_path.exists() and svgz_path.stat().st_mtime_ns >= path.stat().st_mtime_ns:
+        return svgz_path
+
+    text = path.read_text(encoding="utf-8")
+    optimized = optimize_svg(text, precision).encode("utf-8")
+    tmp_path = path.with_suffix(".svg.tmp")
+    tmp_path.write_bytes(optimized)
+    os.replace(tmp_path, path)
+
+    tmp_path = path.with_suffix(".svgz.tmp")
+    tmp_path.write_bytes(gzip.compress(optimized, compresslevel=9, mtime=0))
+    os.replace(tmp_path, svgz_path)
+    return svgz_path
+
+
+def optimize_svgs(directory: Path, precision: int = 2) -> None:
+    """
+    Optimize all SVG files below a directory, see `optimize_svg_file`.
+
+    Args:
+        directory (Path): Directory containing result plots.
+        precision (int, optional): Decimals to keep for coordinates. Defaults to 2.
+
+    Returns:
+        None
+    """
+    directory = Path(directory)
+    if directory.is_file():
+        optimize_svg_file(directory, precision)
+        return
+    for path in directory.rglob("*.svg"):
+        try:
+            optimize_svg_file(path, precision)
+        except (OSError, UnicodeDecodeError):
+            # Leave files we cannot parse as they are, they still render.
+            continue